@@ -1,13 +1,28 @@
+from functools import partial
+
 from global_constants_and_functions import *
 from selection import ElitistGA, ProportionateGA, ScalingProportionateGA
 from logger import FitnessLoggingGA, PopulationLoggingGA, BestChromosomeLoggingGA
-from behavior import FinishWhenSlowGA
-from individual import Chromosome
-from score_chromosome import score_chromosome
+from behavior import ResolutionScheduleGA
+from convergence import ConvergenceGA
+from fitness_cache import CachedFitnessGA, genome_key
+from parallel import ParallelEvaluationGA
+from rig import RigEvaluationGA
+from checkpoint import CheckpointGA
+from profiling import ProfilingGA
+from steady_state import SteadyStateGA
+from racing import RacingGA
+from surrogate import SurrogateGA
+from individual import Chromosome, format_chromosome, peek_chromosome_id, set_next_chromosome_id
+from population import Population, chromosomes_to_arrays, chromosomes_from_arrays, population_diversity
+from interpolation import get_plan
+from operators import batch_uniform_crossover, batch_mutate
+from score_chromosome import score_chromosome, score_batch, score_chromosome_list, COARSE_NUM_SAMPLES
 
 
-class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChromosomeLoggingGA
-                    ):
+class GeneticGlitch(ProfilingGA, CheckpointGA, FitnessLoggingGA, RacingGA, ElitistGA, ScalingProportionateGA,
+                    ConvergenceGA, ResolutionScheduleGA, BestChromosomeLoggingGA, CachedFitnessGA, SurrogateGA,
+                    RigEvaluationGA, ParallelEvaluationGA, SteadyStateGA):
     def __init__(self, config={}):
         """
         Initializes genetic algorithm to find optimal voltage glitch.
@@ -15,6 +30,7 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
         """
         super().__init__(config)
         self.chromosome_length_initial = self.config.setdefault("chromosome_length_initial", N)
+        self.num_samples = self.config.setdefault("num_samples", SAMPLE_NUM)
         self.mutation_y_prob = self.config.setdefault("mutation_y_prob", 0.9)
         self.mutation_y_size = self.config.setdefault("mutation_y_size", 0.3)
         self.mutation_reorder_prob = self.config.setdefault("mutation_reorder_prob", 0.05)
@@ -23,12 +39,70 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
         self.mutation_add_or_remove_prob = self.config.setdefault("mutation_add_or_remove_prob", 0.05)
         self.mutation_random_parent_crossover_prob = self.config.setdefault("mutation_random_parent_crossover_prob",
                                                                             0.05)
+        self.batch_scoring = self.config.setdefault("batch_scoring", True)
+        self.batch_operators = self.config.setdefault("batch_operators", True)
+        self.surrogate_num_samples = self.config.setdefault("surrogate_num_samples", 32)
+        # Simulation only: score at coarse_num_samples first, and at full resolution only the chromosomes that could
+        # be among the coarse_top_k best (defaults to the number of elites). The others get an EstimatedScore, which
+        # ranks them in their generation but is kept out of the fitness cache, the elites and the best score
+        self.coarse_scoring = self.config.setdefault("coarse_scoring", False)
+        self.coarse_num_samples = self.config.setdefault("coarse_num_samples", COARSE_NUM_SAMPLES)
+        self.coarse_top_k = self.config.setdefault("coarse_top_k", None)
+        # Used by ParallelEvaluationGA to score chunks of the population in worker processes
+        if not self.batch_scoring:
+            self.score_function = score_chromosome_list
+        elif self.coarse_scoring:
+            self.score_function = partial(score_batch, top_k=self.coarse_top_k or max(1, self.num_elites),
+                                          num_coarse=self.coarse_num_samples)
+        else:
+            self.score_function = score_batch
 
     def chromosome_str(self, chromosome):
         return str(chromosome)
 
+    def chromosome_record(self, chromosome):
+        """
+        Snapshot of a chromosome for the background log writer, formatted later by format_chromosome_record.
+        """
+        return chromosome.id, chromosome.freq, chromosome.coordinates.copy()
+
+    def format_chromosome_record(self, record):
+        return format_chromosome(*record)
+
+    def chromosome_key(self, chromosome):
+        return genome_key(chromosome)
+
     def create(self):
-        return Chromosome(length=self.chromosome_length_initial)
+        return Chromosome(length=self.chromosome_length_initial, num_samples=self.num_samples)
+
+    def set_resolution(self, num_samples):
+        """
+        Evolve at num_samples samples from now on, see ResolutionScheduleGA: new chromosomes get num_samples, and the
+        population keeps its coordinates but is sampled (and scored) at num_samples.
+        """
+        self.num_samples = num_samples
+        for chromosome in (self.population or []) + self.next_generation:
+            chromosome.num_samples = num_samples
+
+    def population_diversity(self):
+        return population_diversity(Population.from_chromosomes(self.population))
+
+    def copy_chromosome(self, chromosome):
+        return chromosome.make_copy()
+
+    def pack_chromosomes(self, chromosomes):
+        """
+        Pack chromosomes into arrays for a checkpoint, together with the id counter so that a resumed run gives new
+        chromosomes the same ids.
+        """
+        arrays = chromosomes_to_arrays(chromosomes)
+        arrays["next_id"] = np.array(peek_chromosome_id())
+        return arrays
+
+    def unpack_chromosomes(self, arrays):
+        chromosomes = chromosomes_from_arrays(arrays)
+        set_next_chromosome_id(int(arrays["next_id"]))
+        return chromosomes
 
     def score(self, chromosome):
         """This should send a "score" command to the arduino, that runs a several amount of glitches of the current
@@ -38,6 +112,41 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
         """
         return score_chromosome(chromosome)
 
+    def score_batch(self, chromosomes):
+        """
+        Score the whole list of chromosomes at once, instead of one chromosome at a time.
+        :param chromosomes:
+        :return: scores
+        """
+        if self.batch_scoring:
+            return self.score_function(chromosomes)
+        return super().score_batch(chromosomes)
+
+    def surrogate_features(self, chromosomes):
+        """
+        Features of the surrogate model: the waveform resampled to surrogate_num_samples points, and the frequency
+        scaled to [0, 1].
+        :return: array of shape (len(chromosomes), surrogate_num_samples + 1)
+        """
+        arrays = chromosomes_to_arrays(chromosomes)
+        features = np.empty([len(chromosomes), self.surrogate_num_samples + 1])
+        get_plan(self.surrogate_num_samples).evaluate_batch(arrays["coordinates"], arrays["lengths"],
+                                                            out=features[:, :-1])
+        features[:, -1] = (arrays["freq"] - MIN_FREQ) / (MAX_FREQ - MIN_FREQ)
+        return features
+
+    def measure(self, chromosomes, attempts):
+        """
+        Run glitch attempts of every chromosome on the rigs, for racing. Without rigs, the attempts are simulated:
+        every attempt succeeds with the probability given by the simulation score.
+        :return: success rate of every chromosome
+        """
+        if self.rig_driver is not None:
+            futures = [self.rig_driver.submit(chromosome, attempts) for chromosome in chromosomes]
+            return np.array([future.result() for future in futures])
+        success_prob = np.clip(self.score_batch(chromosomes), 0, 1)
+        return self.np_random.binomial(attempts, success_prob) / attempts
+
     def crossover(self):
         """
         Select 2 distinct parents to perform crossover on.
@@ -54,6 +163,59 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
                 parent2 = self.create()
         return self.uniform_waveform_crossover(parent1, parent2)
 
+    def draw_parent_pairs(self, population, num_pairs):
+        """
+        Draw pairs of distinct parents (rows of population, in the order of self.scored) for crossover.
+        Pairs whose parents are the same chromosome are redrawn a few times, and the second parent of pairs that are
+        still not distinct is replaced by a new random chromosome, appended to population.
+        :return: population, array of shape (num_pairs, 2) of row indices
+        """
+        pairs = self.select_indices(2 * num_pairs).reshape(num_pairs, 2)
+        ids = np.array(population.ids)
+        for _ in range(int(np.ceil(np.log2(self.population_size))) + 1):
+            same = np.flatnonzero(ids[pairs[:, 0]] == ids[pairs[:, 1]])
+            if same.size == 0:
+                return population, pairs
+            pairs[same, 1] = self.select_indices(same.size)
+        same = np.flatnonzero(ids[pairs[:, 0]] == ids[pairs[:, 1]])
+        if same.size > 0:
+            members = population.to_chromosomes() + [self.create() for _ in range(same.size)]
+            pairs[same, 1] = len(population) + np.arange(same.size)
+            population = Population.from_chromosomes(members)
+        return population, pairs
+
+    def generate(self):
+        """
+        Create the whole next generation at once: all parents are drawn together, and the crossover of all pairs is
+        done on the population arrays. Set batch_operators to False to use the one pair at a time path.
+        Once the surrogate model is trained, more offspring are bred than needed and only the ones it screens in are
+        kept.
+        """
+        if not self.batch_operators:
+            return super().generate()
+
+        needed = self.population_size - self.add_random_num - len(self.next_generation)
+        if needed > 0:
+            population = Population.from_chromosomes([ticket[0] for ticket in self.scored])
+            num_children = self.surrogate_candidates(needed)
+            num_pairs = int(np.ceil(num_children / self.num_cx_children))
+            with self.profile("select"):
+                population, pairs = self.draw_parent_pairs(population, num_pairs)
+            with self.profile("crossover"):
+                crossover = self.np_random.random(num_pairs) < self.crossover_prob
+                # Pairs without crossover pass on copies of the parents
+                children = Population.concatenate([batch_uniform_crossover(population, pairs[crossover],
+                                                                           self.np_random),
+                                                   population.take(pairs[~crossover].ravel())])
+            with self.profile("mutate"):
+                children = self.mutate_batch(children.take(np.arange(num_children)))
+            with self.profile("screen"):
+                children = self.screen(children.to_chromosomes(), needed)
+            self.next_generation += children
+
+        for _ in range(self.add_random_num):
+            self.next_generation.append(self.create())
+
     @staticmethod
     def uniform_waveform_crossover(parent1, parent2):
         """ Perform uniform crossover on two waveform chromosomes.
@@ -78,7 +240,7 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
             if random.randint(0, 1) == 1:
                 child1.coordinates[locus] = tup[1].coordinates[indices_from_long_parent[locus]]
                 child2.coordinates[indices_from_long_parent[locus]] = tup[0].coordinates[locus]
-        # Sort coordinates in case they got messed up
+        # Sort coordinates in case they got messed up (this also invalidates the waveforms of the children)
         child1.sort_coordinates()
         child2.sort_coordinates()
         # Perform frequency crossover
@@ -103,12 +265,14 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
             ind = random.choice(range(chromosome.length))
             amount_to_change = np.random.randn() * self.mutation_y_size
             chromosome.coordinates[ind, 1] += amount_to_change
+            chromosome.invalidate_waveforms()
         # swap mutation
         if random.random() < self.mutation_reorder_prob and chromosome.length > 1:
             ind = random.choice(range(chromosome.length - 1))
             tmp_to_swap = chromosome.coordinates[ind, 1]
             chromosome.coordinates[ind, 1] = chromosome.coordinates[ind + 1, 1]
             chromosome.coordinates[ind + 1, 1] = tmp_to_swap
+            chromosome.invalidate_waveforms()
         # remove or add point mutation
         if random.random() < self.mutation_add_or_remove_prob:
             # remove random point
@@ -129,6 +293,18 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
         chromosome.generate_new_id()
         return chromosome
 
+    def mutate_batch(self, population):
+        """
+        Mutate all the offspring of a generation at once, see mutate() for the possible mutations.
+        :param population: Population of offspring
+        :return: mutated Population
+        """
+        return batch_mutate(population, self.np_random,
+                            lambda count: Population.from_chromosomes([self.create() for _ in range(count)]),
+                            self.mutation_y_prob, self.mutation_y_size, self.mutation_reorder_prob,
+                            self.mutation_add_or_remove_prob, self.mutation_freq_prob, self.mutation_freq_size,
+                            self.mutation_random_parent_crossover_prob)
+
     def pre_generate(self):
         """
         Before applying the GA selection, crossover, and mutation
@@ -140,13 +316,14 @@ class GeneticGlitch(ElitistGA, ScalingProportionateGA, FinishWhenSlowGA, BestChr
         a suboptimal solution.
         """
         super().pre_generate()
-        for chromosome1 in self.population:
-            for chromosome2 in self.population:
-                # make sure they aren't the same chromosome chosen twice.
-                if chromosome1.id != chromosome2.id and \
-                        chromosome1.length == chromosome2.length and \
-                        (chromosome1.coordinates == chromosome2.coordinates).all():
-                    chromosome2.add_noise()  # if we want to keep attributes of good solutions that were duplicated
+        with self.profile("dedupe"):
+            for chromosome1 in self.population:
+                for chromosome2 in self.population:
+                    # make sure they aren't the same chromosome chosen twice.
+                    if chromosome1.id != chromosome2.id and \
+                            chromosome1.length == chromosome2.length and \
+                            (chromosome1.coordinates == chromosome2.coordinates).all():
+                        chromosome2.add_noise()  # if we want to keep attributes of good solutions that were duplicated
 
     def best(self):
         """
@@ -0,0 +1,68 @@
+"""
+Encoding of waveforms to the AWG wire format: big endian, 16 bit two's complement integers.
+Everything is done with numpy on whole waveforms, instead of converting one sample at a time with
+convert_int_to_comp2_ascii / convert_int_to_comp2_binary_string (which are kept for single values).
+"""
+from global_constants_and_functions import *
+
+AWG_DTYPE = np.dtype('>i2')
+
+
+def dac_samples(y_samples, max_dac_int=MAX_DAC_INT, min_dac_int=MIN_DAC_INT):
+    """
+    Scale a waveform normalized to [-1, 1] to the DAC integer range.
+    :return: int16 array of DAC samples
+    """
+    return np.round(np.clip(y_samples * max_dac_int, min_dac_int, max_dac_int)).astype(np.int16)
+
+
+def encode_waveform(int_samples):
+    """
+    :return: bytes to send to the AWG
+    """
+    return np.asarray(int_samples).astype(AWG_DTYPE).tobytes()
+
+
+def encode_binary_string(int_samples):
+    """
+    :return: string of '0' and '1' characters, 16 per sample, to visualize what is sent to the AWG
+    """
+    bits = np.unpackbits(np.asarray(int_samples).astype(AWG_DTYPE).view(np.uint8))
+    return (bits + ord('0')).tobytes().decode('ascii')
+
+
+def changed_sample_ranges(old_samples, new_samples, merge_gap=0):
+    """
+    Find the ranges of samples that differ between two waveforms of the same length.
+    Ranges separated by at most merge_gap unchanged samples are merged, since every write to the AWG has a fixed
+    overhead that is larger than resending a few unchanged samples.
+    :return: list of (start, stop) sample ranges
+    """
+    changed = np.flatnonzero(np.asarray(old_samples) != np.asarray(new_samples))
+    if changed.size == 0:
+        return []
+    breaks = np.flatnonzero(np.diff(changed) > merge_gap + 1)
+    starts = changed[np.concatenate([[0], breaks + 1])]
+    stops = changed[np.concatenate([breaks, [changed.size - 1]])] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+class AwgEncoder():
+    """Encodes waveforms into a reusable buffer, so no memory is allocated per upload.
+    The memoryview returned by encode() points into the buffer, so it is only valid until the next call to encode().
+    """
+
+    def __init__(self, num_samples=SAMPLE_NUM):
+        self.buffer = bytearray(AWG_DTYPE.itemsize * num_samples)
+        self.samples = np.frombuffer(self.buffer, dtype=AWG_DTYPE)  # writable view of the buffer
+
+    def encode(self, int_samples):
+        """
+        :param int_samples: DAC samples in the int16 range
+        :return: memoryview of the encoded bytes
+        """
+        num_samples = len(int_samples)
+        if num_samples > len(self.samples):
+            self.__init__(num_samples)
+        self.samples[:num_samples] = int_samples
+        return memoryview(self.buffer)[:AWG_DTYPE.itemsize * num_samples]
@@ -4,6 +4,7 @@ Contents
 --------
 
 :GeneticAlgorithm: The base class from which all GA behaviors inherit.
+:EstimatedScore: A score that is only an estimate of the fitness.
 
 """
 # from builtins import str
@@ -13,6 +14,25 @@ Contents
 import argparse
 import random
 import uuid
+from concurrent.futures import Future
+from contextlib import nullcontext
+
+import numpy as np
+
+# The context of profiled phases when profiling is disabled, see profiling.ProfilingGA
+NULL_PHASE = nullcontext()
+
+
+class EstimatedScore(float):
+    """A score that only estimates the fitness, such as a score at a lower resolution.
+
+    ``score_batch`` may return it for chromosomes that can not rank among the
+    best of their batch. It ranks like any other score, but behaviors that
+    keep scores beyond the scoring pass (the fitness cache, the elites, best
+    score triggers) ignore it, so the chromosome is scored again when it is
+    met again.
+    """
+    __slots__ = ()
 
 
 # pylint: disable=too-many-instance-attributes
@@ -37,8 +57,11 @@ class GeneticAlgorithm(object):
         self.config = config
         self.population = None
         self.next_generation = []
-        self.random = random.Random()
+        self.random_seed = self.config.setdefault("random_seed", None)  # None seeds from the OS
+        self.random = random.Random(self.random_seed)
+        self.np_random = np.random.default_rng(self.random_seed)  # for drawing many random numbers at once
         self.num_cx_children = 2  # number of children per crossover operation
+        self.num_evaluations = 0  # number of chromosomes that actually reached score()
 
         # Basic GA parameters
         self.population_size = self.config.setdefault("population_size", 50)
@@ -50,6 +73,7 @@ class GeneticAlgorithm(object):
         if self.max_iterations <= 0:
             self.max_iterations = 1
         self.ranked = None
+        self.ranked_population = None  # the population self.ranked was computed from
 
     def seed(self):
         """
@@ -75,10 +99,12 @@ class GeneticAlgorithm(object):
         if self.population is None:
             raise Exception("Cannot score and rank an empty population.")
 
-        self.ranked = [(member, self.fitness(member)) for member in self.population]
+        scores = self.evaluate(self.population)
+        self.ranked = [(member, self.fitness(member, score)) for member, score in zip(self.population, scores)]
         self.ranked.sort(key=lambda n: n[1])  # sort only according to the fitness score
         self.ranked.reverse()  # make the member with highest score as first in list
-        self.ranked = self.ranked[:-self.remove_worst_num]
+        self.ranked = self.ranked[:len(self.ranked) - self.remove_worst_num]
+        self.ranked_population = self.population
 
     def solve(self):
         """Run the GA until complete and return the best solution.
@@ -92,9 +118,12 @@ class GeneticAlgorithm(object):
         try:
             while not self.is_finished():
                 self.iteration += 1
-                self.pre_generate()
-                self.generate()
-                self.post_generate()
+                with self.profile("pre_generate"):
+                    self.pre_generate()
+                with self.profile("generate"):
+                    self.generate()
+                with self.profile("post_generate"):
+                    self.post_generate()
                 print("Iteration {} Finished".format(self.iteration))
         except KeyboardInterrupt:
             print("\nKeyboardInterrupt\n")
@@ -112,7 +141,8 @@ class GeneticAlgorithm(object):
         """Create and assign a new generation as the population."""
         while len(self.next_generation) < self.population_size - self.add_random_num:
             if self.random.random() < self.crossover_prob:
-                children = self.crossover()
+                with self.profile("crossover"):
+                    children = self.crossover()
             else:
                 children = [self.select() for _ in
                             range(0, self.num_cx_children)]
@@ -121,14 +151,57 @@ class GeneticAlgorithm(object):
                 if len(self.next_generation) >= self.population_size - self.add_random_num:
                     break
 
-                child = self.mutate(child)
+                with self.profile("mutate"):
+                    child = self.mutate(child)
                 self.next_generation.append(child)
 
         for _ in range(self.add_random_num):
             self.next_generation.append(self.create())
 
-    def fitness(self, chromosome):
-        return self.score(chromosome)
+    def fitness(self, chromosome, score=None):
+        """Return the fitness of a chromosome.
+
+        Behaviors hook their side effects (elitism, best score triggers) into
+        this method. ``score`` is passed when the chromosome was already scored
+        as part of a batch by ``evaluate``.
+        """
+        if score is None:
+            score = self.evaluate([chromosome])[0]
+        return score
+
+    def evaluate(self, chromosomes):
+        """Return the scores of a list of chromosomes.
+
+        This is the single point through which chromosomes reach ``score``, so
+        behaviors that change *how* scores are obtained override it.
+        """
+        self.num_evaluations += len(chromosomes)
+        return self.score_batch(chromosomes)
+
+    def submit(self, chromosome):
+        """Start scoring a chromosome and return a ``Future`` of its score.
+
+        The default scores it right away through ``evaluate``. Behaviors that
+        score in the background (worker processes, rigs) override it, so that
+        steady-state evolution can keep them busy.
+        """
+        future = Future()
+        try:
+            future.set_result(self.evaluate([chromosome])[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def evaluation_capacity(self):
+        """Return the number of chromosomes that can be scored at once."""
+        return 1
+
+    def profile(self, name):
+        """Return a context manager that times a phase of a generation.
+
+        It does nothing here; ``profiling.ProfilingGA`` records the phases.
+        """
+        return NULL_PHASE
 
     def pre_generate(self):
         """Do anything necessary before creating the next generation."""
@@ -139,6 +212,67 @@ class GeneticAlgorithm(object):
         self.population = list(self.next_generation)
         self.next_generation = []
 
+    def end_iteration(self):
+        """Do anything necessary after an iteration that was not a generation.
+
+        Steady-state evolution (see ``steady_state.SteadyStateGA``) counts
+        every ``population_size`` evaluations as an iteration, and calls this
+        instead of ``pre_generate`` and ``post_generate``. Behaviors that
+        record progress once per generation extend it.
+        """
+        pass
+
+    def ranked_changed(self):
+        """Do anything necessary after ``self.ranked`` changed without a scoring pass.
+
+        This is called when the ranking was restored from a checkpoint, or
+        edited in place (see ``steady_state.SteadyStateGA``), so behaviors
+        that derive state from it can update it.
+        """
+        pass
+
+    def forget_scores(self):
+        """Forget every score seen so far, when new scores can not be compared to them.
+
+        This is called when the problem itself changes (see
+        ``behavior.ResolutionScheduleGA``). Behaviors that keep scores or learn
+        from them extend it to reset their own state, and the caller scores
+        the population again.
+        """
+        self.ranked = None
+        self.ranked_population = None
+
+    def save_state(self, state, ref):
+        """Add the state of the GA to ``state``, a dict of numpy arrays.
+
+        Behaviors that keep state across generations extend it with their own
+        arrays, and ``restore_state`` to read them back. ``ref`` returns the
+        row of a chromosome (or -1 for ``None``) in the table of chromosomes
+        saved along, so a chromosome held by several behaviors is saved once.
+        See ``checkpoint.CheckpointGA``.
+        """
+        state["iteration"] = np.array(self.iteration)
+        state["num_evaluations"] = np.array(self.num_evaluations)
+        state["population"] = np.array([ref(member) for member in self.population], dtype=int)
+        if self.ranked is not None:
+            state["ranked"] = np.array([ref(member) for member, _ in self.ranked], dtype=int)
+            state["ranked_scores"] = np.array([score for _, score in self.ranked], dtype=float)
+
+    def restore_state(self, state, deref):
+        """Restore the state added by ``save_state``.
+
+        ``deref`` returns the chromosome of a row of the table (``None`` for
+        -1). ``ranked_changed`` is called once every behavior is restored.
+        """
+        self.iteration = int(state["iteration"])
+        self.num_evaluations = int(state["num_evaluations"])
+        self.population = [deref(row) for row in state["population"].tolist()]
+        self.next_generation = []
+        if "ranked" in state:
+            self.ranked = [(deref(row), score) for row, score in zip(state["ranked"].tolist(),
+                                                                     state["ranked_scores"].tolist())]
+            self.ranked_population = self.population
+
     def best(self):
         """Returns the fittest member in the population of a GA.
 
@@ -177,6 +311,14 @@ class GeneticAlgorithm(object):
         """Return the score of a chromosome."""
         raise NotImplementedError
 
+    def score_batch(self, chromosomes):
+        """Return the scores of a list of chromosomes.
+
+        Override this when the whole population can be scored faster at once
+        than one chromosome at a time.
+        """
+        return [self.score(chromosome) for chromosome in chromosomes]
+
     def chromosome_str(self, chromosome):
         """Return a readable string representation of a chromosome.
 
@@ -197,6 +339,14 @@ class GeneticAlgorithm(object):
         """
         return self.chromosome_str(chromosome)
 
+    def chromosome_key(self, chromosome):
+        """Return a hashable key identifying the genome of a chromosome.
+
+        Two chromosomes with the same genome must have the same key, so it is
+        used to recognize chromosomes that were already scored.
+        """
+        return self.chromosome_repr(chromosome)
+
     def __str__(self):
         import inspect
         return str(inspect.getmro(self.__class__)) + str(self.config)
@@ -9,6 +9,9 @@ Contents
     A GA that stores the fittest chromosome from each generation and its score.
 :FinishWhenSlowGA:
     A GA that will terminate when it is no longer making progress.
+:ResolutionScheduleGA:
+    A GA that moves to a higher resolution of its problem, instead of
+    terminating, when it is no longer making progress.
 
 Note that when using strategies that do not score each member of every
 generation, such as tournament selection, best scores may go undetected.
@@ -23,7 +26,8 @@ from __future__ import division
 import math
 import numpy as np
 
-from base import GeneticAlgorithm
+from base import EstimatedScore, GeneticAlgorithm
+from convergence import ScoreHistory
 
 
 class FittestTriggerGA(GeneticAlgorithm):
@@ -37,13 +41,14 @@ class FittestTriggerGA(GeneticAlgorithm):
         super(FittestTriggerGA, self).__init__(config)
         self.best_score = (0, None)
 
-    def fitness(self, chromosome):
+    def fitness(self, chromosome, score=None):
         """Check the score of a chromosome.
 
-        Triggers ``new_best`` if there's a winner.
+        Triggers ``new_best`` if there's a winner. Estimated scores are not
+        considered.
         """
-        score = super(FittestTriggerGA, self).fitness(chromosome)
-        if score > self.best_score[0]:
+        score = super(FittestTriggerGA, self).fitness(chromosome, score)
+        if score > self.best_score[0] and not isinstance(score, EstimatedScore):
             self.new_best(score, chromosome)
             self.best_score = (score, chromosome)
 
@@ -56,18 +61,32 @@ class FittestTriggerGA(GeneticAlgorithm):
     def best(self):
         return self.best_score[1]
 
+    def forget_scores(self):
+        super(FittestTriggerGA, self).forget_scores()
+        self.best_score = (0, None)
+
+    def save_state(self, state, ref):
+        super(FittestTriggerGA, self).save_state(state, ref)
+        state["best_score"] = np.array(self.best_score[0], dtype=float)
+        state["best_score_chromosome"] = np.array(ref(self.best_score[1]))
+
+    def restore_state(self, state, deref):
+        super(FittestTriggerGA, self).restore_state(state, deref)
+        self.best_score = (float(state["best_score"]), deref(int(state["best_score_chromosome"])))
+
 
 class FittestInGenerationGA(FittestTriggerGA):
     """A behavior that stores the best score from each generation.
 
-    The fittest chromosome and its score of each generation are stored as a
-    2-tuple of ``(score, chromosome)`` in ``self.best_scores``.
+    The best score of each generation is stored in ``self.best_scores``, a
+    ``convergence.ScoreHistory`` of the last ``best_scores_history``
+    generations.
 
     """
 
     def __init__(self, config={}):
         super(FittestInGenerationGA, self).__init__(config)
-        self.best_scores = []
+        self.best_scores = ScoreHistory(self.config.setdefault("best_scores_history", 1024))
 
     def pre_generate(self):
         super(FittestInGenerationGA, self).pre_generate()
@@ -75,6 +94,23 @@ class FittestInGenerationGA(FittestTriggerGA):
             self.best_scores.append(self.best_score[0])
         self.best_score = (0, None)
 
+    def end_iteration(self):
+        super(FittestInGenerationGA, self).end_iteration()
+        self.best_scores.append(self.ranked[0][1])
+
+    def forget_scores(self):
+        super(FittestInGenerationGA, self).forget_scores()
+        self.best_scores.clear()
+
+    def save_state(self, state, ref):
+        super(FittestInGenerationGA, self).save_state(state, ref)
+        state["best_scores"] = np.array(self.best_scores, dtype=float)
+
+    def restore_state(self, state, deref):
+        super(FittestInGenerationGA, self).restore_state(state, deref)
+        self.best_scores.clear()
+        self.best_scores.extend(state["best_scores"].tolist())
+
 
 class FinishWhenSlowGA(FittestInGenerationGA):
     """A GA that will terminate when it is no longer making progress.
@@ -92,6 +128,11 @@ class FinishWhenSlowGA(FittestInGenerationGA):
         self.threshold = self.config.setdefault("threshold", 0.0001)
         self.lookback = self.config.setdefault("lookback", 20)
 
+    def is_stagnated(self, lookback=None):
+        """Return true if the best score of the last ``lookback`` (defaults
+        to ``self.lookback``) iterations didn't gain more than ``threshold``."""
+        return self.best_scores.stagnated(lookback or self.lookback, self.threshold)
+
     def is_finished(self):
         """
         Checks whether progress has been made in the last iterations, and stops if gain didn't exceed certain threshold.
@@ -99,14 +140,85 @@ class FinishWhenSlowGA(FittestInGenerationGA):
         """
         exceeded_duration = self.iteration >= self.max_iterations
 
-        if len(self.best_scores) > self.lookback:
-            first = np.array(self.best_scores[-self.lookback: -1])
-            last = self.best_scores[-1]
-            gain = (last - first)  # can also be divided by "first" to get gain as a ratio and not definite value
+        if self.is_stagnated():
+            print("Stopped due to slow progress")
+            return True
+        return exceeded_duration
+
 
-            if (gain <= self.threshold).all():
-                print("Stopped due to slow progress")
-            return (gain <= self.threshold).all() or exceeded_duration
+class ResolutionScheduleGA(FinishWhenSlowGA):
+    """A GA that evolves at increasing resolutions.
 
-        else:
-            return exceeded_duration
+    ``resolution_schedule`` lists the resolutions to evolve at, lowest
+    first (for waveforms, numbers of samples). The GA starts at the first
+    one, and moves to the next one whenever the best score stagnates for
+    ``resolution_lookback`` iterations, carrying its population over. It
+    only finishes for slow progress at the last resolution. Without a
+    schedule, it is a ``FinishWhenSlowGA``.
+
+    The inheriting class must implement ``set_resolution``, which moves the
+    GA and its population to a resolution. The move is made after a
+    generation (in ``post_generate``, or ``end_iteration`` in steady-state
+    mode), before the generation is scored. Scores at different resolutions
+    are not comparable, so on every move ``forget_scores`` resets the
+    behaviors that keep scores, and the population is scored again.
+    """
+
+    def __init__(self, config={}):
+        super(ResolutionScheduleGA, self).__init__(config)
+        self.resolution_schedule = self.config.setdefault("resolution_schedule", None)
+        self.resolution_lookback = self.config.setdefault("resolution_lookback", 10)
+        self.resolution_level = 0
+        self.resolution_changes = []  # iterations at which the resolution moved to the next level
+
+    def set_resolution(self, resolution):
+        """Evolve at ``resolution`` from now on, including the current population."""
+        raise NotImplementedError
+
+    def seed(self):
+        if self.resolution_schedule:
+            self.set_resolution(self.resolution_schedule[self.resolution_level])
+        super(ResolutionScheduleGA, self).seed()
+
+    def at_last_resolution(self):
+        return not self.resolution_schedule or self.resolution_level >= len(self.resolution_schedule) - 1
+
+    def is_finished(self):
+        if self.at_last_resolution():
+            return super(ResolutionScheduleGA, self).is_finished()
+        return self.iteration >= self.max_iterations
+
+    def post_generate(self):
+        super(ResolutionScheduleGA, self).post_generate()
+        if not self.at_last_resolution() and self.is_stagnated(self.resolution_lookback):
+            # The new generation is scored by the behaviors after this one, at the new resolution
+            self.advance_resolution()
+
+    def end_iteration(self):
+        super(ResolutionScheduleGA, self).end_iteration()
+        if not self.at_last_resolution() and self.is_stagnated(self.resolution_lookback):
+            self.advance_resolution()
+            self.score_population()
+            self.ranked_changed()
+
+    def save_state(self, state, ref):
+        super(ResolutionScheduleGA, self).save_state(state, ref)
+        if self.resolution_schedule:
+            state["resolution_level"] = np.array(self.resolution_level)
+            state["resolution_changes"] = np.array(self.resolution_changes, dtype=int)
+
+    def restore_state(self, state, deref):
+        super(ResolutionScheduleGA, self).restore_state(state, deref)
+        if self.resolution_schedule and "resolution_level" in state:
+            self.resolution_level = int(state["resolution_level"])
+            self.resolution_changes = state["resolution_changes"].tolist()
+            self.set_resolution(self.resolution_schedule[self.resolution_level])
+
+    def advance_resolution(self):
+        """Move to the next resolution of the schedule, and forget the scores of the previous one."""
+        self.resolution_level += 1
+        self.resolution_changes.append(self.iteration)
+        resolution = self.resolution_schedule[self.resolution_level]
+        print("Iteration {}: resolution {}".format(self.iteration, resolution))
+        self.set_resolution(resolution)
+        self.forget_scores()
@@ -0,0 +1,181 @@
+"""
+Microbenchmarks of the waveform and GA hot paths.
+Every benchmark runs over a whole population, for every population size and number of samples of the sweep, and the
+results are written as JSON so that runs can be compared across commits:
+    python benchmarks.py --population-sizes 50 200 --sample-nums 1024 16384 --output benchmarks.json
+Waveform caches are cleared before every run, so every waveform benchmark includes the stages it depends on (the AWG
+stream includes the DAC samples, which include the interpolation).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import timeit
+
+from global_constants_and_functions import *
+from GeneticGlitch import GeneticGlitch
+from individual import Chromosome
+from score_chromosome import sim_score_chromosome
+
+
+def make_population(population_size, num_samples):
+    return [Chromosome(num_samples=num_samples) for _ in range(population_size)]
+
+
+def make_ga(population_size, num_samples):
+    """
+    :return: a GeneticGlitch whose population was scored and selected from (pre_generate was run), without log files
+    """
+    ga_config = {key: value for key, value in config.items()
+                 if key not in ("best_chromosome_file", "checkpoint_file", "resume_from")}
+    ga_config.update(population_size=population_size, num_samples=num_samples, log_fitness=False, log_best_chromosome=False,
+                     stats_file=None, random_seed=0)
+    ga = GeneticGlitch(ga_config)
+    ga.seed()
+    ga.iteration = 1
+    ga.pre_generate()
+    return ga
+
+
+def cold(chromosomes):
+    for chromosome in chromosomes:
+        chromosome.invalidate_waveforms()
+    return chromosomes
+
+
+def bench_interpolate_coordinates(population_size, num_samples):
+    chromosomes = make_population(population_size, num_samples)
+    return lambda: [chromosome.interpolate_coordinates() for chromosome in cold(chromosomes)]
+
+
+def bench_calc_raw_waveform_int(population_size, num_samples):
+    chromosomes = make_population(population_size, num_samples)
+    return lambda: [chromosome.calc_raw_waveform_int() for chromosome in cold(chromosomes)]
+
+
+def bench_generate_bin_stream_to_awg(population_size, num_samples):
+    chromosomes = make_population(population_size, num_samples)
+    return lambda: [chromosome.generate_bin_stream_to_awg() for chromosome in cold(chromosomes)]
+
+
+def bench_sim_score_chromosome(population_size, num_samples):
+    chromosomes = make_population(population_size, num_samples)
+    return lambda: [sim_score_chromosome(chromosome) for chromosome in cold(chromosomes)]
+
+
+def bench_uniform_waveform_crossover(population_size, num_samples):
+    chromosomes = make_population(population_size, num_samples)
+    pairs = list(zip(chromosomes[0::2], chromosomes[1::2]))
+    return lambda: [GeneticGlitch.uniform_waveform_crossover(parent1, parent2) for parent1, parent2 in pairs]
+
+
+def bench_mutate(population_size, num_samples):
+    ga = make_ga(population_size, num_samples)
+    return lambda: [ga.mutate(chromosome.make_copy()) for chromosome in ga.population]
+
+
+def bench_pre_generate(population_size, num_samples):
+    ga = make_ga(population_size, num_samples)
+    population = list(ga.population)
+
+    def run():
+        ga.population = list(population)
+        ga.next_generation = []
+        ga.pre_generate()
+    return run
+
+
+def bench_generate(population_size, num_samples):
+    ga = make_ga(population_size, num_samples)
+    elites = list(ga.next_generation)
+
+    def run():
+        ga.next_generation = list(elites)
+        ga.generate()
+    return run
+
+
+BENCHMARKS = {
+    "interpolate_coordinates": bench_interpolate_coordinates,
+    "calc_raw_waveform_int": bench_calc_raw_waveform_int,
+    "generate_bin_stream_to_awg": bench_generate_bin_stream_to_awg,
+    "sim_score_chromosome": bench_sim_score_chromosome,
+    "uniform_waveform_crossover": bench_uniform_waveform_crossover,
+    "mutate": bench_mutate,
+    "pre_generate": bench_pre_generate,
+    "generate": bench_generate,
+}
+
+
+def time_benchmark(function, repeat, min_time):
+    """
+    Time a function with timeit, calling it enough times per repeat to last at least min_time seconds.
+    :return: dict of the best, median and mean seconds per call, and the number of calls per repeat
+    """
+    timer = timeit.Timer(function)
+    number = 1
+    while timer.timeit(number) < min_time and number < 2 ** 20:
+        number *= 2
+    times = np.array(timer.repeat(repeat, number)) / number
+    return {"number": number, "best": float(times.min()), "median": float(np.median(times)),
+            "mean": float(times.mean())}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names, population_sizes, sample_nums, repeat=5, min_time=0.05):
+    """
+    :param names: names of BENCHMARKS to run
+    :param min_time: minimum duration of a repeat in seconds
+    :return: list of result dicts
+    """
+    results = []
+    for num_samples in sample_nums:
+        for population_size in population_sizes:
+            for name in names:
+                np.random.seed(0)
+                random.seed(0)
+                timing = time_benchmark(BENCHMARKS[name](population_size, num_samples), repeat, min_time)
+                result = dict(name=name, population_size=population_size, num_samples=num_samples, **timing)
+                results.append(result)
+                print("{:<28}{:>8}{:>8}{:>14.3f} ms".format(name, population_size, num_samples,
+                                                           result["best"] * 1e3))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the waveform and GA hot paths.")
+    parser.add_argument("--population-sizes", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--sample-nums", type=int, nargs="+", default=[1024, SAMPLE_NUM])
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum duration of a repeat in seconds")
+    parser.add_argument("--output", default="benchmarks.json", help="Path of the JSON results")
+    args = parser.parse_args()
+
+    print("{:<28}{:>8}{:>8}{:>17}".format("benchmark", "pop", "samples", "best per run"))
+    results = run_benchmarks(args.benchmarks, args.population_sizes, args.sample_nums, args.repeat, args.min_time)
+    report = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print("Results written to {}".format(args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+"""Checkpoint and resume for genetic algorithms.
+
+
+Contents
+--------
+
+:CheckpointGA:
+    A GA that periodically writes its complete state (population, scores,
+    elites, fitness cache, progress counters and random number generator
+    states) to a compressed ``.npz`` file in a background thread, and that
+    can resume from such a file exactly where the run stopped.
+:pack_keys:
+    Pack genome keys into an array, for the behaviors that save keyed state.
+:unpack_keys:
+    Unpack the keys of ``pack_keys``.
+
+"""
+from __future__ import division
+
+import json
+import os
+import random
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+import base
+
+CHECKPOINT_VERSION = 1
+CHROMOSOME_PREFIX = "chromosome_"
+
+
+def write_checkpoint(path, arrays):
+    """Write arrays to a compressed ``.npz`` file atomically.
+
+    The file is written next to ``path`` and then renamed over it, so a crash
+    while writing never leaves a truncated checkpoint behind.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".checkpoint-", suffix=".npz", dir=directory)
+    try:
+        os.chmod(tmp_path, 0o644)  # mkstemp creates files readable by the owner only
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def load_checkpoint(path):
+    """Return the arrays of a checkpoint file as a dict."""
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def pack_keys(keys):
+    """Pack genome keys into an array.
+
+    Content hashes (bytes of equal length) are stored as rows of ``uint8``,
+    since numpy's bytes type drops trailing zero bytes. Other keys must be
+    strings.
+    """
+    if len(keys) > 0 and all(isinstance(key, bytes) for key in keys) and len(set(map(len, keys))) == 1:
+        return np.frombuffer(b"".join(keys), dtype=np.uint8).reshape(len(keys), -1)
+    if not all(isinstance(key, str) for key in keys):
+        raise TypeError("Checkpoints only support bytes or str chromosome keys.")
+    return np.array(keys, dtype=str)
+
+
+def unpack_keys(array):
+    if array.dtype == np.uint8:
+        return [row.tobytes() for row in array]
+    return array.tolist()
+
+
+def _json_default(value):
+    # numpy arrays and scalars inside random number generator states
+    return value.tolist()
+
+
+class CheckpointGA(base.GeneticAlgorithm):
+    """A GA that can be checkpointed and resumed.
+
+    Checkpointing is off unless ``checkpoint_file`` is set in the ``config``
+    object to the path of the checkpoint, which is then rewritten every
+    ``checkpoint_every`` generations. Set ``resume_from`` to the path of a
+    checkpoint to continue from when ``solve`` is called. A resumed run
+    continues bit-for-bit like the original one, as long as the
+    configuration is the same and scoring is deterministic.
+
+    Every behavior this GA is mixed with saves and restores its own state
+    (ranking, elites, best scores, fitness cache...) by extending
+    ``save_state`` and ``restore_state``. Chromosomes are saved once each, so
+    chromosomes shared between the population, the ranking and the elites
+    are still shared after resuming. The inheriting class must implement
+    ``pack_chromosomes`` and ``unpack_chromosomes``.
+
+    Mix this behavior in first, so that a checkpoint is taken after every
+    other behavior finished its ``post_generate``.
+    """
+
+    def __init__(self, config={}):
+        super(CheckpointGA, self).__init__(config)
+        self.checkpoint_file = self.config.setdefault("checkpoint_file", None)
+        self.checkpoint_every = self.config.setdefault("checkpoint_every", 10)
+        self.resume_from = self.config.setdefault("resume_from", None)
+        self.checkpoint_writer = None
+        self.checkpoint_future = None
+
+    def pack_chromosomes(self, chromosomes):
+        """Return a dict of arrays holding the given chromosomes."""
+        raise NotImplementedError
+
+    def unpack_chromosomes(self, arrays):
+        """Return the chromosomes of arrays made by ``pack_chromosomes``."""
+        raise NotImplementedError
+
+    def post_generate(self):
+        super(CheckpointGA, self).post_generate()
+
+        if self.checkpoint_file is not None and self.iteration % self.checkpoint_every == 0:
+            with self.profile("checkpoint"):
+                self.save_checkpoint()
+
+    def end_iteration(self):
+        super(CheckpointGA, self).end_iteration()
+
+        if self.checkpoint_file is not None and self.iteration % self.checkpoint_every == 0:
+            with self.profile("checkpoint"):
+                self.save_checkpoint()
+
+    def save_checkpoint(self, path=None):
+        """Snapshot the state and write it in the background.
+
+        The snapshot is copied in the calling thread, so the run can go on
+        while the previous checkpoint is compressed and written. A write
+        error is raised by the next call to ``save_checkpoint`` or
+        ``wait_for_checkpoint``.
+        """
+        arrays = self.checkpoint_state()
+        self.wait_for_checkpoint()
+        if self.checkpoint_writer is None:
+            self.checkpoint_writer = ThreadPoolExecutor(max_workers=1)
+        self.checkpoint_future = self.checkpoint_writer.submit(write_checkpoint, path or self.checkpoint_file, arrays)
+
+    def wait_for_checkpoint(self):
+        """Block until the checkpoint being written is on disk."""
+        if self.checkpoint_future is not None:
+            future, self.checkpoint_future = self.checkpoint_future, None
+            future.result()
+
+    def checkpoint_state(self):
+        """Return the state of the GA as a dict of arrays."""
+        table = []  # every distinct chromosome, once
+        rows = {}
+
+        def ref(chromosome):
+            if chromosome is None:
+                return -1
+            row = rows.get(id(chromosome))
+            if row is None:
+                row = rows[id(chromosome)] = len(table)
+                table.append(chromosome)
+            return row
+
+        arrays = {
+            "version": np.array(CHECKPOINT_VERSION),
+            "rng_states": np.array(json.dumps({
+                "random": random.getstate(),
+                "ga_random": self.random.getstate(),
+                "numpy": np.random.get_state(),
+                "np_random": self.np_random.bit_generator.state,
+            }, default=_json_default)),
+        }
+        self.save_state(arrays, ref)
+        for name, array in self.pack_chromosomes(table).items():
+            arrays[CHROMOSOME_PREFIX + name] = array
+        return arrays
+
+    def resume(self, path=None):
+        """Restore the state of the GA from a checkpoint file."""
+        self.restore_checkpoint(load_checkpoint(path or self.resume_from))
+
+    def restore_checkpoint(self, state):
+        """Restore the state of the GA from a dict made by ``checkpoint_state``."""
+        if int(state["version"]) != CHECKPOINT_VERSION:
+            raise ValueError("Unsupported checkpoint version: {}".format(int(state["version"])))
+        table = self.unpack_chromosomes({name[len(CHROMOSOME_PREFIX):]: array for name, array in state.items()
+                                         if name.startswith(CHROMOSOME_PREFIX)})
+
+        def deref(row):
+            return None if row < 0 else table[row]
+
+        self.restore_state(state, deref)
+        if self.ranked is not None:
+            self.ranked_changed()
+
+        rng_states = json.loads(str(state["rng_states"]))
+        version, internal_state, gauss_next = rng_states["random"]
+        random.setstate((version, tuple(internal_state), gauss_next))
+        version, internal_state, gauss_next = rng_states["ga_random"]
+        self.random.setstate((version, tuple(internal_state), gauss_next))
+        np.random.set_state(tuple(rng_states["numpy"]))
+        self.np_random.bit_generator.state = rng_states["np_random"]
+
+    def solve(self):
+        if self.resume_from is not None and self.population is None:
+            self.resume()
+            print("Resumed from {} at iteration {}".format(self.resume_from, self.iteration))
+        try:
+            return super(CheckpointGA, self).solve()
+        finally:
+            try:
+                self.wait_for_checkpoint()
+            finally:
+                if self.checkpoint_writer is not None:
+                    self.checkpoint_writer.shutdown()
+                    self.checkpoint_writer = None
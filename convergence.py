@@ -0,0 +1,243 @@
+"""Convergence monitoring and stop rules for genetic algorithms.
+
+
+Contents
+--------
+
+:SlidingMinimum:
+    The minimum of the last values of a stream, in amortized O(1) per value.
+:ScoreHistory:
+    A bounded history of the best score of every iteration, which answers
+    "did the best score gain anything in the last ``lookback`` iterations"
+    in O(1), for any number of ``lookback`` windows.
+:EvaluationBudget:
+    A stop rule for a maximum number of evaluations.
+:DiversityCollapse:
+    A stop rule for a population that lost its diversity.
+:Plateau:
+    A stop rule for a best score that stopped improving.
+:ConvergenceGA:
+    A GA that tracks the diversity of its population and stops when one of
+    its stop rules says so.
+
+A stop rule is any callable that takes the GA and returns the reason to
+stop as a string, or ``None`` to go on.
+
+"""
+from __future__ import division
+
+import json
+from collections import deque
+
+import numpy as np
+
+import base
+
+
+class SlidingMinimum(object):
+    """The minimum of the last ``window`` values pushed.
+
+    Values are kept in a deque in increasing order, and a value is dropped
+    as soon as a smaller one is pushed after it, since it can never be the
+    minimum again.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque()  # (index, value), increasing values
+        self.count = 0
+
+    def push(self, value):
+        while self.values and self.values[-1][1] >= value:
+            self.values.pop()
+        self.values.append((self.count, value))
+        self.count += 1
+        if self.values[0][0] <= self.count - 1 - self.window:
+            self.values.popleft()
+
+    @property
+    def minimum(self):
+        return self.values[0][1] if self.values else None
+
+
+class ScoreHistory(object):
+    """The best score of every iteration, keeping only the last ``maxlen``.
+
+    It is appended to like a list (and can be indexed, iterated and
+    cleared), and ``stagnated`` is O(1): every ``lookback`` it was asked
+    for keeps a ``SlidingMinimum`` of the scores before the last one.
+    """
+
+    def __init__(self, maxlen=1024):
+        self.maxlen = maxlen
+        self.scores = deque(maxlen=maxlen)
+        self.count = 0  # number of scores appended since the last clear
+        self.windows = {}  # lookback -> SlidingMinimum of the lookback - 1 scores before the last one
+
+    def __len__(self):
+        return len(self.scores)
+
+    def __iter__(self):
+        return iter(self.scores)
+
+    def __getitem__(self, index):
+        return self.scores[index]
+
+    def append(self, score):
+        if self.scores:
+            for window in self.windows.values():
+                window.push(self.scores[-1])
+        self.scores.append(score)
+        self.count += 1
+
+    def extend(self, scores):
+        for score in scores:
+            self.append(score)
+
+    def clear(self):
+        self.scores.clear()
+        self.count = 0
+        self.windows = {}
+
+    def stagnated(self, lookback, threshold):
+        """Return true if the last score gained at most ``threshold`` over
+        each of the ``lookback - 1`` scores before it."""
+        if lookback >= self.maxlen:
+            raise ValueError("A lookback of {} needs a history longer than {}".format(lookback, self.maxlen))
+        if self.count <= lookback:
+            return False
+        window = self.windows.get(lookback)
+        if window is None:
+            window = self.windows[lookback] = SlidingMinimum(lookback - 1)
+            for index in range(len(self.scores) - lookback, len(self.scores) - 1):
+                window.push(self.scores[index])
+        return self.scores[-1] - window.minimum <= threshold
+
+
+class EvaluationBudget(object):
+    """Stop after ``max_evaluations`` chromosomes were scored."""
+
+    def __init__(self, max_evaluations):
+        self.max_evaluations = max_evaluations
+
+    def __call__(self, ga):
+        if ga.num_evaluations >= self.max_evaluations:
+            return "evaluation budget of {} reached".format(self.max_evaluations)
+        return None
+
+
+class DiversityCollapse(object):
+    """Stop when the population stays without diversity for ``patience`` iterations.
+
+    The population has no diversity when its unique genome ratio is below
+    ``min_unique_ratio`` or its coordinate spread is below ``min_spread``
+    (either can be ``None``). Needs a ``ConvergenceGA``.
+    """
+
+    def __init__(self, min_unique_ratio=None, min_spread=None, patience=3):
+        self.min_unique_ratio = min_unique_ratio
+        self.min_spread = min_spread
+        self.patience = patience
+
+    def collapsed(self, diversity):
+        return ((self.min_unique_ratio is not None and diversity["unique_ratio"] < self.min_unique_ratio)
+                or (self.min_spread is not None and diversity["coordinate_spread"] < self.min_spread))
+
+    def __call__(self, ga):
+        history = ga.diversity_history
+        recent = [history[-i] for i in range(min(self.patience, len(history)), 0, -1)]
+        if len(recent) == self.patience and all(self.collapsed(diversity) for diversity in recent):
+            return "population diversity collapsed: {}".format(recent[-1])
+        return None
+
+
+class Plateau(object):
+    """Stop when the best score gained at most ``threshold`` in ``lookback`` iterations."""
+
+    def __init__(self, lookback, threshold=0.0):
+        self.lookback = lookback
+        self.threshold = threshold
+
+    def __call__(self, ga):
+        if ga.best_scores.stagnated(self.lookback, self.threshold):
+            return "no progress in {} iterations".format(self.lookback)
+        return None
+
+
+class ConvergenceGA(base.GeneticAlgorithm):
+    """A GA with a diversity monitor and pluggable stop rules.
+
+    ``stop_rules`` in the ``config`` object is a list of stop rules, checked
+    in ``is_finished`` after the stop conditions of the other behaviors. If
+    it is not set, it is built from ``evaluation_budget``
+    (``EvaluationBudget``), and ``diversity_min_unique_ratio``,
+    ``diversity_min_spread`` and ``diversity_patience``
+    (``DiversityCollapse``); all of them are off unless set. The rule that stopped the GA is in ``stop_reason``.
+
+    With ``track_diversity`` true (or a ``DiversityCollapse`` rule), the
+    diversity of the population is measured once per iteration by
+    ``population_diversity``, which the inheriting class must implement. The
+    last ``diversity_history_size`` measurements are kept in
+    ``diversity_history``.
+    """
+
+    def __init__(self, config={}):
+        super(ConvergenceGA, self).__init__(config)
+        self.evaluation_budget = self.config.setdefault("evaluation_budget", None)
+        self.diversity_min_unique_ratio = self.config.setdefault("diversity_min_unique_ratio", None)
+        self.diversity_min_spread = self.config.setdefault("diversity_min_spread", None)
+        self.diversity_patience = self.config.setdefault("diversity_patience", 3)
+        self.stop_rules = self.config.setdefault("stop_rules", None)
+        if self.stop_rules is None:
+            self.stop_rules = self.default_stop_rules()
+        self.track_diversity = self.config.setdefault("track_diversity", False) or \
+            any(isinstance(rule, DiversityCollapse) for rule in self.stop_rules)
+        self.diversity_history = deque(maxlen=self.config.setdefault("diversity_history_size", 1024))
+        self.diversity_iteration = None
+        self.stop_reason = None
+
+    def default_stop_rules(self):
+        rules = []
+        if self.evaluation_budget is not None:
+            rules.append(EvaluationBudget(self.evaluation_budget))
+        if self.diversity_min_unique_ratio is not None or self.diversity_min_spread is not None:
+            rules.append(DiversityCollapse(self.diversity_min_unique_ratio, self.diversity_min_spread,
+                                           self.diversity_patience))
+        return rules
+
+    def population_diversity(self):
+        """Return a dict of diversity measures of the population, with at
+        least ``unique_ratio`` and ``coordinate_spread``."""
+        raise NotImplementedError
+
+    def save_state(self, state, ref):
+        super(ConvergenceGA, self).save_state(state, ref)
+        if self.track_diversity:
+            # The measures are a dict per iteration, so they are saved as JSON like the random states
+            state["diversity_history"] = np.array(json.dumps(list(self.diversity_history)))
+            state["diversity_iteration"] = np.array(-1 if self.diversity_iteration is None else self.diversity_iteration)
+
+    def restore_state(self, state, deref):
+        super(ConvergenceGA, self).restore_state(state, deref)
+        if self.track_diversity and "diversity_history" in state:
+            self.diversity_history.clear()
+            self.diversity_history.extend(json.loads(str(state["diversity_history"])))
+            diversity_iteration = int(state["diversity_iteration"])
+            self.diversity_iteration = None if diversity_iteration < 0 else diversity_iteration
+
+    def is_finished(self):
+        if super(ConvergenceGA, self).is_finished():
+            return True
+
+        # Measured once per iteration, also in steady-state mode where this is checked after every evaluation
+        if self.track_diversity and self.population and self.diversity_iteration != self.iteration:
+            self.diversity_history.append(self.population_diversity())
+            self.diversity_iteration = self.iteration
+
+        for rule in self.stop_rules:
+            reason = rule(self)
+            if reason is not None:
+                self.stop_reason = reason
+                print("Stopped: {}".format(reason))
+                return True
+        return False
@@ -0,0 +1,166 @@
+"""Fitness caching for genetic algorithms.
+
+
+Contents
+--------
+
+:FitnessCache:
+    A bounded, least-recently-used mapping from genome keys to scores, with
+    hit and miss counters.
+
+:CachedFitnessGA:
+    A GA that looks up every chromosome in a ``FitnessCache`` before scoring
+    it, so elites, unchanged members and repeated scoring passes are not
+    evaluated again.
+
+"""
+from __future__ import division
+
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+import base
+from checkpoint import pack_keys, unpack_keys
+
+
+def genome_key(chromosome):
+    """Return a content hash of a waveform chromosome (coordinates, freq and number of samples)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(np.ascontiguousarray(chromosome.coordinates, dtype=float).tobytes())
+    digest.update(np.float64(chromosome.freq).tobytes())
+    digest.update(np.int64(chromosome.num_samples).tobytes())
+    return digest.digest()
+
+
+class FitnessCache(object):
+    """A least-recently-used cache of fitness scores."""
+
+    def __init__(self, max_size=1024):
+        """
+        Args:
+            max_size (int): Maximum number of scores kept. A size of 0 disables
+                the cache.
+        """
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def get(self, key):
+        """Return the cached score of ``key``, or None on a miss."""
+        score = self.entries.get(key)
+        if score is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return score
+
+    def put(self, key, score):
+        """Store a score, evicting the least recently used entry when full."""
+        if self.max_size <= 0:
+            return
+        self.entries[key] = score
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+class CachedFitnessGA(base.GeneticAlgorithm):
+    """A GA that caches scores by genome content.
+
+    Set ``fitness_cache_size`` in the ``config`` object to the number of
+    scores to keep (0 disables caching). Chromosomes are identified with
+    ``chromosome_key``, so two chromosomes with the same genome share a cache
+    entry even if they are different objects. Estimated scores (see
+    ``base.EstimatedScore``) are not cached.
+    """
+
+    def __init__(self, config={}):
+        super(CachedFitnessGA, self).__init__(config)
+        self.fitness_cache_size = self.config.setdefault("fitness_cache_size", 1024)
+        self.fitness_cache = FitnessCache(self.fitness_cache_size)
+        self.pending_scores = {}  # key -> Future of a submitted chromosome
+
+    def evaluate(self, chromosomes):
+        """Score only the chromosomes that are not in the cache."""
+        if self.fitness_cache_size <= 0:
+            return super(CachedFitnessGA, self).evaluate(chromosomes)
+
+        keys = [self.chromosome_key(chromosome) for chromosome in chromosomes]
+        scores = [self.fitness_cache.get(key) for key in keys]
+        misses = [i for i, score in enumerate(scores) if score is None]
+
+        # Score every distinct missing genome once
+        unique = OrderedDict()
+        for i in misses:
+            unique.setdefault(keys[i], i)
+        if len(unique) > 0:
+            new_scores = super(CachedFitnessGA, self).evaluate([chromosomes[i] for i in unique.values()])
+            for key, score in zip(unique.keys(), new_scores):
+                if not isinstance(score, base.EstimatedScore):
+                    self.fitness_cache.put(key, score)
+            new_scores = dict(zip(unique.keys(), new_scores))
+            for i in misses:
+                scores[i] = new_scores[keys[i]]
+
+        return scores
+
+    def save_state(self, state, ref):
+        super(CachedFitnessGA, self).save_state(state, ref)
+        entries = self.fitness_cache.entries  # least recently used first
+        state["fitness_cache_keys"] = pack_keys(list(entries.keys()))
+        state["fitness_cache_scores"] = np.array(list(entries.values()), dtype=float)
+        state["fitness_cache_counts"] = np.array([self.fitness_cache.hits, self.fitness_cache.misses])
+
+    def restore_state(self, state, deref):
+        super(CachedFitnessGA, self).restore_state(state, deref)
+        self.fitness_cache.entries = OrderedDict(zip(unpack_keys(state["fitness_cache_keys"]),
+                                                     state["fitness_cache_scores"].tolist()))
+        self.fitness_cache.hits, self.fitness_cache.misses = state["fitness_cache_counts"].tolist()
+
+    def submit(self, chromosome):
+        """Return a finished ``Future`` for cached genomes, and share the
+        ``Future`` of genomes that are already being scored."""
+        if self.fitness_cache_size <= 0:
+            return super(CachedFitnessGA, self).submit(chromosome)
+
+        # Scores that arrived since the last call, added here since futures finish in other threads
+        for key, future in list(self.pending_scores.items()):
+            if future.done():
+                del self.pending_scores[key]
+                if (not future.cancelled() and future.exception() is None
+                        and not isinstance(future.result(), base.EstimatedScore)):
+                    self.fitness_cache.put(key, future.result())
+
+        key = self.chromosome_key(chromosome)
+        future = self.pending_scores.get(key)
+        if future is not None:
+            return future
+        if key in self.fitness_cache:
+            future = Future()
+            future.set_result(self.fitness_cache.get(key))
+            return future
+        future = super(CachedFitnessGA, self).submit(chromosome)
+        # A Future that is already done was scored through evaluate, which counted the miss and cached the score
+        if not future.done():
+            self.fitness_cache.misses += 1
+            self.pending_scores[key] = future
+        return future
@@ -47,6 +47,25 @@ config.setdefault("mutation_add_or_remove_prob", 0.01)
 config.setdefault("mutation_random_parent_crossover_prob", 0.01)
 config.setdefault("threshold", 0.0001)
 config.setdefault("lookback", 80)
+config.setdefault("resolution_schedule", None)  # e.g. [512, 2048, SAMPLE_NUM], raised when progress is slow
+config.setdefault("resolution_lookback", 10)
+config.setdefault("evaluation_budget", None)  # stop after this many scored chromosomes, see convergence.ConvergenceGA
+config.setdefault("diversity_min_unique_ratio", None)  # stop when fewer genomes of the population are distinct
+config.setdefault("batch_scoring", True)
+config.setdefault("coarse_scoring", False)  # in simulation, score at full resolution only the possible elites
+config.setdefault("batch_operators", True)
+config.setdefault("fitness_cache_size", 1024)
+config.setdefault("selection_sampling", "roulette")  # or "sus" (stochastic universal sampling)
+config.setdefault("executor", "serial")  # "process" to score the population on all cores
+config.setdefault("steady_state", False)  # replace one member per evaluation instead of whole generations
+config.setdefault("racing", False)  # measure scores with adaptively allocated glitch attempts
+config.setdefault("surrogate", False)  # screen offspring with a model trained on the scores seen so far
+config.setdefault("stats_format", "binary")  # generation statistics records, read them with stats.load_stats
+config.setdefault("stats_file", None)  # path to write the statistics of every generation to
+config.setdefault("checkpoint_file", None)  # path to checkpoint the run to, every checkpoint_every generations
+config.setdefault("checkpoint_every", 10)
+config.setdefault("resume_from", None)  # path of a checkpoint to continue a stopped run from
+config.setdefault("profile", False)  # time the phases of every generation, see profiling.ProfilingGA
 
 
 def convert_int_to_comp2_binary_string(val: int, bits: int):
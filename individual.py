@@ -1,33 +1,146 @@
 from global_constants_and_functions import *
+from awg_encoder import dac_samples, encode_waveform, encode_binary_string
+from interpolation import get_plan
+import itertools
+
+# Chromosome ids are consecutive integers, unique within the process (the run)
+_chromosome_ids = itertools.count(1)
+
+
+def next_chromosome_id():
+    return next(_chromosome_ids)
+
+
+def peek_chromosome_id():
+    """
+    :return: the id the next chromosome will get, without using it
+    """
+    global _chromosome_ids
+    next_id = next(_chromosome_ids)
+    _chromosome_ids = itertools.count(next_id)
+    return next_id
+
+
+def set_next_chromosome_id(next_id):
+    """
+    Continue the ids from next_id, used when resuming a run from a checkpoint.
+    """
+    global _chromosome_ids
+    _chromosome_ids = itertools.count(next_id)
+
+
+def format_chromosome(chromosome_id, freq, coordinates):
+    """
+    :return: the readable string of a chromosome, given its attributes
+    """
+    return "id = {}\nfreq = {:.4g}\ncoordinates =\n{}\n".format(chromosome_id, freq,
+                                                               np.array2string(coordinates, precision=3))
 
 
 class Chromosome():
     """An individual class that contains the glitch attributes as genes/locuses of a chromosome.
+    Uses __slots__ to keep the many chromosomes of large populations small.
+    The interpolated waveform, its DAC samples and the AWG bytes are computed lazily and kept until the coordinates
+    or number of samples change. Assigning coordinates or num_samples invalidates them, code that edits the
+    coordinates array in place must call invalidate_waveforms().
     """
+    __slots__ = ('_num_samples', 'length', '_coordinates', 'freq', 'max_dac_int', 'min_dac_int',
+                 'raw_waveform_int_list', 'id', '_waveform', '_dac_waveform', '_awg_bytes')
 
     def __init__(self, length=N, freq=None, num_samples=SAMPLE_NUM,
                  min_freq=MIN_FREQ, max_freq=MAX_FREQ, mode_freq=MAX_FREQ,
-                 max_dac_int=MAX_DAC_INT, min_dac_int=MIN_DAC_INT):
+                 max_dac_int=MAX_DAC_INT, min_dac_int=MIN_DAC_INT, coordinates=None):
         """ Initializes new chromosome with random parameters.
         :param length: length of coordinate list (excluding endpoints)
         :param freq: frequency parameter to the AWG, determines length of pulse
+        :param coordinates: optional (sorted) coordinates array to use instead of random ones, overrides length
         """
         self.num_samples = num_samples
-        self.length = length
-        self.coordinates = self.calculate_random_coordinates(self.length)
+        if coordinates is None:
+            self.length = length
+            self.coordinates = self.calculate_random_coordinates(self.length)
+        else:
+            self.length = coordinates.shape[0]
+            self.coordinates = coordinates
         if freq is None:
             self.freq = np.random.triangular(min_freq, mode_freq, max_freq)
         else:
             self.freq = freq
         self.max_dac_int = max_dac_int
         self.min_dac_int = min_dac_int
+        self.id = next_chromosome_id()
+
+    def __getstate__(self):
+        # Cached waveforms are not pickled, they are cheaper to recompute than to send to another process
+        return {'num_samples': self._num_samples, 'length': self.length, 'coordinates': self._coordinates,
+                'freq': self.freq, 'max_dac_int': self.max_dac_int, 'min_dac_int': self.min_dac_int, 'id': self.id}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    @property
+    def coordinates(self):
+        return self._coordinates
+
+    @coordinates.setter
+    def coordinates(self, coordinates):
+        self._coordinates = coordinates
+        self.invalidate_waveforms()
+
+    @property
+    def num_samples(self):
+        return self._num_samples
+
+    @num_samples.setter
+    def num_samples(self, num_samples):
+        self._num_samples = num_samples
+        self.invalidate_waveforms()
+
+    def invalidate_waveforms(self):
+        """
+        Drop the cached waveforms, must be called after the coordinates array is changed in place.
+        """
+        self._waveform = None
+        self._dac_waveform = None
+        self._awg_bytes = None
         self.raw_waveform_int_list = None
-        self.id = uuid.uuid4()
+
+    @property
+    def waveform_is_cached(self):
+        return self._waveform is not None
+
+    @property
+    def waveform(self):
+        """
+        The interpolated waveform samples (read only).
+        """
+        if self._waveform is None:
+            self._waveform = get_plan(self.num_samples).evaluate(self.coordinates)
+            self._waveform.setflags(write=False)
+        return self._waveform
+
+    @property
+    def dac_waveform(self):
+        """
+        The int16 DAC samples of the waveform (read only).
+        """
+        if self._dac_waveform is None:
+            self._dac_waveform = dac_samples(self.waveform, self.max_dac_int, self.min_dac_int)
+            self._dac_waveform.setflags(write=False)
+        return self._dac_waveform
+
+    @property
+    def awg_bytes(self):
+        """
+        The waveform encoded as sent to the AWG.
+        """
+        if self._awg_bytes is None:
+            self._awg_bytes = encode_waveform(self.dac_waveform)
+        return self._awg_bytes
 
     def __str__(self):
-        return "id = {}\nfreq = {:.4g}\ncoordinates =\n{}\n".format(self.id,
-                                                                    self.freq,
-                                                                    np.array2string(self.coordinates, precision=3))
+        return format_chromosome(self.id, self.freq, self.coordinates)
 
     def __repr__(self):
         return "id = {}, freq = {:.4g}, coordinates = {}".format(self.id,
@@ -61,8 +174,10 @@ class Chromosome():
         """
         Convert coordinates to array of integers to be sent to AWG.
         *** Currently offset not supported. ***
-        :return: x_samples, y_samples
+        :return: x_samples, y_samples (new arrays the caller may change, use the waveform property to avoid the copy)
         """
+        if interp_method == 'quadratic':
+            return get_plan(self.num_samples).x_samples.copy(), self.waveform.copy()
         coordinates_to_interpolate = np.concatenate([[[0, 0]], self.coordinates, [[1, 0]]], axis=0)
         interp_func = interp1d(coordinates_to_interpolate[:, 0],
                                coordinates_to_interpolate[:, 1], kind=interp_method)
@@ -80,19 +195,21 @@ class Chromosome():
         ax.scatter(self.coordinates[:, 0], self.coordinates[:, 1], c='r')
         ax.grid()
 
+    def calc_raw_waveform_array(self):
+        """
+        Calculate raw waveform data as an int16 array of DAC samples (read only).
+        """
+        return self.dac_waveform
+
     def calc_raw_waveform_int(self):
         """
-        Calculate raw waveform data in integer type
+        Calculate raw waveform data in integer type, as a list (kept for compatibility, prefer calc_raw_waveform_array).
         """
-        _, y_samples = self.interpolate_coordinates()
-        y_samples *= self.max_dac_int
-        y_samples[y_samples > self.max_dac_int] = self.max_dac_int
-        y_samples[y_samples < self.min_dac_int] = self.min_dac_int
-        self.raw_waveform_int_list = (np.int_(np.round(y_samples))).tolist()
+        self.raw_waveform_int_list = self.calc_raw_waveform_array().tolist()
 
     def plot_waveform_int(self):
         self.calc_raw_waveform_int()
-        x_samples = np.arange(self.num_samples) / (self.num_samples - 1)
+        x_samples = get_plan(self.num_samples).x_samples
         fig, ax = plt.subplots()
         ax.plot(x_samples, self.raw_waveform_int_list, c='b')
         ax.scatter(self.coordinates[:, 0], self.coordinates[:, 1] * self.max_dac_int, c='r')
@@ -102,16 +219,16 @@ class Chromosome():
         """
         :return: string of data to visualize what is sent to the AWG
         """
-        self.calc_raw_waveform_int()
-        binary_string = ''.join([convert_int_to_comp2_binary_string(x, 16) for x in self.raw_waveform_int_list])
-        return binary_string
+        return encode_binary_string(self.calc_raw_waveform_array())
 
-    def generate_bin_stream_to_awg(self):
+    def generate_bin_stream_to_awg(self, encoder=None):
         """
-        :return: string to send to AWG
+        :param encoder: optional AwgEncoder, to encode into its reusable buffer instead of new bytes
+        :return: string to send to AWG (memoryview into the encoder's buffer if an encoder is given)
         """
-        self.calc_raw_waveform_int()
-        return b''.join([convert_int_to_comp2_ascii(x, 2) for x in self.raw_waveform_int_list])
+        if encoder is not None:
+            return encoder.encode(self.dac_waveform)
+        return self.awg_bytes
 
     def add_noise(self):
         """
@@ -120,6 +237,7 @@ class Chromosome():
         """
         self.coordinates[:, 1] += np.random.randn(self.length) * 0.1
         self.freq += np.random.randn() * MIN_FREQ
+        self.invalidate_waveforms()
 
     def is_point_in_chromosome(self, point) -> bool:
         """
@@ -158,15 +276,27 @@ class Chromosome():
         self.coordinates = self.coordinates[self.coordinates[:, 0].argsort()]  # sort x values
 
     def generate_new_id(self):
-        self.id = uuid.uuid4()
+        self.id = next_chromosome_id()
 
     def make_copy(self):
         """
         return identical copy with different ID.
+        Only the coordinates array is copied. The cached waveforms are read only, so they are shared with the copy
+        until one of them changes.
         :return:
         """
-        copy = deepcopy(self)
-        copy.generate_new_id()
+        copy = self.__class__.__new__(self.__class__)
+        copy._num_samples = self._num_samples
+        copy.length = self.length
+        copy._coordinates = self._coordinates.copy()
+        copy.freq = self.freq
+        copy.max_dac_int = self.max_dac_int
+        copy.min_dac_int = self.min_dac_int
+        copy.raw_waveform_int_list = None
+        copy.id = next_chromosome_id()
+        copy._waveform = self._waveform
+        copy._dac_waveform = self._dac_waveform
+        copy._awg_bytes = self._awg_bytes
         return copy
 
 
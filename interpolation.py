@@ -0,0 +1,181 @@
+"""
+Fast quadratic spline interpolation of chromosome coordinates onto a fixed sampling grid.
+The spline is the same one scipy's interp1d(kind='quadratic') builds (an interpolating B-spline of degree 2, with
+knots at the midpoints between the points), but it is solved directly for a whole batch of chromosomes, converted
+to one quadratic polynomial per interval, and evaluated onto a sampling grid that is computed once per number of
+samples.
+"""
+from functools import lru_cache
+
+from global_constants_and_functions import *
+
+# Number of samples evaluated at once by InterpolationPlan.evaluate_batch, to bound temporary memory
+EVALUATE_BLOCK_SAMPLES = 1 << 20
+
+
+def _quadratic_basis(t, m, x):
+    """
+    Values of the 3 non zero B-spline basis functions of degree 2 at x, which lies in the knot interval
+    [t[m], t[m + 1]]. Works element wise on arrays: t has one more axis than m and x.
+    :return: values of B_(m-2), B_(m-1), B_m
+    """
+    t_prev = np.take_along_axis(t, m - 1, axis=-1)
+    t_left = np.take_along_axis(t, m, axis=-1)
+    t_right = np.take_along_axis(t, m + 1, axis=-1)
+    t_next = np.take_along_axis(t, m + 2, axis=-1)
+    left1, left2 = x - t_left, x - t_prev
+    right1, right2 = t_right - x, t_next - x
+    n0 = right1 / (right1 + left1)
+    n1 = left1 / (right1 + left1)
+    b0 = right1 * n0 / (right1 + left2)
+    b2 = left1 * n1 / (right2 + left1)
+    return b0, left2 * n0 / (right1 + left2) + right2 * n1 / (right2 + left1), b2
+
+
+def fit_quadratic_splines(coordinates, lengths):
+    """
+    Fit the interpolating quadratic spline through (0, 0), the coordinates of every row, and (1, 0).
+    :param coordinates: array of shape (rows, max length, 2), with sorted x values in coordinates[i, :lengths[i]]
+    :param lengths: number of valid points in every row, at least 1
+    :return: left_edges, poly where left_edges[i, k] is the start of the k'th interval of row i, and on that interval
+        the spline is poly[i, k, 0] + poly[i, k, 1] * dx + poly[i, k, 2] * dx ** 2, with dx = x - left_edges[i, k].
+        Row i has lengths[i] intervals, the rest is padded with nan.
+    """
+    lengths = np.asarray(lengths, dtype=int)
+    if (lengths < 1).any():
+        raise ValueError("Quadratic interpolation needs at least one point besides the endpoints.")
+    rows, max_length = coordinates.shape[0], lengths.max()
+    left_edges = np.full([rows, max_length], np.nan)
+    poly = np.full([rows, max_length, 3], np.nan)
+
+    for length in np.unique(lengths):
+        group = np.flatnonzero(lengths == length)
+        num_points = length + 2
+        x = np.zeros([group.size, num_points])
+        y = np.zeros([group.size, num_points])
+        x[:, -1] = 1
+        x[:, 1:-1] = coordinates[group, :length, 0]
+        y[:, 1:-1] = coordinates[group, :length, 1]
+
+        # Knots: both endpoints 3 times, and the midpoints between the points, except the first and last midpoint
+        midpoints = (x[:, 1:] + x[:, :-1]) / 2
+        t = np.concatenate([x[:, :1].repeat(3, axis=1), midpoints[:, 1:-1], x[:, -1:].repeat(3, axis=1)], axis=1)
+
+        # Collocation: every point lies in the knot interval m, in which only B_(m-2), B_(m-1), B_m are non zero
+        m = 2 + (t[:, None, 3:num_points] <= x[:, :, None]).sum(axis=-1)
+        m = np.minimum(m, num_points - 1)
+        basis = _quadratic_basis(t[:, None, :].repeat(num_points, axis=1), m[..., None], x[..., None])
+        collocation = np.zeros([group.size, num_points, num_points])
+        group_index = np.arange(group.size)[:, None]
+        point_index = np.arange(num_points)[None, :]
+        for r in range(3):
+            collocation[group_index, point_index, m - 2 + r] = basis[r][..., 0]
+        c = np.linalg.solve(collocation, y[..., None])[..., 0]
+
+        # Power basis of every interval m in [2, num_points - 1]
+        m = np.arange(2, num_points)
+        t_prev, t_left, t_right, t_next = t[:, m - 1], t[:, m], t[:, m + 1], t[:, m + 2]
+        h = t_right - t_left
+        value = (h * c[:, m - 2] + (t_left - t_prev) * c[:, m - 1]) / (t_right - t_prev)
+        slope_left = 2 * (c[:, m - 1] - c[:, m - 2]) / (t_right - t_prev)
+        slope_right = 2 * (c[:, m] - c[:, m - 1]) / (t_next - t_left)
+        left_edges[group, :length] = t_left
+        poly[group, :length, 0] = value
+        poly[group, :length, 1] = slope_left
+        poly[group, :length, 2] = (slope_right - slope_left) / (2 * h)
+
+    return left_edges, poly
+
+
+class InterpolationPlan():
+    """The sampling grid of a given number of samples, and the evaluation of quadratic splines onto it.
+    Use get_plan() to share one plan per number of samples.
+    """
+
+    def __init__(self, num_samples=SAMPLE_NUM, x_samples=None):
+        """
+        :param x_samples: optional sorted sampling points in [0, 1], starting at 0, instead of the regular grid
+        """
+        if x_samples is None:
+            x_samples = np.arange(num_samples) / (num_samples - 1)
+        self.num_samples = len(x_samples)
+        self.x_samples = np.array(x_samples, dtype=float)
+        self.x_samples.setflags(write=False)
+
+    def evaluate(self, coordinates):
+        """
+        :param coordinates: sorted coordinates of one chromosome, shape (length, 2)
+        :return: y_samples of the interpolated waveform
+        """
+        return self.evaluate_batch(coordinates[None], [coordinates.shape[0]])[0]
+
+    def evaluate_batch(self, coordinates, lengths, out=None):
+        """
+        Interpolate a batch of chromosomes.
+        :param coordinates: padded array of shape (rows, max length, 2)
+        :param lengths: number of valid points in every row
+        :param out: optional array of shape (rows, num_samples) to write the result to
+        :return: y_samples array of shape (rows, num_samples)
+        """
+        left_edges, poly = fit_quadratic_splines(coordinates, lengths)
+        return self.evaluate_polynomials(left_edges, poly, lengths, out)
+
+    def evaluate_polynomials(self, left_edges, poly, lengths, out=None):
+        """
+        Evaluate piecewise polynomials, as returned by fit_quadratic_splines, on the sampling grid.
+        """
+        lengths = np.asarray(lengths, dtype=int)
+        rows = left_edges.shape[0]
+        if out is None:
+            out = np.empty([rows, self.num_samples])
+        # The intervals of a row cover its samples in order, so every polynomial coefficient is repeated once for
+        # every sample in its interval. Intervals are flattened in row major order.
+        valid = np.arange(left_edges.shape[1])[None, :] < lengths[:, None]
+        row_index, interval_index = np.nonzero(valid)
+        flat_left_edges = left_edges[valid]
+        flat_poly = poly[valid]
+        first_sample = np.searchsorted(self.x_samples, flat_left_edges)
+        first_sample[interval_index == 0] = 0
+        end_sample = np.empty_like(first_sample)
+        end_sample[:-1] = first_sample[1:]
+        end_sample[np.append(interval_index[1:] == 0, True)] = self.num_samples
+        counts = end_sample - first_sample
+
+        rows_per_block = max(1, EVALUATE_BLOCK_SAMPLES // self.num_samples)
+        for start in range(0, rows, rows_per_block):
+            stop = min(start + rows_per_block, rows)
+            lo, hi = np.searchsorted(row_index, [start, stop])
+            block_counts = counts[lo:hi]
+            shape = (stop - start, self.num_samples)
+            dx = np.repeat(flat_left_edges[lo:hi], block_counts).reshape(shape)
+            np.subtract(self.x_samples, dx, out=dx)
+            y_samples = out[start:stop]
+            y_samples[...] = np.repeat(flat_poly[lo:hi, 2], block_counts).reshape(shape)
+            y_samples *= dx
+            y_samples += np.repeat(flat_poly[lo:hi, 1], block_counts).reshape(shape)
+            y_samples *= dx
+            y_samples += np.repeat(flat_poly[lo:hi, 0], block_counts).reshape(shape)
+        return out
+
+
+def spline_slopes(left_edges, poly, lengths):
+    """
+    The largest absolute slope of every row of piecewise polynomials, as returned by fit_quadratic_splines.
+    The slope is linear on every interval, so it is largest at one of the ends of an interval.
+    :return: array of one Lipschitz constant per row
+    """
+    lengths = np.asarray(lengths, dtype=int)
+    rows = left_edges.shape[0]
+    right_edges = np.full_like(left_edges, np.nan)
+    right_edges[:, :-1] = left_edges[:, 1:]
+    right_edges[np.arange(rows), lengths - 1] = 1
+    slope_right = poly[..., 1] + 2 * poly[..., 2] * (right_edges - left_edges)
+    return np.nanmax(np.maximum(np.abs(poly[..., 1]), np.abs(slope_right)), axis=1)
+
+
+@lru_cache(maxsize=None)
+def get_plan(num_samples=SAMPLE_NUM):
+    """
+    :return: the shared InterpolationPlan of num_samples samples
+    """
+    return InterpolationPlan(num_samples)
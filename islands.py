@@ -0,0 +1,221 @@
+"""Island model for genetic algorithms.
+
+
+Contents
+--------
+
+:MigrationGA:
+    A GA that sends its fittest chromosomes to other islands every few
+    generations, and replaces its worst chromosomes with the ones it receives.
+
+:IslandModel:
+    Runs several GAs ("islands") in separate processes, each with its own
+    random seed and optionally its own configuration, connected by
+    ``multiprocessing`` queues in a ring or all-to-all topology, and returns
+    the best chromosome found by any of them.
+
+Migration is asynchronous: an island takes whatever migrants arrived since
+its last migration and never waits for the others, so islands that finish
+early (for instance by ``behavior.FinishWhenSlowGA``) do not block the rest.
+
+"""
+from __future__ import division
+
+import multiprocessing
+import os
+import queue
+import random
+
+import numpy as np
+
+import base
+
+# Config values that are paths of files written by the GA, made unique per island
+ISLAND_FILE_KEYS = ("checkpoint_file", "stats_file", "best_chromosome_file", "population_file")
+
+
+class MigrationGA(base.GeneticAlgorithm):
+    """A GA that exchanges chromosomes with other islands.
+
+    Every ``migration_interval`` generations, the ``num_migrants`` fittest
+    chromosomes of the ranked population are put in every queue of
+    ``outboxes``, and the chromosomes found in ``inbox`` replace the worst
+    ranked members of the population, which is then ranked again. Both
+    queues are set by ``IslandModel``; without them, this GA runs alone.
+
+    Received chromosomes are copied with ``make_copy``, so they get ids that
+    are unique in this process.
+    """
+
+    def __init__(self, config={}):
+        super(MigrationGA, self).__init__(config)
+        self.migration_interval = self.config.setdefault("migration_interval", 10)
+        self.num_migrants = self.config.setdefault("num_migrants", 2)
+        self.inbox = None
+        self.outboxes = []
+        self.num_immigrants = 0
+
+    def post_generate(self):
+        super(MigrationGA, self).post_generate()
+
+        if self.iteration % self.migration_interval == 0:
+            self.migrate()
+
+    def emigrants(self):
+        """Return the chromosomes to send to other islands."""
+        if self.ranked is None or self.ranked_population is not self.population:
+            self.score_population()
+        return [member for member, _ in self.ranked[:self.num_migrants]]
+
+    def immigrate(self, chromosomes):
+        """Replace the worst ranked members of the population."""
+        chromosomes = chromosomes[:len(self.ranked)]
+        if len(chromosomes) == 0:
+            return
+        worst = {id(member) for member, _ in self.ranked[len(self.ranked) - len(chromosomes):]}
+        self.population = [member for member in self.population if id(member) not in worst] + chromosomes
+        self.num_immigrants += len(chromosomes)
+        self.score_population()
+        self.ranked_changed()
+
+    def migrate(self):
+        migrants = self.emigrants()
+        for outbox in self.outboxes:
+            outbox.put(migrants)
+
+        arrived = []
+        while self.inbox is not None:
+            try:
+                arrived += [chromosome.make_copy() for chromosome in self.inbox.get_nowait()]
+            except queue.Empty:
+                break
+        # The fittest arrivals first, in case more arrived than there is room for
+        if len(arrived) > 0:
+            scores = self.evaluate(arrived)
+            order = np.argsort(scores, kind="stable")[::-1]
+            self.immigrate([arrived[i] for i in order])
+
+
+def island_config(config, index, overrides=None):
+    """Return the config of island ``index``: a copy of ``config`` with its
+    own output files, updated with ``overrides``."""
+    config = dict(config)
+    config["executor"] = "serial"  # the islands already use one process each
+    for key in ISLAND_FILE_KEYS:
+        if isinstance(config.get(key), str):
+            root, ext = os.path.splitext(config[key])
+            config[key] = "{}.island{}{}".format(root, index, ext)
+    config.update(overrides or {})
+    return config
+
+
+def _run_island(index, ga_class, config, inbox, outboxes, results):
+    seed = config["random_seed"]
+    random.seed(seed)
+    np.random.seed(None if seed is None else seed % 2 ** 32)
+    island_class = type("Island" + ga_class.__name__, (MigrationGA, ga_class), {})
+    ga = island_class(config)
+    ga.inbox = inbox
+    ga.outboxes = outboxes
+    try:
+        best = ga.solve()
+        results.put({
+            "island": index,
+            "best": best,
+            "fitness": ga.best_fitness if hasattr(ga, "best_fitness") else ga.evaluate([best])[0],
+            "iterations": ga.iteration,
+            "evaluations": ga.num_evaluations,
+            "immigrants": ga.num_immigrants,
+        })
+    except BaseException as error:
+        results.put({"island": index, "error": repr(error)})
+        raise
+    finally:
+        # Migrants for islands that already finished are never read, don't wait for them to be sent
+        for outbox in outboxes:
+            outbox.cancel_join_thread()
+
+
+class IslandModel(object):
+    """Runs a GA on several islands in parallel processes.
+
+    Args:
+        ga_class (type): The GA of every island, a module-level class.
+        config (Dict): The base configuration of the islands. Its
+            ``random_seed`` (if any) seeds the seeds of the islands, and
+            ``migration_interval`` and ``num_migrants`` control migration.
+            File paths are made unique per island, and every island scores
+            serially.
+        num_islands (int): Number of islands (processes).
+        topology (str): ``"ring"`` sends migrants to the next island,
+            ``"all"`` to every other island.
+        island_configs (List[Dict]): Optional per island config overrides,
+            for instance different mutation rates.
+    """
+
+    def __init__(self, ga_class, config={}, num_islands=None, topology="ring", island_configs=None):
+        self.ga_class = ga_class
+        self.config = config
+        self.num_islands = num_islands or os.cpu_count() or 1
+        self.topology = topology
+        self.island_configs = island_configs or [{}] * self.num_islands
+        self.results = []
+
+        if self.topology not in ("ring", "all"):
+            raise ValueError("Unknown island topology: {}".format(self.topology))
+        if len(self.island_configs) != self.num_islands:
+            raise ValueError("Expected {} island configs, got {}".format(self.num_islands, len(self.island_configs)))
+
+    def neighbors(self, index):
+        """Return the islands that island ``index`` sends migrants to."""
+        if self.num_islands == 1:
+            return []
+        if self.topology == "ring":
+            return [(index + 1) % self.num_islands]
+        return [other for other in range(self.num_islands) if other != index]
+
+    def solve(self):
+        """Run all islands until they finish and return the best chromosome."""
+        seeds = np.random.SeedSequence(self.config.get("random_seed")).generate_state(self.num_islands)
+        inboxes = [multiprocessing.Queue() for _ in range(self.num_islands)]
+        results = multiprocessing.Queue()
+        processes = []
+        for index in range(self.num_islands):
+            config = island_config(self.config, index, self.island_configs[index])
+            if "random_seed" not in self.island_configs[index]:
+                config["random_seed"] = int(seeds[index])
+            outboxes = [inboxes[other] for other in self.neighbors(index)]
+            process = multiprocessing.Process(target=_run_island, name="island-{}".format(index),
+                                              args=(index, self.ga_class, config, inboxes[index], outboxes, results))
+            process.start()
+            processes.append(process)
+
+        try:
+            self.results = sorted([results.get() for _ in processes], key=lambda result: result["island"])
+        finally:
+            for inbox in inboxes:  # unread migrants
+                while True:
+                    try:
+                        inbox.get_nowait()
+                    except queue.Empty:
+                        break
+            for process in processes:
+                process.join()
+
+        errors = [result for result in self.results if "error" in result]
+        if len(errors) > 0:
+            raise RuntimeError("Island {} failed: {}".format(errors[0]["island"], errors[0]["error"]))
+        best = max(self.results, key=lambda result: result["fitness"])
+        print("Best chromosome found by island {} with fitness {}".format(best["island"], best["fitness"]))
+        return best["best"]
+
+
+if __name__ == "__main__":
+    from GeneticGlitch import GeneticGlitch
+    from global_constants_and_functions import config
+
+    model = IslandModel(GeneticGlitch, dict(config, max_iterations=30, random_seed=1), num_islands=4)
+    model.solve()
+    for result in model.results:
+        print("island {island}: fitness {fitness:.4f}, {iterations} iterations, {evaluations} evaluations, "
+              "{immigrants} immigrants".format(**result))
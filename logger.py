@@ -6,15 +6,28 @@ Contents
 
 :FitnessLoggingGA:
     A trait that logs the minimum, mean, and maximum score of all or a sample
-    of generations.
+    of generations, as text lines or binary records.
 :PopulationLoggingGA: A trait that logs each chromosome in a generation.
+:BestChromosomeLoggingGA:
+    A trait that logs the best chromosome found so far on every scoring pass.
+:LogWriter:
+    A bounded queue and a thread that format and write log records in the
+    background.
+:BackgroundLoggingGA:
+    The base of the chromosome logging traits, which owns their ``LogWriter``.
 
 """
 from __future__ import division
 
 import logging
+import queue
+import threading
+import time
+
 import numpy as np
+
 import base
+from stats import StatsRecorder
 
 
 # pylint: disable=abstract-method
@@ -37,30 +50,47 @@ class FitnessLoggingGA(base.GeneticAlgorithm):
       4. Mean score for the generation.
       5. Worst score for the generation.
 
-    By default, statistics will be logged for each generation. This requires
-    calling ``score_generation``. In a GA that uses proportionate selection,
-    every member of each generation is already scored, and so there is no
-    overhead (calls to ``score_generation`` are memoized in
-    ``selection.ProportionateGA`` and its descendants). But in tournament
-    selection - one of the advantages to which is invoking the fitness function
-    less often - this may increase the clock time of your algorithm. To avoid
-    rescoring each population, you can provide a probability to log each
-    generation by assigning the ``stats_frequency``/``--stats-freq`` option a
-    float between 0.0 and 1.0. For instance, to log half of all generations,
-    sets ``stats_freq`` to 0.5.
+    Setting ``stats_format`` to ``"binary"`` instead records fixed-width
+    ``stats.STATS_DTYPE`` records (which also hold the standard deviation,
+    number of evaluations, wall time and fitness cache hit rate) in a
+    ``stats.StatsRecorder`` of ``stats_buffer_size`` records, written to
+    ``stats_file`` (if not ``None``) when it is full and when ``solve``
+    returns. A new run starts a new file, a run resumed from a checkpoint
+    appends to it. Load the file with ``stats.load_stats``.
+
+    Statistics are computed from the ranking of the current generation when
+    it was already scored (as in ``selection.ProportionateGA`` and its
+    descendants, if this trait is mixed in before them), so there is no
+    overhead. But in tournament selection - one of the advantages to which is
+    invoking the fitness function less often - this may increase the clock
+    time of your algorithm. To avoid rescoring each population, you can
+    provide a probability to log each generation by assigning the
+    ``stats_frequency``/``--stats-freq`` option a float between 0.0 and 1.0.
+    For instance, to log half of all generations, sets ``stats_freq`` to 0.5.
     """
 
     def __init__(self, config={}):
         super(FitnessLoggingGA, self).__init__(config)
-        self.stats_file = self.config.setdefault("stats_file", "stats_file.txt")  # Added by Matan
+        self.stats_file = self.config.setdefault("stats_file", None)  # Added by Matan
 
         self.stats_frequency = self.config.setdefault("stats_frequency", 1.0)
         self.log_fitness = self.config.setdefault("log_fitness", True)
+        self.stats_format = self.config.setdefault("stats_format", "text")
+        self.stats_buffer_size = self.config.setdefault("stats_buffer_size", 256)
         self.stats_logger = logging.getLogger("levis.stats")
         self.stats_logger.setLevel(logging.INFO)
         self.stats_logger.addHandler(logging.NullHandler())
+        self.stats_recorder = None
+        self.start_time = time.perf_counter()
 
-        if "stats_file" in self.config:
+        if self.stats_format not in ("text", "binary"):
+            raise ValueError("Unknown stats format: {}".format(self.stats_format))
+
+        if self.stats_format == "binary":
+            # A resumed run continues the file of the run it resumes
+            self.stats_recorder = StatsRecorder(self.stats_file, self.stats_buffer_size,
+                                                append=bool(self.config.get("resume_from")))
+        elif self.config.get("stats_file") is not None:
             self.log_fitness = True
             fhstats = logging.FileHandler(self.config["stats_file"])
             logging.getLogger("levis.stats").addHandler(fhstats)
@@ -77,17 +107,34 @@ class FitnessLoggingGA(base.GeneticAlgorithm):
     def post_generate(self):
         super(FitnessLoggingGA, self).post_generate()
 
-        if self.log_fitness and self.random.random() <= self.stats_frequency:
-            self.log_stats()
+        if self.log_fitness and (self.stats_frequency >= 1.0 or self.random.random() <= self.stats_frequency):
+            with self.profile("logging"):
+                self.log_stats()
+
+    def end_iteration(self):
+        super(FitnessLoggingGA, self).end_iteration()
+
+        if self.log_fitness and (self.stats_frequency >= 1.0 or self.random.random() <= self.stats_frequency):
+            with self.profile("logging"):
+                self.log_stats()
 
     def log_stats(self):
-        """Write generation statistics to a logger."""
-        self.score_population()
-        scores = [t[1] for t in self.ranked]  # .sort(reverse=True)
+        """Write generation statistics to a logger, or record them."""
+        if self.ranked is None or self.ranked_population is not self.population:
+            self.score_population()
+        scores = np.fromiter((t[1] for t in self.ranked), dtype=float, count=len(self.ranked))
+
+        if self.stats_recorder is not None:
+            fitness_cache = getattr(self, "fitness_cache", None)
+            self.stats_recorder.record(self.iteration, scores, self.num_evaluations,
+                                       time.perf_counter() - self.start_time,
+                                       np.nan if fitness_cache is None else fitness_cache.hit_rate)
+            return
+
         if len(scores) == 0:
             stats = (0.0, 0.0, 0.0)
         else:
-            stats = (scores[0], sum(scores) / len(scores), scores[-1])
+            stats = (scores[0], scores.mean(), scores[-1])
 
         self.stats_logger.info(
             "%s,%i,%f,%f,%f",
@@ -98,8 +145,98 @@ class FitnessLoggingGA(base.GeneticAlgorithm):
             stats[2]
         )
 
+    def solve(self):
+        try:
+            return super(FitnessLoggingGA, self).solve()
+        finally:
+            if self.stats_recorder is not None:
+                self.stats_recorder.flush()
+
+
+class LogWriter(object):
+    """Formats and writes log records in a background thread.
+
+    ``submit`` queues a logger, a format function and its raw arguments; the
+    thread calls the function, which returns the messages, and logs them.
+    The queue holds at most ``max_size`` records, so when the writer falls
+    behind ``submit`` blocks instead of using more memory.
+    """
+
+    def __init__(self, max_size=1024):
+        self.queue = queue.Queue(max_size)
+        self.thread = None
+
+    def submit(self, logger, format_function, *args):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self.thread.start()
+        self.queue.put((logger, format_function, args))
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    return
+                logger, format_function, args = record
+                for message in format_function(*args):
+                    logger.info(message)
+            except Exception:
+                logging.getLogger("levis").exception("Failed to write a log record")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Block until every queued record is written."""
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        """Write the queued records and stop the thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+
+class BackgroundLoggingGA(base.GeneticAlgorithm):
+    """A GA that logs chromosomes from a background ``LogWriter``.
+
+    Only a snapshot of every logged chromosome, made by ``chromosome_record``,
+    is taken in the generation loop; it is formatted by
+    ``format_chromosome_record`` in the writer thread. ``log_queue_size`` in
+    the ``config`` object bounds the number of queued records. The queue is
+    flushed when ``solve`` returns.
+    """
+
+    def __init__(self, config={}):
+        super(BackgroundLoggingGA, self).__init__(config)
+        self.log_queue_size = self.config.setdefault("log_queue_size", 1024)
+        self.log_writer = LogWriter(self.log_queue_size)
+
+    def chromosome_record(self, chromosome):
+        """Return a snapshot of a chromosome to be formatted in the background.
 
-class PopulationLoggingGA(base.GeneticAlgorithm):
+        It must not change when the chromosome does. Defaults to
+        ``chromosome_str``; override it to return raw values and arrays.
+        """
+        return self.chromosome_str(chromosome)
+
+    def format_chromosome_record(self, record):
+        """Return the string of a ``chromosome_record``.
+
+        This runs in the writer thread, so it must only use the record.
+        """
+        return str(record)
+
+    def solve(self):
+        try:
+            return super(BackgroundLoggingGA, self).solve()
+        finally:
+            self.log_writer.close()
+
+
+class PopulationLoggingGA(BackgroundLoggingGA):
     """A trait that logs each chromosome in every generation.
 
     A representation of each chromosome is created using ``chromosome_str``.
@@ -142,17 +279,28 @@ class PopulationLoggingGA(base.GeneticAlgorithm):
         super(PopulationLoggingGA, self).post_generate()
 
         if self.log_pop:
-            self.log_population()
+            with self.profile("logging"):
+                self.log_population()
 
     def log_population(self):
-        """Write the current population to a logger."""
-        chromos = [self.chromosome_str(chromo) for chromo in self.population]
+        """Write the current population to a logger, in the background."""
+        records = [self.chromosome_record(chromo) for chromo in self.population]
+        self.log_writer.submit(self.population_logger, self.format_population, self.id, self.iteration, records)
+
+    def format_population(self, ga_id, iteration, records):
+        chromos = [self.format_chromosome_record(record) for record in records]
         population = "[%s]" % ", ".join(chromos)
-        self.population_logger.info("%s: %i: %s", self.id, self.iteration,
-                                    population)
+        return ["%s: %i: %s" % (ga_id, iteration, population)]
 
 
-class BestChromosomeLoggingGA(base.GeneticAlgorithm):
+class BestChromosomeLoggingGA(BackgroundLoggingGA):
+    """A trait that keeps the best chromosome ever scored.
+
+    When ``log_best_chromosome`` is true and ``best_chromosome_file`` is set
+    in the ``config`` object, the best chromosome of every scoring pass is
+    written to that file, in the background.
+    """
+
     def __init__(self, config={}):
         super(BestChromosomeLoggingGA, self).__init__(config)
         self.best_chromosome_file = self.config.setdefault("best_chromosome_file",
@@ -166,7 +314,9 @@ class BestChromosomeLoggingGA(base.GeneticAlgorithm):
         self.best_chromosome_of_all = None
 
         if self.log_best_chromosome and "best_chromosome_file" in self.config:
-            fhbest = logging.FileHandler(self.config["best_chromosome_file"], mode='w')
+            # A resumed run continues the log of the run it resumes
+            mode = 'a' if self.config.get("resume_from") else 'w'
+            fhbest = logging.FileHandler(self.config["best_chromosome_file"], mode=mode)
             logging.getLogger("levis.best_chromosome").addHandler(fhbest)
 
     @classmethod
@@ -178,20 +328,51 @@ class BestChromosomeLoggingGA(base.GeneticAlgorithm):
 
     def score_population(self):
         super().score_population()
+        with self.profile("logging"):
+            self.record_best(self.ranked[0])
+
+    def end_iteration(self):
+        super(BestChromosomeLoggingGA, self).end_iteration()
+        with self.profile("logging"):
+            self.record_best(self.ranked[0])
+
+    def forget_scores(self):
+        super(BestChromosomeLoggingGA, self).forget_scores()
+        # The best chromosome of all is kept, and replaced by the best one scored from now on
+        self.best_fitness = -np.inf
+
+    def save_state(self, state, ref):
+        super(BestChromosomeLoggingGA, self).save_state(state, ref)
+        state["best_fitness"] = np.array(self.best_fitness, dtype=float)
+        state["best_chromosome_of_all"] = np.array(ref(self.best_chromosome_of_all))
+        state["iteration_of_best_fitness"] = np.array(self.iteration_of_best_fitness)
+
+    def restore_state(self, state, deref):
+        super(BestChromosomeLoggingGA, self).restore_state(state, deref)
+        self.best_fitness = float(state["best_fitness"])
+        self.best_chromosome_of_all = deref(int(state["best_chromosome_of_all"]))
+        self.iteration_of_best_fitness = int(state["iteration_of_best_fitness"])
+
+    def record_best(self, best_chromosome_tup):
+        """Keep the best ``(chromosome, score)`` of a scoring pass if it is the best ever, and log it."""
         # We want to mention the scoring of the first random population (in the pre-generate) as iteration 0
         if self.scored is None:
             iteration = 0
         else:
             iteration = self.iteration
-        best_chromosome_tup = self.ranked[0]
         if best_chromosome_tup[1] > self.best_fitness:
             self.iteration_of_best_fitness = iteration
             self.best_fitness = best_chromosome_tup[1]
             self.best_chromosome_of_all = best_chromosome_tup[0]
         if self.log_best_chromosome and "best_chromosome_file" in self.config:
-            self.best_chromosome_logger.info("Iteration: {}, best chromosome so far is from iteration {}"
-                                             .format(iteration, self.iteration_of_best_fitness))
-            self.best_chromosome_logger.info("Chromosome: {}".format(best_chromosome_tup[0]))
-            self.best_chromosome_logger.info("Fitness: {}".format(best_chromosome_tup[1]))
-            self.best_chromosome_logger.info("-" * 20 + "\n")
+            self.log_writer.submit(self.best_chromosome_logger, self.format_best_chromosome, iteration,
+                                   self.iteration_of_best_fitness, self.chromosome_record(best_chromosome_tup[0]),
+                                   best_chromosome_tup[1])
+
+    def format_best_chromosome(self, iteration, iteration_of_best_fitness, record, fitness):
+        return ["Iteration: {}, best chromosome so far is from iteration {}".format(iteration,
+                                                                                    iteration_of_best_fitness),
+                "Chromosome: {}".format(self.format_chromosome_record(record)),
+                "Fitness: {}".format(fitness),
+                "-" * 20 + "\n"]
 
@@ -0,0 +1,148 @@
+"""
+Genetic operators that work on a whole Population at once.
+These are the array versions of GeneticGlitch.uniform_waveform_crossover and GeneticGlitch.mutate: every random
+number of the generation is drawn at once, and the per chromosome work is done with masks over the padded arrays.
+"""
+from global_constants_and_functions import *
+from population import Population
+
+
+def sort_rows(population):
+    """
+    Sort the points of every row by x, like Chromosome.sort_coordinates.
+    Rows with duplicate x values are repaired one by one (duplicates removed and replaced by random points),
+    which is rare enough not to be worth vectorizing.
+    """
+    order = np.argsort(population.coordinates[..., 0], axis=1)  # nan padding is sorted last
+    population.coordinates = np.take_along_axis(population.coordinates, order[..., None], axis=1)
+    duplicates = (np.diff(population.coordinates[..., 0], axis=1) == 0).any(axis=1)
+    for i in np.flatnonzero(duplicates):
+        chromosome = population.chromosome(i)
+        chromosome.sort_coordinates()
+        population.coordinates[i, :chromosome.length] = chromosome.coordinates
+        population.lengths[i] = chromosome.length
+
+
+def batch_uniform_crossover(population, pairs, rng):
+    """
+    Uniform crossover of many pairs of parents, with the semantics of GeneticGlitch.uniform_waveform_crossover:
+    the shorter parent's points are swapped, each with 50% chance, with a random sorted subset of the longer parent's
+    points, and the frequencies are blended with one random weight per pair.
+    :param population: Population the parents are taken from
+    :param pairs: array of shape (number of pairs, 2) of parent row indices
+    :param rng: numpy Generator
+    :return: Population of 2 * number of pairs children, the children of pair i are rows 2i (a copy of the shorter
+        parent) and 2i + 1 (a copy of the longer parent)
+    """
+    pairs = np.asarray(pairs, dtype=int).reshape(-1, 2)
+    num_pairs, max_length = pairs.shape[0], population.max_length
+    lengths = population.lengths[pairs]
+    # Order parents by length, shorter first
+    swap = ~(lengths[:, 0] < lengths[:, 1])
+    short, long = np.where(swap, pairs[:, 1], pairs[:, 0]), np.where(swap, pairs[:, 0], pairs[:, 1])
+    short_length, long_length = population.lengths[short], population.lengths[long]
+    child1 = population.coordinates[short].copy()
+    child2 = population.coordinates[long].copy()
+
+    # Choose indices from long parent to crossover with short parent: a random subset, sorted
+    locus = np.arange(max_length)[None, :]
+    keys = rng.random([num_pairs, max_length])
+    keys[locus >= long_length[:, None]] = np.inf
+    indices_from_long_parent = np.argsort(keys, axis=1)
+    indices_from_long_parent[locus >= short_length[:, None]] = max_length
+    indices_from_long_parent = np.sort(indices_from_long_parent, axis=1)
+
+    # Perform uniform crossover with 50% chance
+    crossed = (rng.random([num_pairs, max_length]) < 0.5) & (locus < short_length[:, None])
+    rows, loci = np.nonzero(crossed)
+    long_loci = indices_from_long_parent[rows, loci]
+    child1[rows, loci] = population.coordinates[long[rows], long_loci]
+    child2[rows, long_loci] = population.coordinates[short[rows], loci]
+
+    children = Population.empty(2 * num_pairs, max_length, population.num_samples)
+    children.coordinates[0::2] = child1
+    children.coordinates[1::2] = child2
+    children.lengths[0::2] = short_length
+    children.lengths[1::2] = long_length
+    # Sort coordinates in case they got messed up
+    sort_rows(children)
+
+    # Perform frequency crossover
+    freq_part_crossover = rng.random(num_pairs)
+    short_freq, long_freq = population.freq[short], population.freq[long]
+    children.freq[0::2] = freq_part_crossover * short_freq + (1 - freq_part_crossover) * long_freq
+    children.freq[1::2] = freq_part_crossover * long_freq + (1 - freq_part_crossover) * short_freq
+    return children
+
+
+def batch_mutate(population, rng, create_random, y_prob, y_size, reorder_prob, add_or_remove_prob, freq_prob,
+                 freq_size, random_parent_crossover_prob):
+    """
+    Mutate every row of a population, with the semantics of GeneticGlitch.mutate. All random numbers are drawn up
+    front, and every kind of mutation is applied to all the rows it hits at once, in the same order as mutate():
+    1) changing y value of random point
+    2) swapping 2 points' y values
+    3) removing or adding random point
+    4) adding noise to frequency
+    5) crossover with a random parent
+    :param population: Population to mutate, it is modified in place (and possibly grown)
+    :param rng: numpy Generator
+    :param create_random: function that returns a Population of the given number of random chromosomes
+    :return: the mutated population
+    """
+    size = len(population)
+    draws = rng.random([5, size])
+    # position draws, scaled to the length of every row when used
+    positions = rng.random([3, size])
+
+    # random y coordinate mutation
+    hit = np.flatnonzero(draws[0] < y_prob)
+    ind = (positions[0, hit] * population.lengths[hit]).astype(int)
+    population.coordinates[hit, ind, 1] += rng.standard_normal(hit.size) * y_size
+
+    # swap mutation
+    hit = np.flatnonzero((draws[1] < reorder_prob) & (population.lengths > 1))
+    ind = (positions[1, hit] * (population.lengths[hit] - 1)).astype(int)
+    left = population.coordinates[hit, ind, 1]
+    population.coordinates[hit, ind, 1] = population.coordinates[hit, ind + 1, 1]
+    population.coordinates[hit, ind + 1, 1] = left
+
+    # remove or add point mutation
+    add_or_remove = draws[2] < add_or_remove_prob
+    remove = add_or_remove & (rng.random(size) < 0.5)
+    add = np.flatnonzero(add_or_remove & ~remove)
+    remove = np.flatnonzero(remove & (population.lengths > 1))
+    if remove.size > 0:
+        ind = (positions[2, remove] * population.lengths[remove]).astype(int)
+        locus = np.arange(population.max_length)[None, :]
+        source = np.minimum(locus + (locus >= ind[:, None]), population.max_length - 1)
+        shifted = np.take_along_axis(population.coordinates[remove], source[..., None], axis=1)
+        shifted[locus >= population.lengths[remove, None] - 1] = np.nan
+        population.coordinates[remove] = shifted
+        population.lengths[remove] -= 1
+    if add.size > 0:
+        population.grow(population.lengths[add].max() + 1)
+        random_points = rng.random([add.size, 2])
+        random_points[:, 1] = -1 + 2 * random_points[:, 1]
+        population.coordinates[add, population.lengths[add]] = random_points
+        population.lengths[add] += 1
+        sort_rows(population)
+
+    # frequency mutation
+    hit = draws[3] < freq_prob
+    population.freq[hit] += freq_size * rng.standard_normal(np.count_nonzero(hit))
+
+    # random parent crossover mutation
+    hit = np.flatnonzero(draws[4] < random_parent_crossover_prob)
+    if hit.size > 0:
+        parents = Population.concatenate([population.take(hit), create_random(hit.size)])
+        pairs = np.stack([np.arange(hit.size), hit.size + np.arange(hit.size)], axis=1)
+        children = batch_uniform_crossover(parents, pairs, rng)
+        chosen = 2 * np.arange(hit.size) + (rng.random(hit.size) < 0.5)
+        population.grow(children.max_length)
+        population.coordinates[hit] = np.nan
+        population.coordinates[hit, :children.max_length] = children.coordinates[chosen]
+        population.lengths[hit] = children.lengths[chosen]
+        population.freq[hit] = children.freq[chosen]
+
+    return population
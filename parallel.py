@@ -0,0 +1,117 @@
+"""Parallel evaluation for genetic algorithms.
+
+
+Contents
+--------
+
+:ParallelEvaluationGA:
+    A GA that spreads the scoring of a population over a pool of worker
+    processes. Only the scores are computed in the workers; fitness side
+    effects (elitism, best score triggers) still run in the main process, in
+    population order, so the result is identical to serial scoring.
+
+"""
+from __future__ import division
+
+import math
+import os
+from concurrent.futures import Future, ProcessPoolExecutor
+
+import base
+
+
+def _score_chunk(score_function, chromosomes):
+    return list(score_function(chromosomes))
+
+
+class ParallelEvaluationGA(base.GeneticAlgorithm):
+    """A GA that scores chromosomes in a ``ProcessPoolExecutor``.
+
+    Enable it by setting ``executor`` to ``"process"`` in the ``config``
+    object (the default, ``"serial"``, scores in the calling process).
+    ``executor_workers`` sets the number of processes (defaults to the number
+    of CPUs) and ``executor_chunksize`` the number of chromosomes sent to a
+    worker at once (defaults to splitting the batch in 4 chunks per worker).
+
+    The inheriting class must set ``score_function`` to a picklable,
+    module-level function that takes a list of chromosomes and returns their
+    scores, since bound methods would drag the whole GA to the workers.
+    """
+
+    def __init__(self, config={}):
+        super(ParallelEvaluationGA, self).__init__(config)
+        self.executor_type = self.config.setdefault("executor", "serial")
+        self.executor_workers = self.config.setdefault("executor_workers", None)
+        self.executor_chunksize = self.config.setdefault("executor_chunksize", None)
+        self.score_function = None
+        self.executor = None
+
+        if self.executor_type not in ("serial", "process"):
+            raise ValueError("Unknown executor type: {}".format(self.executor_type))
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.executor_workers)
+        return self.executor
+
+    def shutdown_executor(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def evaluate(self, chromosomes):
+        """Score the chromosomes in worker processes, preserving their order."""
+        if self.executor_type == "serial" or self.score_function is None or len(chromosomes) <= 1:
+            return super(ParallelEvaluationGA, self).evaluate(chromosomes)
+
+        self.num_evaluations += len(chromosomes)
+        workers = self.executor_workers or os.cpu_count() or 1
+        chunksize = self.executor_chunksize or int(math.ceil(len(chromosomes) / (4 * workers)))
+        chunks = [chromosomes[i:i + chunksize] for i in range(0, len(chromosomes), chunksize)]
+        futures = [self.get_executor().submit(_score_chunk, self.score_function, chunk) for chunk in chunks]
+
+        scores = []
+        for future in futures:
+            scores += future.result()
+        return scores
+
+    def submit(self, chromosome):
+        """Score one chromosome in a worker process.
+
+        Cancelling the returned ``Future`` also cancels the work in the
+        executor, if no worker started it yet.
+        """
+        if self.executor_type == "serial" or self.score_function is None:
+            return super(ParallelEvaluationGA, self).submit(chromosome)
+
+        self.num_evaluations += 1
+        future = Future()
+        chunk = self.get_executor().submit(_score_chunk, self.score_function, [chromosome])
+
+        def cancel(future):
+            if future.cancelled():
+                chunk.cancel()
+
+        def done(chunk):
+            # False if the caller cancelled the Future, which can then not be set
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(chunk.result()[0])
+            except Exception as e:
+                future.set_exception(e)
+
+        future.add_done_callback(cancel)
+        chunk.add_done_callback(done)
+        return future
+
+    def evaluation_capacity(self):
+        if self.executor_type == "serial" or self.score_function is None:
+            return super(ParallelEvaluationGA, self).evaluation_capacity()
+        return self.executor_workers or os.cpu_count() or 1
+
+    def solve(self):
+        try:
+            return super(ParallelEvaluationGA, self).solve()
+        finally:
+            self.shutdown_executor()
@@ -0,0 +1,172 @@
+"""
+Array-backed storage for a whole population of waveform chromosomes.
+Instead of a list of independent Chromosome objects, all genomes are kept in padded numpy arrays, so that scoring
+and the genetic operators can work on the whole generation with array operations.
+"""
+from global_constants_and_functions import *
+from individual import Chromosome
+from interpolation import get_plan
+
+
+class Population():
+    """A padded array representation of a population of chromosomes.
+
+    coordinates[i, :lengths[i]] holds the (sorted) points of the i'th chromosome, the rest of the row is padded with
+    nan (so padding is always sorted last by numpy). mask[i, j] is True for the valid points of chromosome i.
+    """
+
+    def __init__(self, coordinates, lengths, freq, ids=None, num_samples=SAMPLE_NUM):
+        """
+        :param coordinates: array of shape (population size, max length, 2)
+        :param lengths: number of valid points of every chromosome
+        :param freq: frequency of every chromosome
+        :param ids: optional ids of the chromosomes the rows were taken from
+        :param num_samples: number of samples every waveform in the population is interpolated to
+        """
+        self.coordinates = np.asarray(coordinates, dtype=float)
+        self.lengths = np.asarray(lengths, dtype=int)
+        self.freq = np.asarray(freq, dtype=float)
+        self.ids = ids
+        self.num_samples = num_samples
+
+    def __len__(self):
+        return self.coordinates.shape[0]
+
+    @property
+    def max_length(self):
+        return self.coordinates.shape[1]
+
+    @property
+    def mask(self):
+        return np.arange(self.max_length) < self.lengths[:, None]
+
+    @classmethod
+    def empty(cls, size, max_length, num_samples=SAMPLE_NUM):
+        """
+        :return: population of "size" rows, with all points padded.
+        """
+        return cls(np.full([size, max_length, 2], np.nan), np.zeros(size, dtype=int), np.zeros(size),
+                   num_samples=num_samples)
+
+    @classmethod
+    def from_chromosomes(cls, chromosomes):
+        """
+        Pack a list of chromosomes into padded arrays.
+        All chromosomes must share the same number of samples.
+        """
+        if len(chromosomes) == 0:
+            raise ValueError("Cannot build a population from an empty list of chromosomes.")
+        num_samples = chromosomes[0].num_samples
+        if any(chromosome.num_samples != num_samples for chromosome in chromosomes):
+            raise ValueError("All chromosomes of a population must have the same number of samples.")
+        lengths = np.array([chromosome.length for chromosome in chromosomes], dtype=int)
+        population = cls.empty(len(chromosomes), lengths.max(), num_samples)
+        for i, chromosome in enumerate(chromosomes):
+            population.coordinates[i, :chromosome.length] = chromosome.coordinates
+        population.lengths = lengths
+        population.freq = np.array([chromosome.freq for chromosome in chromosomes], dtype=float)
+        population.ids = [chromosome.id for chromosome in chromosomes]
+        return population
+
+    @classmethod
+    def concatenate(cls, populations):
+        """
+        Stack the rows of several populations (with the same number of samples) into one population.
+        """
+        max_length = max(population.max_length for population in populations)
+        result = cls.empty(sum(len(population) for population in populations), max_length, populations[0].num_samples)
+        start = 0
+        for population in populations:
+            stop = start + len(population)
+            result.coordinates[start:stop, :population.max_length] = population.coordinates
+            result.lengths[start:stop] = population.lengths
+            result.freq[start:stop] = population.freq
+            start = stop
+        return result
+
+    def take(self, rows):
+        """
+        :return: new population with copies of the given rows
+        """
+        return Population(self.coordinates[rows], self.lengths[rows], self.freq[rows], num_samples=self.num_samples)
+
+    def grow(self, max_length):
+        """
+        Pad rows with nan so that they can hold at least max_length points.
+        """
+        if max_length > self.max_length:
+            padding = np.full([len(self), max_length - self.max_length, 2], np.nan)
+            self.coordinates = np.concatenate([self.coordinates, padding], axis=1)
+
+    def chromosome(self, i):
+        """
+        :return: new Chromosome object holding a copy of the i'th row.
+        """
+        return Chromosome(coordinates=self.coordinates[i, :self.lengths[i]].copy(), freq=float(self.freq[i]),
+                          num_samples=self.num_samples)
+
+    def to_chromosomes(self):
+        return [self.chromosome(i) for i in range(len(self))]
+
+    def interpolate(self, start=0, stop=None, out=None):
+        """
+        Interpolate the waveforms of rows [start, stop).
+        :return: x_samples, y_samples where y_samples has shape (stop - start, num_samples)
+        """
+        stop = len(self) if stop is None else stop
+        plan = get_plan(self.num_samples)
+        y_samples = plan.evaluate_batch(self.coordinates[start:stop], self.lengths[start:stop], out)
+        return plan.x_samples, y_samples
+
+
+def chromosomes_to_arrays(chromosomes):
+    """
+    Pack any list of chromosomes (possibly with different numbers of samples) into a dict of arrays, the inverse of
+    chromosomes_from_arrays. Used to save chromosomes to .npz files.
+    """
+    lengths = np.array([chromosome.length for chromosome in chromosomes], dtype=int)
+    coordinates = np.full([len(chromosomes), lengths.max(initial=0), 2], np.nan)
+    for i, chromosome in enumerate(chromosomes):
+        coordinates[i, :chromosome.length] = chromosome.coordinates
+    return {"coordinates": coordinates,
+            "lengths": lengths,
+            "freq": np.array([chromosome.freq for chromosome in chromosomes], dtype=float),
+            "ids": np.array([chromosome.id for chromosome in chromosomes], dtype=np.int64),
+            "num_samples": np.array([chromosome.num_samples for chromosome in chromosomes], dtype=int),
+            "dac_range": np.array([[chromosome.min_dac_int, chromosome.max_dac_int] for chromosome in chromosomes],
+                                  dtype=int).reshape(-1, 2)}
+
+
+def chromosomes_from_arrays(arrays):
+    """
+    :return: list of new Chromosome objects, with the ids they had when packed by chromosomes_to_arrays
+    """
+    chromosomes = []
+    for i in range(len(arrays["lengths"])):
+        min_dac_int, max_dac_int = arrays["dac_range"][i].tolist()
+        chromosome = Chromosome(coordinates=arrays["coordinates"][i, :arrays["lengths"][i]].copy(),
+                                freq=float(arrays["freq"][i]), num_samples=int(arrays["num_samples"][i]),
+                                max_dac_int=max_dac_int, min_dac_int=min_dac_int)
+        chromosome.id = int(arrays["ids"][i])
+        chromosomes.append(chromosome)
+    return chromosomes
+
+
+def population_diversity(population):
+    """
+    Diversity measures of a population, computed on its arrays.
+    :return: dict of coordinate_spread (standard deviation of every coordinate across the rows that have that point,
+        averaged over the points), freq_spread (standard deviation of the frequencies, in units of MIN_FREQ) and
+        unique_ratio (number of distinct genomes over the number of rows)
+    """
+    shared = population.mask.sum(axis=0) > 1
+    if shared.any():
+        coordinate_spread = float(np.nanstd(population.coordinates[:, shared], axis=0).mean())
+    else:
+        coordinate_spread = 0.0
+    # Padded points are nan, which np.unique does not consider equal, so they are replaced by a value outside [-1, 1]
+    genomes = np.concatenate([np.nan_to_num(population.coordinates.reshape(len(population), -1), nan=2.0),
+                              population.freq[:, None], population.lengths[:, None]], axis=1)
+    return {"coordinate_spread": coordinate_spread,
+            "freq_spread": float(population.freq.std() / MIN_FREQ),
+            "unique_ratio": len(np.unique(genomes, axis=0)) / len(population)}
@@ -0,0 +1,225 @@
+"""Per-phase timing and memory profiling for genetic algorithms.
+
+
+Contents
+--------
+
+:PhaseProfiler:
+    Monotonic timers and call counters of named phases, accumulated per
+    generation, with an optional ``tracemalloc`` peak memory sample.
+:ProfilingGA:
+    A GA that times its phases (selection, crossover, mutation, scoring,
+    fitness calls, and whatever the generation loop and the behaviors wrap in
+    ``profile``), and prints a summary at the end of ``solve``.
+
+Phase times are exclusive: the time of a phase that runs inside another one
+(``select`` inside ``crossover``, ``score`` inside ``fitness``) is only
+counted once, in the inner phase, so the phases of a generation add up to
+its wall time.
+
+"""
+from __future__ import division
+
+import json
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import base
+
+
+class _Phase(object):
+    """The context manager of one named phase of a ``PhaseProfiler``."""
+
+    __slots__ = ("profiler", "name")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.stack.append([self.name, time.perf_counter(), 0.0])
+        return self
+
+    def __exit__(self, *exc_info):
+        name, start, children = self.profiler.stack.pop()
+        elapsed = time.perf_counter() - start
+        totals = self.profiler.current.get(name)
+        if totals is None:
+            totals = self.profiler.current[name] = [0.0, 0]
+        totals[0] += elapsed - children
+        totals[1] += 1
+        if self.profiler.stack:
+            self.profiler.stack[-1][2] += elapsed
+        return False
+
+
+class PhaseProfiler(object):
+    """Accumulates the time and number of calls of named phases.
+
+    Use ``with profiler.phase(name):`` around a phase, and call
+    ``end_generation`` once per generation to move the totals to
+    ``generations``, a list of per-generation reports.
+
+    Args:
+        trace_memory (bool): Also record the peak traced memory of every
+            generation, with ``tracemalloc`` (which slows Python down).
+    """
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.phases = {}  # name -> _Phase, so entering a phase allocates nothing
+        self.stack = []  # [name, start, time of inner phases]
+        self.current = OrderedDict()  # name -> [seconds, calls] of the current generation
+        self.generations = []
+        self.started_tracing = False
+        self.generation_start = time.perf_counter()
+
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = _Phase(self, name)
+        return phase
+
+    def start(self):
+        """Start a generation, and memory tracing if enabled."""
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        self.generation_start = time.perf_counter()
+
+    def stop(self):
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def end_generation(self, iteration):
+        """Record the phases of the generation that just ended, and start the next one.
+
+        Returns:
+            Dict: The report of the generation.
+        """
+        now = time.perf_counter()
+        report = {
+            "iteration": iteration,
+            "wall_time": now - self.generation_start,
+            "phases": {name: {"seconds": seconds, "calls": calls} for name, (seconds, calls) in self.current.items()},
+            "peak_memory": None,
+        }
+        if self.trace_memory and tracemalloc.is_tracing():
+            report["peak_memory"] = tracemalloc.get_traced_memory()[1]
+            if hasattr(tracemalloc, "reset_peak"):
+                tracemalloc.reset_peak()
+            else:
+                tracemalloc.clear_traces()  # before Python 3.9, also resets the peak
+        self.generations.append(report)
+        self.current = OrderedDict()
+        self.generation_start = now
+        return report
+
+    def summary(self):
+        """Return the total and mean per generation of every phase."""
+        phases = OrderedDict()
+        for report in self.generations:
+            for name, totals in report["phases"].items():
+                phase = phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+                phase["seconds"] += totals["seconds"]
+                phase["calls"] += totals["calls"]
+        wall_time = sum(report["wall_time"] for report in self.generations)
+        for phase in phases.values():
+            phase["share"] = phase["seconds"] / wall_time if wall_time > 0 else 0.0
+            phase["seconds_per_generation"] = phase["seconds"] / len(self.generations)
+        peaks = [report["peak_memory"] for report in self.generations if report["peak_memory"] is not None]
+        return {
+            "generations": len(self.generations),
+            "wall_time": wall_time,
+            "phases": phases,
+            "peak_memory": max(peaks) if peaks else None,
+        }
+
+    def format_summary(self):
+        summary = self.summary()
+        lines = ["{:<16}{:>12}{:>10}{:>12}{:>8}".format("phase", "seconds", "calls", "s/gen", "share")]
+        for name, phase in sorted(summary["phases"].items(), key=lambda item: -item[1]["seconds"]):
+            lines.append("{:<16}{:>12.4f}{:>10}{:>12.6f}{:>7.1%}".format(
+                name, phase["seconds"], phase["calls"], phase["seconds_per_generation"], phase["share"]))
+        lines.append("{} generations in {:.4f} s".format(summary["generations"], summary["wall_time"]))
+        if summary["peak_memory"] is not None:
+            lines.append("peak traced memory {:.1f} MiB".format(summary["peak_memory"] / 2 ** 20))
+        return "\n".join(lines)
+
+
+class ProfilingGA(base.GeneticAlgorithm):
+    """A GA that profiles the phases of every generation.
+
+    Enable it by setting ``profile`` to true in the ``config`` object, and
+    ``profile_memory`` to also sample the ``tracemalloc`` peak memory of
+    every generation. The reports are kept in ``profiler.generations``, a
+    summary is printed when ``solve`` returns, and both are written as JSON
+    to ``profile_file`` if it is set.
+
+    ``select``, ``fitness`` and ``evaluate`` (as ``"score"``) are timed
+    here. The generation loop, the breeding code and the other behaviors
+    time their own phases (``pre_generate``, ``generate``,
+    ``post_generate``, ``crossover``, ``mutate``, ``logging``,
+    ``checkpoint``...) with ``with self.profile(name):``, which costs
+    nothing when profiling is disabled. A generation is reported when
+    ``is_finished`` sees that the iteration has advanced.
+
+    Mix this behavior in first, so that it times the whole chain of every
+    method it wraps.
+    """
+
+    def __init__(self, config={}):
+        super(ProfilingGA, self).__init__(config)
+        self.profiling = self.config.setdefault("profile", False)
+        self.profile_memory = self.config.setdefault("profile_memory", False)
+        self.profile_file = self.config.setdefault("profile_file", None)
+        self.profiler = PhaseProfiler(self.profile_memory) if self.profiling else None
+        self.profiled_iteration = 0
+
+    def profile(self, name):
+        if self.profiler is None:
+            return base.NULL_PHASE
+        return self.profiler.phase(name)
+
+    def select(self):
+        with self.profile("select"):
+            return super(ProfilingGA, self).select()
+
+    def fitness(self, chromosome, score=None):
+        with self.profile("fitness"):
+            return super(ProfilingGA, self).fitness(chromosome, score)
+
+    def evaluate(self, chromosomes):
+        with self.profile("score"):
+            return super(ProfilingGA, self).evaluate(chromosomes)
+
+    def is_finished(self):
+        # Checked between generations (and between evaluations in steady-state mode), outside of every phase
+        if self.profiler is not None and self.iteration > self.profiled_iteration:
+            self.profiler.end_generation(self.iteration)
+            self.profiled_iteration = self.iteration
+        return super(ProfilingGA, self).is_finished()
+
+    def profile_report(self):
+        """Return the per-generation reports and their summary."""
+        return {"generations": self.profiler.generations, "summary": self.profiler.summary()}
+
+    def solve(self):
+        if self.profiler is None:
+            return super(ProfilingGA, self).solve()
+
+        self.profiler.start()
+        self.profiled_iteration = self.iteration
+        try:
+            return super(ProfilingGA, self).solve()
+        finally:
+            # The work after the last generation is reported as one more entry
+            if self.profiler.current:
+                self.profiler.end_generation(self.iteration)
+            self.profiler.stop()
+            print(self.profiler.format_summary())
+            if self.profile_file is not None:
+                with open(self.profile_file, "w") as f:
+                    json.dump(self.profile_report(), f, indent=1)
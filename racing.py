@@ -0,0 +1,189 @@
+"""Adaptive measurement of noisy fitness for genetic algorithms.
+
+
+Contents
+--------
+
+:wilson_interval:
+    The confidence interval of a success rate.
+
+:RacingGA:
+    A GA that treats the score of a chromosome as the success rate of
+    glitch attempts, and allocates attempts by successive halving: every
+    chromosome of a scoring pass gets a few attempts, then the clear losers
+    are dropped and the most promising half is measured with twice as many
+    attempts, and so on. Glitch attempts are only spent where they can
+    change the ranking of the best chromosomes.
+
+"""
+from __future__ import division
+
+import math
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+import base
+from checkpoint import pack_keys, unpack_keys
+
+
+def wilson_interval(rate, attempts, z=1.96):
+    """Return the Wilson score interval ``(low, high)`` of a success rate.
+
+    Unlike the normal approximation, it stays inside [0, 1] and is useful
+    for the small numbers of attempts of the first racing rounds. Works
+    element wise on arrays.
+    """
+    rate = np.asarray(rate, dtype=float)
+    attempts = np.asarray(attempts, dtype=float)
+    z2 = z * z
+    denominator = 1 + z2 / attempts
+    center = (rate + z2 / (2 * attempts)) / denominator
+    half_width = z * np.sqrt(rate * (1 - rate) / attempts + z2 / (4 * attempts * attempts)) / denominator
+    return center - half_width, center + half_width
+
+
+class RacingGA(base.GeneticAlgorithm):
+    """A GA that measures noisy scores with adaptively allocated attempts.
+
+    Enable it by setting ``racing`` to true in the ``config`` object. The
+    inheriting class must implement ``measure``, which runs glitch attempts
+    and returns their success rates.
+
+    Every scoring pass is a race over its distinct genomes: each round gives
+    every chromosome still in the race ``race_attempts_initial`` attempts,
+    then ``race_eta`` times more every round. After a round, chromosomes
+    whose upper confidence bound is below the lower bound of the
+    ``race_survivors``-th best are dropped, and only the best
+    ``1 / race_eta`` of the rest go on, until ``race_survivors`` are left or
+    they reach ``race_attempts_max`` attempts.
+
+    Attempts are remembered per genome (``race_memory_size`` genomes), so a
+    chromosome that is scored again (an elite, or a member that was
+    re-ranked) keeps its evidence and starts a new race where the last one
+    stopped. The score is the success rate of all its attempts, and
+    ``score_interval`` returns its ``race_z`` confidence interval. Elites
+    are kept by the lower bound of that interval, so a lucky estimate from
+    a few attempts does not take the place of a well measured elite.
+
+    In steady-state mode (see ``steady_state.SteadyStateGA``), ``submit``
+    races every child on its own as soon as it is bred, since a race needs
+    the results of each round before the next one.
+
+    Mix this behavior in before the fitness cache and the elitism behaviors.
+    """
+
+    def __init__(self, config={}):
+        super(RacingGA, self).__init__(config)
+        self.racing = self.config.setdefault("racing", False)
+        self.race_attempts_initial = self.config.setdefault("race_attempts_initial", 8)
+        self.race_attempts_max = self.config.setdefault("race_attempts_max", 256)
+        self.race_eta = self.config.setdefault("race_eta", 2)
+        self.race_survivors = self.config.setdefault("race_survivors", None)  # defaults to the number of elites
+        self.race_z = self.config.setdefault("race_z", 1.96)
+        self.race_memory_size = self.config.setdefault("race_memory_size", 4096)
+        self.measurements = OrderedDict()  # key -> [attempts, successes]
+        self.num_attempts = 0
+
+    def measure(self, chromosomes, attempts):
+        """Run ``attempts`` glitch attempts of every chromosome.
+
+        Returns:
+            numpy.ndarray: The success rate of every chromosome.
+        """
+        raise NotImplementedError
+
+    def score_interval(self, chromosome):
+        """Return the confidence interval ``(low, high)`` of a measured score."""
+        attempts, successes = self.measurements[self.chromosome_key(chromosome)]
+        low, high = wilson_interval(successes / attempts, attempts, self.race_z)
+        return float(low), float(high)
+
+    def elite_score(self, chromosome, score):
+        if not self.racing:
+            return super(RacingGA, self).elite_score(chromosome, score)
+        return self.score_interval(chromosome)[0]
+
+    def save_state(self, state, ref):
+        super(RacingGA, self).save_state(state, ref)
+        state["measurement_keys"] = pack_keys(list(self.measurements.keys()))  # least recently used first
+        state["measurements"] = np.array(list(self.measurements.values()), dtype=float).reshape(-1, 2)
+        state["num_attempts"] = np.array(self.num_attempts)
+
+    def restore_state(self, state, deref):
+        super(RacingGA, self).restore_state(state, deref)
+        self.measurements = OrderedDict((key, [int(attempts), successes]) for key, (attempts, successes)
+                                        in zip(unpack_keys(state["measurement_keys"]),
+                                               state["measurements"].tolist()))
+        self.num_attempts = int(state["num_attempts"])
+
+    def evaluate(self, chromosomes):
+        """Race the chromosomes, and return the success rate of each."""
+        if not self.racing:
+            return super(RacingGA, self).evaluate(chromosomes)
+
+        keys = [self.chromosome_key(chromosome) for chromosome in chromosomes]
+        unique = OrderedDict()
+        for chromosome, key in zip(chromosomes, keys):
+            unique.setdefault(key, chromosome)
+        self.num_evaluations += sum(1 for key in unique if key not in self.measurements)
+        for key in unique:
+            self.measurements.setdefault(key, [0, 0.0])
+            self.measurements.move_to_end(key)
+        self.race(list(unique.keys()), list(unique.values()))
+
+        scores = [self.measurements[key][1] / self.measurements[key][0] for key in keys]
+        while len(self.measurements) > self.race_memory_size:
+            self.measurements.popitem(last=False)
+        return scores
+
+    def submit(self, chromosome):
+        """Race the chromosome right away, and return a ``Future`` of its score."""
+        if not self.racing:
+            return super(RacingGA, self).submit(chromosome)
+        future = Future()
+        try:
+            future.set_result(self.evaluate([chromosome])[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def race(self, keys, chromosomes):
+        """Spend attempts on the chromosomes by successive halving."""
+        survivors = self.race_survivors or getattr(self, "num_elites", 1)
+        survivors = max(1, min(survivors, len(keys)))
+        alive = list(range(len(keys)))
+        attempts = self.race_attempts_initial
+        counts = np.array([self.measurements[key][0] for key in keys], dtype=float)
+        successes = np.array([self.measurements[key][1] for key in keys], dtype=float)
+
+        while len(alive) > 0:
+            # Chromosomes that already have enough attempts from earlier races are not measured again
+            alive = [i for i in alive if counts[i] < self.race_attempts_max]
+            if len(alive) == 0:
+                break
+            batch = [min(attempts, self.race_attempts_max - int(counts[i])) for i in alive]
+            for amount in sorted(set(batch)):
+                group = [i for i, n in zip(alive, batch) if n == amount]
+                rates = np.asarray(self.measure([chromosomes[i] for i in group], amount), dtype=float)
+                counts[group] += amount
+                successes[group] += rates * amount
+                self.num_attempts += amount * len(group)
+            if len(alive) <= survivors:
+                break
+
+            # Drop clear losers, then keep the best 1 / eta of the rest
+            contenders = np.flatnonzero(counts > 0)
+            rates = successes[contenders] / counts[contenders]
+            low, high = wilson_interval(rates, counts[contenders], self.race_z)
+            threshold = np.sort(low)[::-1][min(survivors, len(low)) - 1]
+            upper = dict(zip(contenders.tolist(), high.tolist()))
+            alive = [i for i in alive if upper[i] >= threshold]
+            keep = max(survivors, int(math.ceil(len(alive) / self.race_eta)))
+            alive.sort(key=lambda i: successes[i] / counts[i], reverse=True)
+            alive = alive[:keep]
+            attempts *= self.race_eta
+
+        for i, key in enumerate(keys):
+            self.measurements[key] = [int(counts[i]), float(successes[i])]
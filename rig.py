@@ -0,0 +1,508 @@
+"""
+Here, chromosomes are glitched on real (or simulated) rigs.
+A rig is an AWG that the waveform of a chromosome is uploaded to, and an arduino that runs the glitches and
+reports the score. The RigDriver runs an asyncio event loop in a background thread, and dispatches every chromosome
+to whichever rig is free. While a rig glitches one waveform, the next waveform is already uploaded to its second
+AWG memory segment, so the upload time is hidden behind the glitching time.
+The driver also remembers the last waveform uploaded to every segment, and when the rig supports partial memory
+writes and sending only the ranges of samples that changed is estimated to take less time, only those are sent.
+"""
+import asyncio
+import concurrent.futures
+import threading
+
+from global_constants_and_functions import *
+from score_chromosome import sim_score_waveform
+from awg_encoder import AwgEncoder, AWG_DTYPE, changed_sample_ranges
+import base
+
+
+class Rig(object):
+    """Interface of a glitching rig.
+    segments is the number of AWG memory segments the rig can hold waveforms in. With more than one segment, the
+    driver uploads the next waveform while the current one is being glitched.
+    supports_partial_write tells whether write_samples() and set_freq() are implemented.
+    write_latency (the fixed time of every write to the AWG, in seconds) and write_bytes_per_second (None for a link
+    whose transfer time is negligible) estimate the AWG link, to choose between full and partial uploads.
+    """
+    segments = 1
+    supports_partial_write = False
+    write_latency = 0.0
+    write_bytes_per_second = None
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return "{}({})".format(self.__class__.__name__, self.name)
+
+    def write_time(self, num_writes, num_bytes):
+        """
+        :return: estimated time of num_writes writes to the AWG, of num_bytes bytes in total [s]
+        """
+        duration = num_writes * self.write_latency
+        if self.write_bytes_per_second:
+            duration += num_bytes / self.write_bytes_per_second
+        return duration
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def upload(self, segment, payload, freq):
+        """
+        Write a waveform to an AWG memory segment.
+        :param segment: index of the memory segment
+        :param payload: big endian 16 bit two's complement samples, as sent to the AWG. This may be a view into a
+            reused buffer, so it must not be kept after the upload.
+        :param freq: frequency to play the waveform at
+        """
+        raise NotImplementedError
+
+    async def write_samples(self, segment, offset, payload):
+        """
+        Overwrite part of the waveform in an AWG memory segment.
+        :param offset: index of the first sample to overwrite
+        :param payload: encoded samples, like in upload()
+        """
+        raise NotImplementedError
+
+    async def set_freq(self, segment, freq):
+        """
+        Change the frequency the waveform in an AWG memory segment is played at.
+        """
+        raise NotImplementedError
+
+    async def glitch(self, segment, attempts=None):
+        """
+        Send a "score" command to the arduino, that runs several glitches of the waveform in the given segment
+        and returns the average score.
+        :param attempts: number of glitch attempts to run, None for the arduino's default
+        :return: score, the success rate of the attempts when attempts is given
+        """
+        raise NotImplementedError
+
+
+class PseudoSerial(object):
+    """An in-memory stand-in for a serial link.
+    Every write takes a fixed latency plus the time to transfer the bytes at the given baudrate (8N1 framing).
+    """
+
+    def __init__(self, latency=0.0, baudrate=None):
+        self.latency = latency
+        self.baudrate = baudrate
+        self.bytes_written = 0
+        self.busy_time = 0.0  # total time spent writing [s]
+
+    def transfer_time(self, num_bytes):
+        duration = self.latency
+        if self.baudrate:
+            duration += num_bytes * 10 / self.baudrate
+        return duration
+
+    async def write(self, *chunks):
+        """
+        Write one message, made of the given chunks of bytes.
+        """
+        num_bytes = sum(len(chunk) for chunk in chunks)
+        duration = self.transfer_time(num_bytes)
+        self.bytes_written += num_bytes
+        self.busy_time += duration
+        await asyncio.sleep(duration)
+
+
+class AwgEmulator(object):
+    """Emulates the waveform memory of an AWG behind a PseudoSerial link.
+    Commands are framed like SCPI binary blocks, and every byte sent is counted in bytes_transferred (and the time
+    spent sending in transfer_time), so the cost of full and partial uploads can be compared.
+    """
+
+    def __init__(self, segments=2, latency=0.005, baudrate=None, supports_partial_write=True):
+        self.link = PseudoSerial(latency, baudrate)
+        self.supports_partial_write = supports_partial_write
+        self.memory = [None] * segments
+        self.freq = [None] * segments
+        self.num_writes = 0
+        self.num_full_writes = 0
+
+    @property
+    def bytes_transferred(self):
+        return self.link.bytes_written
+
+    @property
+    def transfer_time(self):
+        return self.link.busy_time
+
+    @staticmethod
+    def block_header(command, num_bytes):
+        length = str(num_bytes)
+        return "{}#{}{}".format(command, len(length), length).encode('ascii')
+
+    async def write_waveform(self, segment, payload):
+        await self.link.write(self.block_header(":TRAC{}:DATA 0,".format(segment + 1), len(payload)), payload)
+        self.memory[segment] = np.frombuffer(payload, dtype=AWG_DTYPE).astype(np.int16)
+        self.num_writes += 1
+        self.num_full_writes += 1
+
+    async def write_samples(self, segment, offset, payload):
+        if not self.supports_partial_write or self.memory[segment] is None:
+            raise NotImplementedError("Partial write is not supported")
+        samples = np.frombuffer(payload, dtype=AWG_DTYPE)
+        await self.link.write(self.block_header(":TRAC{}:DATA {},".format(segment + 1, offset), len(payload)),
+                              payload)
+        self.memory[segment][offset:offset + len(samples)] = samples
+        self.num_writes += 1
+
+    async def set_freq(self, segment, freq):
+        await self.link.write(":SOUR{}:FREQ {:.9g}\n".format(segment + 1, freq).encode('ascii'))
+        self.freq[segment] = freq
+
+
+class SimulatedRig(Rig):
+    """A rig that glitches nothing: the uploaded waveform is scored with the simulation score.
+    Latencies are configurable, so the driver can be exercised without hardware.
+    """
+
+    def __init__(self, name="sim", awg_latency=0.005, awg_baudrate=None, glitch_latency=0.05, glitch_jitter=0.0,
+                 noise_std=0.0, segments=2, partial_write=True, seed=None):
+        """
+        :param awg_latency: fixed time of every upload to the AWG [s]
+        :param awg_baudrate: AWG link speed, None for an infinitely fast link
+        :param glitch_latency: time the arduino takes to run the glitches of one waveform [s]
+        :param glitch_jitter: random extra glitching time, uniform in [0, glitch_jitter] [s]
+        :param noise_std: standard deviation of gaussian noise added to the score
+        :param segments: number of AWG memory segments
+        :param partial_write: whether the emulated AWG supports partial memory writes
+        """
+        super().__init__(name)
+        self.awg = AwgEmulator(segments, awg_latency, awg_baudrate, partial_write)
+        self.arduino = PseudoSerial(glitch_latency)
+        self.glitch_jitter = glitch_jitter
+        self.noise_std = noise_std
+        self.segments = segments
+        self.supports_partial_write = partial_write
+        self.write_latency = awg_latency
+        self.write_bytes_per_second = awg_baudrate / 10 if awg_baudrate else None  # 8N1 framing
+        self.rng = np.random.default_rng(seed)
+        self.num_glitched = 0
+        self.num_attempts = 0
+
+    async def upload(self, segment, payload, freq):
+        await self.awg.write_waveform(segment, payload)
+        await self.awg.set_freq(segment, freq)
+
+    async def write_samples(self, segment, offset, payload):
+        await self.awg.write_samples(segment, offset, payload)
+
+    async def set_freq(self, segment, freq):
+        await self.awg.set_freq(segment, freq)
+
+    async def glitch(self, segment, attempts=None):
+        """
+        Without attempts, return the simulation score plus noise. With attempts, every attempt succeeds with the
+        probability given by the simulation score, and the success rate is returned.
+        """
+        if attempts is None:
+            await self.arduino.write(b"score\n")
+        else:
+            await self.arduino.write(b"score %d\n" % attempts)
+        if self.glitch_jitter > 0:
+            await asyncio.sleep(self.rng.uniform(0, self.glitch_jitter))
+        waveform = self.awg.memory[segment] / MAX_DAC_INT
+        self.num_glitched += 1
+        score = sim_score_waveform(waveform, self.awg.freq[segment])
+        if attempts is None:
+            return score + self.noise_std * self.rng.standard_normal()
+        self.num_attempts += attempts
+        return self.rng.binomial(attempts, min(max(score, 0.0), 1.0)) / attempts
+
+
+class RigDriver(object):
+    """Dispatches chromosomes to a pool of rigs.
+    The event loop runs in a background thread, so submit() can be called from the (synchronous) GA code and
+    returns a concurrent.futures.Future of the score.
+    """
+
+    def __init__(self, rigs, delta_upload=True, merge_gap=None):
+        """
+        :param rigs: list of Rig objects
+        :param delta_upload: send only the changed sample ranges to rigs that support partial writes, when that is
+            estimated to take less time than uploading the whole waveform (see Rig.write_time())
+        :param merge_gap: changed ranges separated by at most this many samples are sent as one write. None derives
+            it from the link of every rig: resending unchanged samples is cheaper than one more write while they take
+            less time to transfer than the write latency.
+        """
+        if len(rigs) == 0:
+            raise ValueError("RigDriver needs at least one rig.")
+        self.rigs = list(rigs)
+        self.delta_upload = delta_upload
+        self.merge_gap = merge_gap
+        self.uploaded = {}  # (rig, segment) -> (int16 samples, freq) currently in the AWG memory
+        self.loop = None
+        self.thread = None
+        self.jobs = None
+        self.workers = []
+        self.encoders = {}
+
+    def start(self):
+        """
+        Start the event loop thread and a worker for every rig, if not already running.
+        """
+        if self.loop is not None:
+            return
+        self.loop = asyncio.new_event_loop()
+        ready = threading.Event()
+        self.thread = threading.Thread(target=self._run_loop, args=(ready,), name="RigDriver", daemon=True)
+        self.thread.start()
+        ready.wait()
+
+    def _run_loop(self, ready):
+        asyncio.set_event_loop(self.loop)
+        self.jobs = asyncio.Queue()
+        self.workers = [self.loop.create_task(self._rig_worker(rig)) for rig in self.rigs]
+        ready.set()
+        self.loop.run_forever()
+
+    def submit(self, chromosome, attempts=None):
+        """
+        Queue a chromosome to be glitched on the first free rig.
+        :param attempts: number of glitch attempts, see Rig.glitch()
+        :return: concurrent.futures.Future of the score
+        """
+        self.start()
+        future = concurrent.futures.Future()
+        self.loop.call_soon_threadsafe(self.jobs.put_nowait, (chromosome, future, attempts))
+        return future
+
+    def score_batch(self, chromosomes):
+        """
+        Glitch all chromosomes on all rigs, and wait for the scores.
+        :return: list of scores, in the order of the given chromosomes
+        """
+        futures = [self.submit(chromosome) for chromosome in chromosomes]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        """
+        Stop the rig workers, close the rigs and stop the event loop thread.
+        Jobs that were not glitched yet are cancelled, or fail with CancelledError if a rig already took them.
+        """
+        if self.loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.loop = None
+        self.thread = None
+
+    async def _close(self):
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        # Jobs no worker took are cancelled, so nobody waits for them forever
+        while not self.jobs.empty():
+            self.jobs.get_nowait()[1].cancel()
+        for rig in self.rigs:
+            await rig.close()
+
+    async def _upload(self, rig, segment, job):
+        chromosome = job[0]
+        key = (id(rig), segment)
+        # One encoder per memory segment, since the payload of a segment must stay intact until it is uploaded
+        encoder = self.encoders.get(key)
+        if encoder is None:
+            encoder = self.encoders[key] = AwgEncoder(chromosome.num_samples)
+        samples = chromosome.calc_raw_waveform_array()
+
+        ranges = None
+        last = self.uploaded.pop(key, None)
+        if self.delta_upload and rig.supports_partial_write and last is not None and len(last[0]) == len(samples):
+            ranges = self.delta_ranges(rig, last, samples, chromosome.freq)
+
+        # The segment is only recorded again once the upload succeeded, a failed upload leaves it unknown
+        if ranges is None:
+            await rig.upload(segment, encoder.encode(samples), chromosome.freq)
+        else:
+            for start, stop in ranges:
+                await rig.write_samples(segment, start, encoder.encode(samples[start:stop]))
+            if chromosome.freq != last[1]:
+                await rig.set_freq(segment, chromosome.freq)
+        self.uploaded[key] = (samples, chromosome.freq)
+
+    def delta_ranges(self, rig, last, samples, freq):
+        """
+        Choose between a partial and a full upload by their estimated time on the rig (ties go to the one sending
+        fewer bytes). A full upload is one write of the waveform and one of the frequency.
+        :param last: (samples, freq) in the AWG memory segment
+        :return: list of (start, stop) sample ranges to write, or None to upload the whole waveform
+        """
+        merge_gap = self.merge_gap
+        if merge_gap is None:
+            merge_gap = len(samples)
+            if rig.write_bytes_per_second:
+                merge_gap = int(rig.write_latency * rig.write_bytes_per_second / AWG_DTYPE.itemsize)
+        ranges = changed_sample_ranges(last[0], samples, merge_gap)
+        delta_bytes = AWG_DTYPE.itemsize * sum(stop - start for start, stop in ranges)
+        delta = (rig.write_time(len(ranges) + (freq != last[1]), delta_bytes), delta_bytes)
+        full_bytes = AWG_DTYPE.itemsize * len(samples)
+        full = (rig.write_time(2, full_bytes), full_bytes)
+        return ranges if delta < full else None
+
+    async def _next_job(self):
+        """
+        :return: next job whose future was not cancelled by the caller
+        """
+        while True:
+            job = await self.jobs.get()
+            if job[1].set_running_or_notify_cancel():
+                return job
+
+    async def _rig_worker(self, rig):
+        """
+        Glitch jobs on one rig until the worker is cancelled. The tasks the worker started are then cancelled too,
+        and the jobs it took fail with CancelledError.
+        """
+        tasks = []  # upload, glitch and getter tasks started by the worker
+        jobs = []  # jobs taken from the queue whose future is not set yet
+        try:
+            await self._glitch_jobs(rig, tasks, jobs)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for job in jobs:
+                job[1].set_exception(concurrent.futures.CancelledError())
+
+    async def _glitch_jobs(self, rig, tasks, jobs):
+        """
+        Glitch jobs on one rig. While the current waveform is being glitched, the next job is taken from the queue
+        and uploaded to the other memory segment.
+        """
+        def start(coroutine):
+            tasks[:] = [task for task in tasks if not task.done()]
+            task = self.loop.create_task(coroutine)
+            tasks.append(task)
+            return task
+
+        async def take_job():
+            job = await self._next_job()
+            jobs.append(job)
+            return job
+
+        def finish(job, result=None, exception=None):
+            jobs.remove(job)
+            if exception is None:
+                job[1].set_result(result)
+            else:
+                job[1].set_exception(exception)
+
+        await rig.open()
+        segment = 0
+        job = await take_job()
+        upload = start(self._upload(rig, segment, job))
+        while True:
+            try:
+                await upload
+            except Exception as e:
+                finish(job, exception=e)
+                job = await take_job()
+                upload = start(self._upload(rig, segment, job))
+                continue
+
+            attempts = job[2]
+            glitch = start(rig.glitch(segment) if attempts is None else rig.glitch(segment, attempts))
+            next_job = None
+            if rig.segments > 1:
+                getter = start(take_job())
+                await asyncio.wait([glitch, getter], return_when=asyncio.FIRST_COMPLETED)
+                if not getter.done():
+                    getter.cancel()
+                try:
+                    next_job = await getter
+                except asyncio.CancelledError:
+                    next_job = None
+                if next_job is not None:
+                    segment = (segment + 1) % rig.segments
+                    upload = start(self._upload(rig, segment, next_job))
+
+            try:
+                finish(job, await glitch)
+            except Exception as e:
+                finish(job, exception=e)
+
+            if next_job is None:
+                next_job = await take_job()
+                segment = (segment + 1) % rig.segments
+                upload = start(self._upload(rig, segment, next_job))
+            job = next_job
+
+
+class RigEvaluationGA(base.GeneticAlgorithm):
+    """A GA that scores chromosomes by glitching them on a pool of rigs.
+
+    Set ``rigs`` in the ``config`` object to a list of ``Rig`` objects to
+    enable it. Without rigs, scoring falls back to ``score``.
+    """
+
+    def __init__(self, config={}):
+        super(RigEvaluationGA, self).__init__(config)
+        self.rigs = self.config.setdefault("rigs", None)
+        self.rig_delta_upload = self.config.setdefault("rig_delta_upload", True)
+        self.rig_driver = RigDriver(self.rigs, self.rig_delta_upload) if self.rigs else None
+
+    def evaluate(self, chromosomes):
+        if self.rig_driver is None:
+            return super(RigEvaluationGA, self).evaluate(chromosomes)
+        self.num_evaluations += len(chromosomes)
+        return self.rig_driver.score_batch(chromosomes)
+
+    def submit(self, chromosome):
+        if self.rig_driver is None:
+            return super(RigEvaluationGA, self).submit(chromosome)
+        self.num_evaluations += 1
+        return self.rig_driver.submit(chromosome)
+
+    def evaluation_capacity(self):
+        """Every rig glitches one waveform while the next ones are uploaded to its other segments."""
+        if self.rig_driver is None:
+            return super(RigEvaluationGA, self).evaluation_capacity()
+        return sum(rig.segments for rig in self.rigs)
+
+    def solve(self):
+        try:
+            return super(RigEvaluationGA, self).solve()
+        finally:
+            if self.rig_driver is not None:
+                self.rig_driver.shutdown()
+
+
+if __name__ == "__main__":
+    import time
+    from individual import Chromosome
+
+    chromosomes = [Chromosome() for _ in range(30)]
+    for num_rigs in (1, 3):
+        driver = RigDriver([SimulatedRig("sim{}".format(i), glitch_jitter=0.05) for i in range(num_rigs)])
+        start = time.perf_counter()
+        scores = driver.score_batch(chromosomes)
+        print("{} rig(s): {:.2f} s, best score {:.4f}".format(num_rigs, time.perf_counter() - start, max(scores)))
+        driver.shutdown()
+
+    # A chain of single y mutations, like consecutive children of one parent
+    chain = [Chromosome()]
+    for _ in range(29):
+        child = chain[-1].make_copy()
+        child.coordinates[np.random.randint(child.length), 1] += 0.05 * np.random.randn()
+        child.invalidate_waveforms()
+        chain.append(child)
+    for delta_upload in (False, True):
+        rig = SimulatedRig(segments=1)
+        driver = RigDriver([rig], delta_upload=delta_upload)
+        scores = driver.score_batch(chain)
+        driver.shutdown()
+        print("delta upload {}: {} bytes in {} writes, {:.3f} s".format(delta_upload, rig.awg.bytes_transferred,
+                                                                      rig.awg.num_writes, rig.awg.transfer_time))
@@ -4,9 +4,18 @@ Normally the function called here will write the given chromosome to the AWG, in
 through the arduino, and then receive (and maybe calculate) score from arduino.
 However, during production, a simulation score will be used.
 """
+from functools import lru_cache
+
 from global_constants_and_functions import *
+from base import EstimatedScore
+from population import Population
+from interpolation import InterpolationPlan, fit_quadratic_splines, get_plan, spline_slopes
 
 DEBUG = True
+# Number of interpolated samples held in memory at once while scoring a population
+SCORE_BATCH_SAMPLES = 1 << 22
+# Number of samples of the coarse grid of coarse to fine scoring
+COARSE_NUM_SAMPLES = 512
 
 
 def score_chromosome(chromosome):
@@ -16,8 +25,29 @@ def score_chromosome(chromosome):
         return glitch_score_chromosome(chromosome)
 
 
+def score_batch(chromosomes, top_k=None, num_coarse=COARSE_NUM_SAMPLES):
+    """
+    Score a list of chromosomes at once.
+    :param top_k: in simulation, score coarse to fine: only chromosomes that could be among the top_k best are scored
+        at full resolution (see sim_score_population_coarse_to_fine). None scores all at full resolution.
+    :return: array of scores, in the order of the given chromosomes (a list with top_k, see sim_score_batch)
+    """
+    if DEBUG:
+        return sim_score_batch(chromosomes, top_k, num_coarse)
+    else:
+        return np.array([glitch_score_chromosome(chromosome) for chromosome in chromosomes])
+
+
+def score_chromosome_list(chromosomes):
+    """
+    Score a list of chromosomes one at a time.
+    :return: list of scores, in the order of the given chromosomes
+    """
+    return [score_chromosome(chromosome) for chromosome in chromosomes]
+
+
 def glitch_score_chromosome(chromosome):
-    raise NotImplementedError()
+    raise NotImplementedError("Glitching is done by rig.RigDriver, configure the rigs through config['rigs']")
 
 
 def sim_score_chromosome(chromosome):
@@ -26,10 +56,136 @@ def sim_score_chromosome(chromosome):
     :param chromosome:
     :return:
     """
-    _, y_samples = chromosome.interpolate_coordinates()
-    v_pulse_samples = v_pulse_shape(0.6, 0.6, 0.6, chromosome.num_samples)
-    return np.exp(-(np.linalg.norm(y_samples - v_pulse_samples) / np.sqrt(chromosome.num_samples)
-                    + np.linalg.norm((chromosome.freq - 20e6) / MIN_FREQ)))
+    return sim_score_waveform(chromosome.waveform, chromosome.freq)
+
+
+def sim_score_waveform(y_samples, freq):
+    """
+    The simulation score of an already sampled waveform (normalized to [-1, 1]) played at frequency freq.
+    :return: score
+    """
+    num_samples = len(y_samples)
+    v_pulse_samples = target_waveform(num_samples)
+    return np.exp(-(np.linalg.norm(y_samples - v_pulse_samples) / np.sqrt(num_samples)
+                    + np.linalg.norm((freq - 20e6) / MIN_FREQ)))
+
+
+def sim_score_batch(chromosomes, top_k=None, num_coarse=COARSE_NUM_SAMPLES):
+    """
+    Vectorized version of sim_score_chromosome, chromosomes are grouped by their number of samples
+    and every group is scored as one population. Chromosomes that already hold their waveform are scored from it.
+    :param top_k: if given, groups are scored coarse to fine, see sim_score_population_coarse_to_fine
+    :return: array of scores, in the order of the given chromosomes. With top_k, a list in which the scores of the
+        chromosomes that were not scored at full resolution are EstimatedScore
+    """
+    scores = np.empty(len(chromosomes))
+    estimated = np.zeros(len(chromosomes), dtype=bool)
+    groups = {}
+    for i, chromosome in enumerate(chromosomes):
+        if chromosome.waveform_is_cached:
+            scores[i] = sim_score_waveform(chromosome.waveform, chromosome.freq)
+        else:
+            groups.setdefault(chromosome.num_samples, []).append(i)
+    for indices in groups.values():
+        population = Population.from_chromosomes([chromosomes[i] for i in indices])
+        if top_k is None:
+            scores[indices] = sim_score_population(population)
+        else:
+            scores[indices], promoted = sim_score_population_coarse_to_fine(population, top_k, num_coarse)
+            estimated[indices] = ~promoted
+    if top_k is None:
+        return scores
+    return [EstimatedScore(score) if estimate else score for score, estimate in zip(scores.tolist(), estimated)]
+
+
+def sim_score_population(population):
+    """
+    Score all rows of a population with the same V shaped simulation as sim_score_chromosome.
+    The waveforms are interpolated in blocks of rows to keep memory bounded.
+    :param population: Population object
+    :return: array of scores
+    """
+    num_samples = population.num_samples
+    v_pulse_samples = target_waveform(num_samples)
+    distances = np.empty(len(population))
+    rows_per_block = max(1, SCORE_BATCH_SAMPLES // num_samples)
+    y_samples = np.empty([min(rows_per_block, len(population)), num_samples])
+    for start in range(0, len(population), rows_per_block):
+        stop = min(start + rows_per_block, len(population))
+        _, block = population.interpolate(start, stop, out=y_samples[:stop - start])
+        block -= v_pulse_samples
+        distances[start:stop] = np.linalg.norm(block, axis=1)
+    return np.exp(-(distances / np.sqrt(num_samples) + np.abs((population.freq - 20e6) / MIN_FREQ)))
+
+
+def sim_score_bounds(population, num_coarse=COARSE_NUM_SAMPLES):
+    """
+    Estimate and bound the scores of sim_score_population from the waveforms on a coarse grid.
+    On the coarse grid, every full resolution sample is represented by its nearest coarse point, and the error between
+    the waveform and the target moves by at most L * max_gap between them, where L is the slope bound of the spline
+    plus the one of the target. So the full resolution RMS distance is within L * max_gap of the weighted coarse RMS
+    distance, which bounds every score.
+    :return: estimated scores (of the coarse distances), lower bounds and upper bounds of the scores
+    """
+    num_samples = population.num_samples
+    plan, weights, max_gap, coarse_target, target_slope = coarse_grid(num_samples, num_coarse)
+    left_edges, poly = fit_quadratic_splines(population.coordinates, population.lengths)
+    errors = plan.evaluate_polynomials(left_edges, poly, population.lengths)
+    errors -= coarse_target
+    distances = np.sqrt((weights * errors ** 2).sum(axis=1) / num_samples)
+    bounds = (spline_slopes(left_edges, poly, population.lengths) + target_slope) * max_gap
+
+    freq_distances = np.abs((population.freq - 20e6) / MIN_FREQ)
+    lower = np.exp(-(distances + bounds + freq_distances))
+    upper = np.exp(-(np.maximum(distances - bounds, 0) + freq_distances))
+    return np.exp(-(distances + freq_distances)), lower, upper
+
+
+def sim_score_population_coarse_to_fine(population, top_k, num_coarse=COARSE_NUM_SAMPLES):
+    """
+    Score a population like sim_score_population, but bound the scores on a coarse grid first (see sim_score_bounds).
+    Only rows whose upper bound reaches the top_k'th best lower bound could be among the top_k best, and are scored at
+    full resolution; the others keep the estimate of their coarse distance, which is below the score of the top_k.
+    :return: scores, boolean array of the rows that were scored at full resolution
+    """
+    if num_coarse >= population.num_samples or len(population) <= top_k:
+        return sim_score_population(population), np.ones(len(population), dtype=bool)
+
+    scores, lower, upper = sim_score_bounds(population, num_coarse)
+    threshold = np.partition(lower, len(lower) - top_k)[len(lower) - top_k]
+    promoted = upper >= threshold
+    scores[promoted] = sim_score_population(population.take(np.flatnonzero(promoted)))
+    return scores, promoted
+
+
+@lru_cache(maxsize=None)
+def coarse_grid(num_samples, num_coarse):
+    """
+    The coarse grid of num_coarse of the num_samples points of the sampling grid, for coarse to fine scoring.
+    :return: plan of the coarse points, weights (number of full resolution samples nearest to every coarse point),
+        max_gap (largest distance from a full resolution sample to its nearest coarse point), the target at the coarse
+        points, and the largest slope of the target between consecutive samples
+    """
+    indices = np.unique(np.round(np.linspace(0, num_samples - 1, num_coarse)).astype(int))
+    x_samples = get_plan(num_samples).x_samples
+    coarse_x = x_samples[indices]
+    nearest = np.searchsorted((coarse_x[1:] + coarse_x[:-1]) / 2, x_samples)
+    weights = np.bincount(nearest, minlength=len(indices))
+    max_gap = np.abs(x_samples - coarse_x[nearest]).max()
+    target = target_waveform(num_samples)
+    target_slope = np.abs(np.diff(target)).max() * (num_samples - 1)
+    return InterpolationPlan(x_samples=coarse_x), weights, max_gap, target[indices], target_slope
+
+
+@lru_cache(maxsize=None)
+def target_waveform(num_samples=SAMPLE_NUM):
+    """
+    The simulation target, computed once per number of samples.
+    :return: read only array of samples
+    """
+    v_pulse_samples = v_pulse_shape(0.6, 0.6, 0.6, num_samples)
+    v_pulse_samples.setflags(write=False)
+    return v_pulse_samples
 
 
 def v_pulse_shape(width: float, depth: float, loc: float, length=SAMPLE_NUM):
@@ -29,6 +29,9 @@ Contents
     fitness function is expensive, and it has the advantage of being agnostic to
     the scale of scores.
 
+:EliteArchive:
+    A bounded min-heap of the fittest chromosomes, used by ``ElitistGA``.
+
 :ElitistGA:
     Elitism ensures the survival of the absolute fittest chromosomes between
     generations to prevent regression. This is not a selection mechanism by
@@ -38,18 +41,36 @@ Contents
 from __future__ import division
 # from builtins import range
 
+import heapq
+import itertools
 import math
 import random
 
+import numpy as np
+
 import base
+from checkpoint import pack_keys, unpack_keys
 
 
 class ProportionateGA(base.GeneticAlgorithm):
-    """A GA that uses fitness-proportionate selection."""
+    """A GA that uses fitness-proportionate selection.
+
+    The cumulative selection weights are kept in a numpy array, so a parent is
+    found with a binary search. All the parents of a generation are drawn at
+    once in ``generate``, either independently (``"roulette"``) or with
+    stochastic universal sampling (``"sus"``), set by ``selection_sampling``
+    in the ``config`` object.
+    """
 
     def __init__(self, config={}):
         super(ProportionateGA, self).__init__(config)
         self.scored = None
+        self.tallies = None
+        self.parent_queue = []
+        self.selection_sampling = self.config.setdefault("selection_sampling", "roulette")
+
+        if self.selection_sampling not in ("roulette", "sus"):
+            raise ValueError("Unknown selection sampling: {}".format(self.selection_sampling))
 
     def proportion_population(self):
         """Return a scored and ranked copy of the population.
@@ -59,26 +80,82 @@ class ProportionateGA(base.GeneticAlgorithm):
         """
 
         super().score_population()
-        shares = float(sum([t[1] for t in self.ranked]))
+        self.proportion_ranked()
 
-        self.scored = []
-        tally = 0
-        for tupl in self.ranked:
-            if tupl[1] > 0:
-                tally = tally + tupl[1] / shares
-            # chromosome, score, share range
-            self.scored.append((tupl[0], tupl[1], tally))
+    def selection_weights(self, scores):
+        """Return the selection weight of each ranked score.
 
+        Members with a weight of ``nan`` are left out of ``self.scored``.
+        """
+        return np.where(scores > 0, scores, 0.0)
+
+    def proportion_ranked(self):
+        """Build the cumulative selection weights of ``self.ranked``."""
+        scores = np.array([t[1] for t in self.ranked], dtype=float)
+        weights = self.selection_weights(scores)
+        selectable = ~np.isnan(weights)
+        weights = weights[selectable]
+        if weights.sum() <= 0:
+            weights = np.ones_like(weights)  # all members are equally fit
+
+        self.tallies = np.cumsum(weights)
+        shares = np.divide(self.tallies, self.tallies[-1]) if len(self.tallies) > 0 else self.tallies
+        ranked = [tupl for tupl, keep in zip(self.ranked, selectable) if keep]
+        # chromosome, score, share range
+        self.scored = [(tupl[0], tupl[1], tally) for tupl, tally in zip(ranked, shares.tolist())]
+
+    def select_indices(self, count, sampling=None):
+        """Return the indices in ``self.scored`` of ``count`` parents.
+
+        Args:
+            count (int): Number of parents to draw.
+            sampling (str): ``"roulette"`` draws every parent independently,
+                ``"sus"`` uses stochastic universal sampling (one spin with
+                ``count`` equally spaced pointers), which has the same
+                expected counts but far less variance. Defaults to the
+                ``selection_sampling`` config value.
+        """
+        if self.tallies is None or len(self.tallies) == 0:
+            raise Exception("Failed to select a parent. Begin troubleshooting by "
+                            "checking your fitness function.")
+        sampling = sampling or self.selection_sampling
+        total = self.tallies[-1]
+        if sampling == "sus":
+            step = total / count
+            pointers = self.np_random.random() * step + step * np.arange(count)
+            # Shuffle, so that consecutive parents are not neighbors in rank
+            pointers = self.np_random.permutation(pointers)
+        else:
+            pointers = self.np_random.random(count) * total
+        indices = np.searchsorted(self.tallies, pointers, side="right")
+        return np.minimum(indices, len(self.tallies) - 1)
+
+    def select_batch(self, count, sampling=None):
+        """Return ``count`` parents drawn in a fitness-proportionate way."""
+        return [self.scored[i][0] for i in self.select_indices(count, sampling)]
 
     def select(self):
         """Select a member of the population in a fitness-proportionate way."""
-        number = self.random.random()
-        for ticket in self.scored:
-            if number < ticket[2]:
-                return ticket[0]
-
-        raise Exception("Failed to select a parent. Begin troubleshooting by "
-                        "checking your fitness function.")
+        if len(self.parent_queue) > 0:
+            return self.parent_queue.pop()
+
+        if self.tallies is None or len(self.tallies) == 0:
+            raise Exception("Failed to select a parent. Begin troubleshooting by "
+                            "checking your fitness function.")
+        number = self.random.random() * self.tallies[-1]
+        index = min(int(np.searchsorted(self.tallies, number, side="right")), len(self.tallies) - 1)
+        return self.scored[index][0]
+
+    def generate(self):
+        """Draw all the parents of the generation at once, then generate it."""
+        needed = self.population_size - self.add_random_num - len(self.next_generation)
+        if needed > 0:
+            # one parent per child, rounded up to whole pairs
+            self.parent_queue = self.select_batch(needed + needed % self.num_cx_children)
+        try:
+            super(ProportionateGA, self).generate()
+        finally:
+            self.parent_queue = []
 
     def pre_generate(self):
         """Create a new generation using elitism with crossover and mutation.
@@ -97,6 +174,15 @@ class ProportionateGA(base.GeneticAlgorithm):
         super(ProportionateGA, self).post_generate()
         self.proportion_population()
 
+    def ranked_changed(self):
+        super(ProportionateGA, self).ranked_changed()
+        self.proportion_ranked()
+
+    def forget_scores(self):
+        super(ProportionateGA, self).forget_scores()
+        self.scored = None
+        self.tallies = None
+
     def best(self):
         return self.scored[0][0]
 
@@ -104,26 +190,16 @@ class ProportionateGA(base.GeneticAlgorithm):
 class ScalingProportionateGA(ProportionateGA):
     """A proportionate selection strategy that scales scores."""
 
-    def proportion_population(self):
-        """Return a scored and ranked copy of the population.
+    def selection_weights(self, scores):
+        """Scale scores so that the worst non-zero score has no advantage.
 
-        This scores the fitness of each member of the population and returns
-        the complete population as `[(member, score, weighted fitness)]`.
+        Members with a score of zero or less are never selected.
         """
-
-        super().score_population()
-        scores = [t[1] for t in self.ranked if t[1] > 0]
-        worst = min(scores)
-        shares = float(sum([t[1] - worst for t in self.ranked]))
-
-        self.scored = []
-        tally = 0
-        for tupl in self.ranked:
-            if tupl[1] > 0:
-                share = (tupl[1] - worst) / shares
-                tally = tally + share
-                # chromosome, score, share range
-                self.scored.append((tupl[0], tupl[1], tally))
+        positive = scores > 0
+        if not positive.any():
+            return np.full_like(scores, np.nan)
+        worst = scores[positive].min()
+        return np.where(positive, scores - worst, np.nan)
 
 
 class TournamentGA(base.GeneticAlgorithm):
@@ -157,6 +233,81 @@ class TournamentGA(base.GeneticAlgorithm):
         return scored[0][0]
 
 
+class EliteArchive(object):
+    """A bounded archive of the fittest ``(score, chromosome)`` pairs.
+
+    The archive is a min-heap, so the worst elite is always at the top and an
+    insertion costs O(log k). Chromosomes are deduplicated by ``key``, so the
+    same genome can not take more than one place among the elites.
+    """
+
+    def __init__(self, capacity, key=id):
+        self.capacity = capacity
+        self.key = key
+        self.heap = []  # (score, insertion order, key, chromosome)
+        self.scores = {}  # key -> score of the elites in the heap
+        self.counter = itertools.count()
+
+    def __len__(self):
+        return len(self.heap)
+
+    def offer(self, score, chromosome):
+        """Add a chromosome if it is fitter than the worst elite.
+
+        Returns:
+            bool: Whether the chromosome was added.
+        """
+        full = len(self.heap) >= self.capacity
+        if self.capacity <= 0 or (full and score <= self.heap[0][0]):
+            return False
+
+        key = self.key(chromosome)
+        if key in self.scores:
+            if score <= self.scores[key]:
+                return False
+            # Rescored genome, drop its old entry
+            self.heap = [entry for entry in self.heap if entry[2] != key]
+            heapq.heapify(self.heap)
+            full = False
+
+        entry = (score, next(self.counter), key, chromosome)
+        if full:
+            evicted = heapq.heapreplace(self.heap, entry)
+            del self.scores[evicted[2]]
+        else:
+            heapq.heappush(self.heap, entry)
+        self.scores[key] = score
+        return True
+
+    def snapshot(self):
+        """Return the elites as ``[(score, chromosome)]``, fittest first.
+
+        Elites with equal scores are in the order they were added.
+        """
+        entries = sorted(self.heap, key=lambda entry: (-entry[0], entry[1]))
+        return [(entry[0], entry[3]) for entry in entries]
+
+    def clear(self):
+        self.heap = []
+        self.scores = {}
+
+    def save_state(self, state, ref):
+        """Add the archive to ``state``, see ``base.GeneticAlgorithm.save_state``."""
+        state["elites"] = np.array([ref(entry[3]) for entry in self.heap], dtype=int)
+        state["elite_scores"] = np.array([entry[0] for entry in self.heap], dtype=float)
+        state["elite_counters"] = np.array([entry[1] for entry in self.heap], dtype=int)
+        state["elite_keys"] = pack_keys([entry[2] for entry in self.heap])
+
+    def restore_state(self, state, deref):
+        keys = unpack_keys(state["elite_keys"])
+        scores = state["elite_scores"].tolist()
+        counters = state["elite_counters"].tolist()
+        self.heap = [(score, counter, key, deref(row)) for score, counter, key, row
+                     in zip(scores, counters, keys, state["elites"].tolist())]
+        self.scores = dict(zip(keys, scores))
+        self.counter = itertools.count(max(counters, default=-1) + 1)
+
+
 class ElitistGA(base.GeneticAlgorithm):
     """A GA that preserves the fittest solutions for crossover."""
 
@@ -166,41 +317,31 @@ class ElitistGA(base.GeneticAlgorithm):
         pct = self.config.setdefault("elitism_pct", 0.02)
         self.elitism_pct = pct
         self.num_elites = int(math.ceil(pct * self.population_size))
-        self.elites = []
-
-    def fitness(self, chromosome):
-        """Add a chromosome to the population of elite solutions."""
-
-        score = super(ElitistGA, self).fitness(chromosome)
-
-        if self.num_elites > 0:
+        self.elites = EliteArchive(self.num_elites, key=self.chromosome_key)
 
-            if len(self.elites) > 0:
-                sentry = self.elites[-1][0]
-            else:
-                sentry = 0
+    def fitness(self, chromosome, score=None):
+        """Add a chromosome to the population of elite solutions, unless its score is only estimated."""
 
-            if score > sentry or len(self.elites) < self.num_elites:
-
-                add = (score, chromosome)
-                pos = None
+        score = super(ElitistGA, self).fitness(chromosome, score)
+        if not isinstance(score, base.EstimatedScore):
+            self.elites.offer(self.elite_score(chromosome, score), chromosome)
+        return score
 
-                for i in range(0, len(self.elites)):
-                    if score > self.elites[i][0]:
-                        pos = i
-                        break
+    def elite_score(self, chromosome, score):
+        """Return the score elites are compared by, the fitness by default."""
+        return score
 
-                if pos is None:
-                    self.elites.append(add)
-                elif pos == 0:
-                    self.elites = [add] + self.elites
-                else:
-                    self.elites = self.elites[0:pos] + [add] + self.elites[pos:]
+    def forget_scores(self):
+        super(ElitistGA, self).forget_scores()
+        self.elites.clear()
 
-                if len(self.elites) > self.num_elites:
-                    self.elites = self.elites[0:-1]
+    def save_state(self, state, ref):
+        super(ElitistGA, self).save_state(state, ref)
+        self.elites.save_state(state, ref)
 
-        return score
+    def restore_state(self, state, deref):
+        super(ElitistGA, self).restore_state(state, deref)
+        self.elites.restore_state(state, deref)
 
     @classmethod
     def arg_parser(cls):
@@ -220,4 +361,4 @@ class ElitistGA(base.GeneticAlgorithm):
         super(ElitistGA, self).pre_generate()
 
         if len(self.elites) > 0:
-            self.next_generation += [elite[1] for elite in self.elites]
+            self.next_generation += [elite[1] for elite in self.elites.snapshot()]
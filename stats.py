@@ -0,0 +1,105 @@
+"""Binary generation statistics for genetic algorithms.
+
+
+Contents
+--------
+
+:STATS_DTYPE:
+    The fixed-width record written for every generation.
+:StatsRecorder:
+    A preallocated ring buffer of records, flushed to a binary file.
+:load_stats:
+    Load a statistics file for analysis.
+
+The file is a plain sequence of ``STATS_DTYPE`` records with no header, so
+a resumed run can keep appending to the file of the run it resumes, and it
+can be read with ``numpy.fromfile`` or ``numpy.memmap``.
+
+"""
+from __future__ import division
+
+import numpy as np
+
+STATS_DTYPE = np.dtype([
+    ("iteration", "<i8"),
+    ("best", "<f8"),
+    ("mean", "<f8"),
+    ("worst", "<f8"),
+    ("std", "<f8"),
+    ("evaluations", "<i8"),
+    ("wall_time", "<f8"),  # seconds since the GA started
+    ("cache_hit_rate", "<f8"),  # nan without a fitness cache
+])
+
+
+class StatsRecorder(object):
+    """A ring buffer of generation statistics.
+
+    Records are written to the preallocated buffer, and appended to ``path``
+    only when the buffer is full or on ``flush``. Without a path the buffer
+    keeps the latest ``capacity`` records. An existing file at ``path`` is
+    emptied, unless ``append`` is true.
+    """
+
+    def __init__(self, path=None, capacity=256, append=False):
+        self.path = path
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=STATS_DTYPE)
+        self.total = 0  # number of records ever recorded
+        self.flushed = 0  # number of records written to the file
+
+        if self.path is not None and not append:
+            open(self.path, "wb").close()
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def record(self, iteration, scores, evaluations, wall_time, cache_hit_rate=np.nan):
+        """Record the statistics of one generation.
+
+        Args:
+            scores (numpy.ndarray): The scores of the generation.
+        """
+        if self.path is not None and self.total - self.flushed >= self.capacity:
+            self.flush()
+        entry = self.buffer[self.total % self.capacity]
+        entry["iteration"] = iteration
+        if len(scores) > 0:
+            entry["best"] = scores.max()
+            entry["mean"] = scores.mean()
+            entry["worst"] = scores.min()
+            entry["std"] = scores.std()
+        else:
+            entry["best"] = entry["mean"] = entry["worst"] = entry["std"] = 0.0
+        entry["evaluations"] = evaluations
+        entry["wall_time"] = wall_time
+        entry["cache_hit_rate"] = cache_hit_rate
+        self.total += 1
+
+    def _range(self, start, stop):
+        """Return records ``[start, stop)`` of the ring, oldest first."""
+        indices = np.arange(start, stop) % self.capacity
+        return self.buffer[indices]
+
+    def recent(self):
+        """Return the records held in the buffer, oldest first."""
+        return self._range(self.total - len(self), self.total)
+
+    def flush(self):
+        """Append the records that were not written yet to the file."""
+        if self.path is None or self.flushed == self.total:
+            return
+        with open(self.path, "ab") as f:
+            f.write(self._range(self.flushed, self.total).tobytes())
+        self.flushed = self.total
+
+
+def load_stats(path, mmap=False):
+    """Load a statistics file as a structured array of ``STATS_DTYPE``.
+
+    Args:
+        mmap (bool): Map the file instead of reading it, for very long runs.
+    """
+    if mmap:
+        return np.memmap(path, dtype=STATS_DTYPE, mode="r")
+    return np.fromfile(path, dtype=STATS_DTYPE)
@@ -0,0 +1,216 @@
+"""Steady-state evolution for genetic algorithms.
+
+
+Contents
+--------
+
+:SteadyStateGA:
+    A GA without generations: offspring are scored as soon as there is a
+    free evaluation slot, and every score that comes back immediately puts
+    its chromosome in the population in place of the worst member or of a
+    tournament loser. Rigs or worker processes with very different
+    evaluation times are never left idle waiting for the slowest one.
+
+"""
+from __future__ import division
+
+import copy
+import logging
+from concurrent.futures import FIRST_COMPLETED, wait
+
+import numpy as np
+
+import base
+
+
+class SteadyStateGA(base.GeneticAlgorithm):
+    """A GA that replaces one member of the population per evaluation.
+
+    Enable it by setting ``steady_state`` to true in the ``config`` object.
+    ``steady_state_in_flight`` is the number of offspring being scored at
+    once (defaults to ``evaluation_capacity``), and
+    ``steady_state_replacement`` chooses the member a scored child replaces:
+    ``"worst"``, or ``"tournament"`` for the loser of ``tournament_size``
+    random members. Children whose genome is already in the population are
+    dropped. The ``num_elites`` fittest members (see
+    ``selection.ElitistGA``) are never replaced. Since every evaluation
+    already replaces a member, ``remove_worst_num`` is ignored, and the
+    population always holds ``population_size`` members.
+
+    Offspring are bred with ``crossover``, ``select`` and ``mutate``, the
+    ``crossover_prob`` and ``add_random_num`` rates of the generational
+    algorithm are kept per child, and scores go through ``fitness``, so
+    elitism and best score triggers work as usual.
+
+    Progress is counted per evaluation: every ``population_size`` scored
+    children make one iteration, at the end of which the best score is added
+    to ``best_scores``, and the best chromosome, the statistics and the
+    checkpoint are recorded by the behaviors that are mixed in. So
+    ``max_iterations`` and ``behavior.FinishWhenSlowGA`` stop the run after
+    the same number of evaluations as a generational run, and the stop
+    condition is checked after every evaluation. If the run stops in the
+    middle of an iteration, the children scored since the last one make a
+    last, shorter iteration.
+
+    A child whose scoring fails (a rig error, a failed or cancelled worker)
+    is logged and dropped, and the other evaluations go on. The error stops
+    the run only after ``population_size`` children in a row failed.
+
+    Mix this behavior in last, since it replaces the generational loop of
+    ``solve`` inside the other behaviors.
+    """
+
+    def __init__(self, config={}):
+        super(SteadyStateGA, self).__init__(config)
+        self.steady_state = self.config.setdefault("steady_state", False)
+        self.steady_state_in_flight = self.config.setdefault("steady_state_in_flight", None)
+        self.steady_state_replacement = self.config.setdefault("steady_state_replacement", "worst")
+        self.tournament_size = self.config.setdefault("tournament_size", 2)
+        self.num_children_scored = 0
+        self.population_keys = set()
+        self.offspring = []
+        self.num_score_resets = 0  # number of forget_scores calls, see solve()
+
+        if self.steady_state_replacement not in ("worst", "tournament"):
+            raise ValueError("Unknown replacement: {}".format(self.steady_state_replacement))
+        if self.steady_state:
+            # Rankings are the whole population, which replace() keeps at population_size
+            self.remove_worst_num = 0
+
+    def copy_chromosome(self, chromosome):
+        """Return a copy of a selected parent, which ``mutate`` may change in place."""
+        return copy.deepcopy(chromosome)
+
+    def score_population(self):
+        super(SteadyStateGA, self).score_population()
+        if self.steady_state:
+            # replace() edits the ranking in place, so the population is kept in rank order
+            self.population = [member for member, _ in self.ranked]
+            self.ranked_population = self.population
+            self.population_keys = {self.chromosome_key(member) for member in self.population}
+
+    def rank_population(self):
+        """Score and rank the population, and update what depends on the ranking."""
+        self.score_population()
+        self.ranked_changed()
+
+    def forget_scores(self):
+        super(SteadyStateGA, self).forget_scores()
+        # Offspring bred, or being scored, until now belong to the old problem
+        self.offspring = []
+        self.num_score_resets += 1
+
+    def sync_population(self):
+        """Make the population the ranked members, and update what depends on the ranking."""
+        self.population = [member for member, _ in self.ranked]
+        self.ranked_population = self.population
+        self.ranked_changed()
+
+    def save_state(self, state, ref):
+        super(SteadyStateGA, self).save_state(state, ref)
+        if self.steady_state:
+            state["num_children_scored"] = np.array(self.num_children_scored)
+            state["offspring"] = np.array([ref(child) for child in self.offspring], dtype=int)
+
+    def restore_state(self, state, deref):
+        super(SteadyStateGA, self).restore_state(state, deref)
+        if self.steady_state and "num_children_scored" in state:
+            self.num_children_scored = int(state["num_children_scored"])
+            self.offspring = [deref(row) for row in state["offspring"].tolist()]
+            self.population_keys = {self.chromosome_key(member) for member in self.population}
+
+    def breed(self):
+        """Return the next child to score."""
+        while len(self.offspring) == 0:
+            if self.random.random() * self.population_size < self.add_random_num:
+                self.offspring = [self.create()]
+            elif self.random.random() < self.crossover_prob:
+                with self.profile("crossover"):
+                    children = self.crossover()
+                with self.profile("mutate"):
+                    self.offspring = [self.mutate(child) for child in children]
+            else:
+                parent = self.copy_chromosome(self.select())
+                with self.profile("mutate"):
+                    self.offspring = [self.mutate(parent)]
+        return self.offspring.pop(0)
+
+    def replace(self, child, score):
+        """Put a scored child in the population, in place of a worse member.
+
+        Returns:
+            bool: Whether the child was added.
+        """
+        key = self.chromosome_key(child)
+        if key in self.population_keys:
+            return False
+
+        protected = min(getattr(self, "num_elites", 0), len(self.ranked) - 1)
+        if self.steady_state_replacement == "worst":
+            loser = len(self.ranked) - 1
+        else:
+            # ranked is sorted by score, so the loser is the largest index drawn
+            loser = max(self.random.randrange(protected, len(self.ranked)) for _ in range(self.tournament_size))
+        self.population_keys.discard(self.chromosome_key(self.ranked[loser][0]))
+        del self.ranked[loser]
+
+        position = len(self.ranked)
+        while position > 0 and self.ranked[position - 1][1] < score:
+            position -= 1
+        self.ranked.insert(position, (child, score))
+        self.population_keys.add(key)
+        self.sync_population()
+        return True
+
+    def solve(self):
+        """Run the GA one evaluation at a time and return the best solution."""
+        if not self.steady_state:
+            return super(SteadyStateGA, self).solve()
+
+        if self.population is None:
+            self.seed()
+        if self.ranked is None or self.ranked_population is not self.population:
+            # A resumed run continues from the ranking it saved
+            self.rank_population()
+        in_flight = {}  # Future -> (child, num_score_resets when it was submitted)
+        in_flight_max = self.steady_state_in_flight or self.evaluation_capacity()
+        num_failures = 0  # children in a row whose scoring failed
+
+        try:
+            while not self.is_finished():
+                while len(in_flight) < in_flight_max:
+                    child = self.breed()
+                    # A child whose genome is already being scored shares its Future, and is dropped here
+                    in_flight[self.submit(child)] = (child, self.num_score_resets)
+
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    child, num_score_resets = in_flight.pop(future)
+                    try:
+                        score = future.result()
+                    except Exception:
+                        # One rig or worker failing does not stop the others, unless nothing gets scored anymore
+                        num_failures += 1
+                        if num_failures >= self.population_size:
+                            raise
+                        logging.getLogger("levis").exception("Failed to score a child, it is dropped")
+                        continue
+                    num_failures = 0
+                    if num_score_resets == self.num_score_resets:
+                        self.replace(child, self.fitness(child, score))
+                    self.num_children_scored += 1
+                    if self.num_children_scored % self.population_size == 0:
+                        self.iteration += 1
+                        self.end_iteration()
+                        print("Iteration {} Finished".format(self.iteration))
+        except KeyboardInterrupt:
+            print("\nKeyboardInterrupt\n")
+        finally:
+            for future in in_flight:
+                future.cancel()
+
+        if self.num_children_scored % self.population_size != 0:
+            # The children scored since the last iteration make a last, shorter one
+            self.iteration += 1
+            self.end_iteration()
+        return self.best()
@@ -0,0 +1,235 @@
+"""Surrogate models of the fitness for genetic algorithms.
+
+
+Contents
+--------
+
+:RidgeSurrogate:
+    Ridge regression of the score on feature vectors and their squares.
+:KnnSurrogate:
+    Inverse distance weighted k nearest neighbors regression.
+:rank_correlation:
+    Spearman rank correlation of two arrays.
+:SurrogateGA:
+    A GA that trains a surrogate online from every real evaluation, and uses
+    it to pick which of an oversampled set of offspring are worth a real
+    evaluation.
+
+Both models keep their training set in a bounded ring of the latest
+``capacity`` samples, and only use numpy.
+
+"""
+from __future__ import division
+
+import math
+
+import numpy as np
+
+import base
+from checkpoint import pack_keys, unpack_keys
+
+
+def rank_correlation(a, b):
+    """Return the Spearman rank correlation of two arrays (ties are ranked by order)."""
+    a_ranks = np.argsort(np.argsort(a)).astype(float)
+    b_ranks = np.argsort(np.argsort(b)).astype(float)
+    a_ranks -= a_ranks.mean()
+    b_ranks -= b_ranks.mean()
+    denominator = np.sqrt((a_ranks ** 2).sum() * (b_ranks ** 2).sum())
+    return float((a_ranks * b_ranks).sum() / denominator) if denominator > 0 else 0.0
+
+
+class RidgeSurrogate(object):
+    """Ridge regression on standardized features and their squares, refitted lazily after new samples.
+
+    The squares let it rank by distance to an unknown optimum, which a
+    linear model of the features alone cannot do.
+    """
+
+    def __init__(self, capacity=2000, alpha=1.0):
+        self.capacity = capacity
+        self.alpha = alpha
+        self.features = None
+        self.scores = np.zeros(capacity)
+        self.total = 0  # number of samples ever added
+        self.coefficients = None
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    def add(self, features, scores):
+        """Add training samples, replacing the oldest ones when full."""
+        features = np.atleast_2d(np.asarray(features, dtype=float))
+        if self.features is None:
+            self.features = np.zeros([self.capacity, features.shape[1]])
+        rows = (self.total + np.arange(len(features))) % self.capacity
+        self.features[rows] = features
+        self.scores[rows] = scores
+        self.total += len(features)
+        self.coefficients = None
+
+    @staticmethod
+    def expand(features):
+        return np.concatenate([features, features ** 2], axis=1)
+
+    def fit(self):
+        x, y = self.expand(self.features[:len(self)]), self.scores[:len(self)]
+        self.mean, self.std = x.mean(axis=0), x.std(axis=0)
+        self.std[self.std == 0] = 1.0
+        x = (x - self.mean) / self.std
+        self.intercept = y.mean()
+        gram = x.T @ x + self.alpha * np.eye(x.shape[1])
+        self.coefficients = np.linalg.solve(gram, x.T @ (y - self.intercept))
+
+    def predict(self, features):
+        if self.coefficients is None:
+            self.fit()
+        features = (self.expand(np.atleast_2d(features)) - self.mean) / self.std
+        return features @ self.coefficients + self.intercept
+
+
+class KnnSurrogate(RidgeSurrogate):
+    """Inverse distance weighted mean of the scores of the ``k`` nearest samples."""
+
+    def __init__(self, capacity=2000, k=5):
+        super(KnnSurrogate, self).__init__(capacity)
+        self.k = k
+
+    def predict(self, features):
+        features = np.atleast_2d(features)
+        x, y = self.features[:len(self)], self.scores[:len(self)]
+        distances = ((features ** 2).sum(axis=1)[:, None] - 2 * features @ x.T + (x ** 2).sum(axis=1)[None, :])
+        distances = np.sqrt(np.maximum(distances, 0))
+        k = min(self.k, len(self))
+        nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+        weights = 1 / (np.take_along_axis(distances, nearest, axis=1) + 1e-9)
+        return (weights * y[nearest]).sum(axis=1) / weights.sum(axis=1)
+
+
+class SurrogateGA(base.GeneticAlgorithm):
+    """A GA that screens offspring with a surrogate model of the fitness.
+
+    Enable it by setting ``surrogate`` to true in the ``config`` object. The
+    inheriting class must implement ``surrogate_features``, and breed
+    ``surrogate_candidates(count)`` offspring whenever it needs ``count``,
+    then keep the ones returned by ``screen``.
+
+    Every chromosome that reaches the real scorer trains the model
+    (``surrogate_model`` is ``"knn"`` or the cheaper but less reliable
+    ``"ridge"``, with
+    ``surrogate_alpha`` or ``surrogate_k``, on the latest
+    ``surrogate_capacity`` samples). Once it has ``surrogate_min_samples``
+    samples, ``surrogate_oversample`` times more offspring than needed are
+    bred; the best predicted ones are kept, except for a
+    ``surrogate_exploration`` share drawn at random from the rest so that
+    the model keeps learning about the regions it rates badly.
+
+    The predictions of the kept offspring are compared to their real scores,
+    and the Spearman rank correlation of every scoring pass is appended to
+    ``surrogate_correlations`` as ``(iteration, correlation, count)``.
+
+    Mix this behavior in after ``fitness_cache.CachedFitnessGA``, so that it
+    only learns from real evaluations.
+    """
+
+    def __init__(self, config={}):
+        super(SurrogateGA, self).__init__(config)
+        self.surrogate = self.config.setdefault("surrogate", False)
+        self.surrogate_model = self.config.setdefault("surrogate_model", "knn")
+        self.surrogate_alpha = self.config.setdefault("surrogate_alpha", 1.0)
+        self.surrogate_k = self.config.setdefault("surrogate_k", 5)
+        self.surrogate_capacity = self.config.setdefault("surrogate_capacity", 2000)
+        self.surrogate_min_samples = self.config.setdefault("surrogate_min_samples", 2 * self.population_size)
+        self.surrogate_oversample = self.config.setdefault("surrogate_oversample", 3.0)
+        self.surrogate_exploration = self.config.setdefault("surrogate_exploration", 0.2)
+
+        if self.surrogate_model not in ("ridge", "knn"):
+            raise ValueError("Unknown surrogate model: {}".format(self.surrogate_model))
+        self.model = self.new_model()
+        self.predictions = {}  # key -> predicted score of kept offspring not scored yet
+        self.surrogate_correlations = []
+        self.num_screened_out = 0
+
+    def new_model(self):
+        """Return an untrained surrogate model, as set by ``surrogate_model``."""
+        if self.surrogate_model == "ridge":
+            return RidgeSurrogate(self.surrogate_capacity, self.surrogate_alpha)
+        return KnnSurrogate(self.surrogate_capacity, self.surrogate_k)
+
+    def surrogate_features(self, chromosomes):
+        """Return the feature vectors of chromosomes, as a 2d array."""
+        raise NotImplementedError
+
+    def surrogate_ready(self):
+        return self.surrogate and len(self.model) >= self.surrogate_min_samples
+
+    def surrogate_candidates(self, count):
+        """Return the number of offspring to breed when ``count`` are needed."""
+        if not self.surrogate_ready():
+            return count
+        return int(math.ceil(count * self.surrogate_oversample))
+
+    def screen(self, candidates, count):
+        """Return the ``count`` candidates to evaluate."""
+        if not self.surrogate_ready() or len(candidates) <= count:
+            return candidates[:count]
+
+        predicted = self.model.predict(self.surrogate_features(candidates))
+        order = np.argsort(-predicted, kind="stable")
+        num_explore = int(round(self.surrogate_exploration * count))
+        best = order[:count - num_explore]
+        explore = self.np_random.choice(order[count - num_explore:], num_explore, replace=False)
+        chosen = np.concatenate([best, explore])
+        for i in chosen:
+            self.predictions[self.chromosome_key(candidates[i])] = predicted[i]
+        self.num_screened_out += len(candidates) - count
+        return [candidates[i] for i in chosen]
+
+    def forget_scores(self):
+        """Start a new model, since the samples of the old one were scored on another problem."""
+        super(SurrogateGA, self).forget_scores()
+        self.model = self.new_model()
+        self.predictions.clear()
+
+    def save_state(self, state, ref):
+        super(SurrogateGA, self).save_state(state, ref)
+        if not self.surrogate or self.model.features is None:
+            return
+        # The whole ring of the model and its write position
+        state["surrogate_features"] = self.model.features
+        state["surrogate_scores"] = self.model.scores
+        state["surrogate_total"] = np.array(self.model.total)
+        state["surrogate_prediction_keys"] = pack_keys(list(self.predictions.keys()))
+        state["surrogate_predictions"] = np.array(list(self.predictions.values()), dtype=float)
+        state["surrogate_correlations"] = np.array(self.surrogate_correlations, dtype=float).reshape(-1, 3)
+        state["surrogate_screened_out"] = np.array(self.num_screened_out)
+
+    def restore_state(self, state, deref):
+        super(SurrogateGA, self).restore_state(state, deref)
+        if "surrogate_features" not in state:
+            return
+        self.model.features = state["surrogate_features"]
+        self.model.scores = state["surrogate_scores"]
+        self.model.total = int(state["surrogate_total"])
+        self.model.coefficients = None
+        self.predictions = dict(zip(unpack_keys(state["surrogate_prediction_keys"]),
+                                    state["surrogate_predictions"].tolist()))
+        self.surrogate_correlations = [(int(iteration), correlation, int(count)) for iteration, correlation, count
+                                       in state["surrogate_correlations"].tolist()]
+        self.num_screened_out = int(state["surrogate_screened_out"])
+
+    def evaluate(self, chromosomes):
+        scores = super(SurrogateGA, self).evaluate(chromosomes)
+        if not self.surrogate or len(chromosomes) == 0:
+            return scores
+
+        self.model.add(self.surrogate_features(chromosomes), scores)
+        pairs = [(self.predictions.pop(key), score) for key, score
+                 in zip(map(self.chromosome_key, chromosomes), scores) if key in self.predictions]
+        if len(pairs) >= 3:
+            predicted, actual = zip(*pairs)
+            self.surrogate_correlations.append((self.iteration, rank_correlation(predicted, actual), len(pairs)))
+        # Kept offspring that never reached the scorer (duplicates of scored genomes) are forgotten
+        if len(self.predictions) > self.surrogate_capacity:
+            self.predictions.clear()
+        return scores
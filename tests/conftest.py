@@ -0,0 +1,21 @@
+import os
+import sys
+
+# The modules of the repository are imported by name, like the scripts do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from global_constants_and_functions import config
+
+
+@pytest.fixture
+def ga_config():
+    """Return a function making a small, seeded GeneticGlitch configuration that writes no files."""
+    def make(**overrides):
+        ga_config = dict(config, population_size=16, max_iterations=12, num_samples=1024, random_seed=3,
+                         log_fitness=False, log_best_chromosome=False, stats_file=None, checkpoint_file=None,
+                         resume_from=None)
+        ga_config.update(overrides)
+        return ga_config
+    return make
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+
+from awg_encoder import AwgEncoder, changed_sample_ranges, encode_binary_string, encode_waveform
+from global_constants_and_functions import (MAX_DAC_INT, MIN_DAC_INT, convert_int_to_comp2_ascii,
+                                            convert_int_to_comp2_binary_string)
+from individual import Chromosome
+
+
+def baseline_int_samples(chromosome):
+    """The DAC samples as Chromosome.calc_raw_waveform_int computed them, with interp1d and one sample at a time."""
+    points = np.concatenate([[[0, 0]], chromosome.coordinates, [[1, 0]]])
+    x_samples = np.arange(chromosome.num_samples) / (chromosome.num_samples - 1)
+    y_samples = interp1d(points[:, 0], points[:, 1], kind='quadratic')(x_samples) * chromosome.max_dac_int
+    y_samples[y_samples > chromosome.max_dac_int] = chromosome.max_dac_int
+    y_samples[y_samples < chromosome.min_dac_int] = chromosome.min_dac_int
+    return np.int_(np.round(y_samples)).tolist()
+
+
+def test_full_dac_range_matches_single_value_conversion():
+    int_samples = np.arange(MIN_DAC_INT, MAX_DAC_INT + 1)
+    assert encode_waveform(int_samples) == b''.join([convert_int_to_comp2_ascii(int(x), 2) for x in int_samples])
+    assert encode_binary_string(int_samples) == ''.join([convert_int_to_comp2_binary_string(int(x), 16)
+                                                         for x in int_samples])
+    assert AwgEncoder(16).encode(int_samples).tobytes() == encode_waveform(int_samples)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_chromosome_bytes_match_baseline_stream(seed):
+    np.random.seed(seed)
+    chromosome = Chromosome(length=np.random.randint(1, 20), num_samples=1024)
+    expected = b''.join([convert_int_to_comp2_ascii(x, 2) for x in baseline_int_samples(chromosome)])
+    assert chromosome.generate_bin_stream_to_awg() == expected
+    encoder = AwgEncoder(16)
+    assert chromosome.generate_bin_stream_to_awg(encoder).tobytes() == expected
+    assert chromosome.generate_binary_data_string() == ''.join(
+        [convert_int_to_comp2_binary_string(x, 16) for x in baseline_int_samples(chromosome)])
+
+
+def test_changed_sample_ranges():
+    old, new = [0, 1, 2, 3, 4, 5], [0, 9, 2, 9, 4, 5]
+    assert changed_sample_ranges(old, old) == []
+    assert changed_sample_ranges(old, new) == [(1, 2), (3, 4)]
+    assert changed_sample_ranges(old, new, merge_gap=1) == [(1, 4)]
+    assert changed_sample_ranges(old, [9] * 6) == [(0, 6)]
+    np.random.seed(0)
+    old = np.random.randint(MIN_DAC_INT, MAX_DAC_INT, 1000)
+    new = old.copy()
+    new[np.random.choice(1000, 50, replace=False)] += 1
+    patched = old.copy()
+    for start, stop in changed_sample_ranges(old, new, merge_gap=3):
+        patched[start:stop] = new[start:stop]
+    assert np.array_equal(patched, new)
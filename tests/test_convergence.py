@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from GeneticGlitch import GeneticGlitch
+from convergence import Plateau, ScoreHistory, SlidingMinimum
+
+
+@pytest.mark.parametrize("window", [1, 2, 3, 7])
+def test_sliding_minimum_matches_brute_force(window):
+    values = np.random.default_rng(window).integers(0, 10, 200).tolist()  # with repeated values
+    sliding = SlidingMinimum(window)
+    assert sliding.minimum is None
+    for i, value in enumerate(values):
+        sliding.push(value)
+        assert sliding.minimum == min(values[max(0, i + 1 - window):i + 1])
+
+
+@pytest.mark.parametrize("lookback", [2, 3, 5])
+def test_stagnated_matches_brute_force(lookback):
+    scores = np.cumsum(np.random.default_rng(lookback).choice([0.0, 0.0, 0.1, 0.5], 100)).tolist()
+    history = ScoreHistory(maxlen=8)  # short enough to wrap around
+    for i, score in enumerate(scores):
+        history.append(score)
+        seen = scores[:i + 1]
+        expected = len(seen) > lookback and seen[-1] - min(seen[-lookback:-1]) <= 0.1
+        assert history.stagnated(lookback, 0.1) == expected
+    assert list(history) == scores[-8:]
+
+
+def test_plateau_stops_when_the_best_score_stops_improving():
+    ga = SimpleNamespace(best_scores=ScoreHistory())
+    plateau = Plateau(lookback=3, threshold=0.05)
+    for score in [0.1, 0.2, 0.3, 0.4, 0.42]:
+        ga.best_scores.append(score)
+        assert plateau(ga) is None
+    ga.best_scores.append(0.44)  # gained less than 0.05 over 0.4 and 0.42
+    assert plateau(ga) == "no progress in 3 iterations"
+
+
+class CheckedGlitch(GeneticGlitch):
+    """Records the number of evaluations every time the stop rules are checked."""
+
+    def __init__(self, config={}):
+        super(CheckedGlitch, self).__init__(config)
+        self.checked_evaluations = []
+
+    def is_finished(self):
+        self.checked_evaluations.append(self.num_evaluations)
+        return super(CheckedGlitch, self).is_finished()
+
+
+def test_run_stops_at_the_evaluation_budget(ga_config):
+    ga = CheckedGlitch(ga_config(max_iterations=100, evaluation_budget=40))
+    ga.solve()
+    assert ga.iteration < 100
+    assert ga.stop_reason == "evaluation budget of 40 reached"
+    # The run stops at the first check that sees the budget spent
+    assert ga.checked_evaluations[-1] >= 40
+    assert all(num_evaluations < 40 for num_evaluations in ga.checked_evaluations[:-1])
@@ -0,0 +1,66 @@
+import pytest
+
+from fitness_cache import CachedFitnessGA, FitnessCache, genome_key
+from individual import Chromosome
+
+
+def test_least_recently_used_score_is_evicted():
+    cache = FitnessCache(max_size=2)
+    cache.put("a", 1.0)
+    cache.put("b", 2.0)
+    assert cache.get("a") == 1.0  # "b" is now the least recently used
+    cache.put("c", 3.0)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.get("b") is None
+    cache.put("a", 4.0)  # updating a score makes it the most recently used
+    cache.put("d", 5.0)
+    assert list(cache.entries.items()) == [("a", 4.0), ("d", 5.0)]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.hit_rate == 0.5
+
+
+def test_cache_of_size_zero_keeps_nothing():
+    cache = FitnessCache(max_size=0)
+    cache.put("a", 1.0)
+    assert len(cache) == 0 and cache.get("a") is None
+    assert FitnessCache().hit_rate == 0.0
+
+
+class CountingGA(CachedFitnessGA):
+    """Scores chromosomes by their frequency, and records every chromosome it scores."""
+
+    def __init__(self, config={}):
+        super(CountingGA, self).__init__(config)
+        self.scored = []
+
+    def score(self, chromosome):
+        self.scored.append(chromosome)
+        return chromosome.freq
+
+    def chromosome_key(self, chromosome):
+        return genome_key(chromosome)
+
+
+def test_equal_genomes_are_scored_once():
+    ga = CountingGA({"fitness_cache_size": 8})
+    chromosome, other = Chromosome(num_samples=256), Chromosome(num_samples=256)
+    copy = chromosome.make_copy()
+    assert copy.id != chromosome.id
+
+    assert ga.evaluate([chromosome, copy, other]) == [chromosome.freq, chromosome.freq, other.freq]
+    assert ga.scored == [chromosome, other]
+    assert (ga.fitness_cache.hits, ga.fitness_cache.misses) == (0, 3)
+
+    assert ga.evaluate([copy, other]) == [chromosome.freq, other.freq]
+    assert len(ga.scored) == 2 and ga.num_evaluations == 2
+    assert (ga.fitness_cache.hits, ga.fitness_cache.misses) == (2, 3)
+    assert ga.fitness_cache.hit_rate == pytest.approx(0.4)
+
+
+def test_changed_genome_is_scored_again():
+    ga = CountingGA({"fitness_cache_size": 8})
+    chromosome = Chromosome(num_samples=256)
+    ga.evaluate([chromosome])
+    chromosome.freq += 1
+    assert ga.evaluate([chromosome]) == [chromosome.freq]
+    assert len(ga.scored) == 2
@@ -0,0 +1,25 @@
+import numpy as np
+
+from individual import Chromosome
+
+
+def test_interpolated_samples_can_be_changed():
+    chromosome = Chromosome(num_samples=256)
+    waveform = chromosome.waveform.copy()
+    x_samples, y_samples = chromosome.interpolate_coordinates()
+    x_samples *= 2
+    y_samples += 1
+    assert np.array_equal(chromosome.waveform, waveform)
+    assert np.array_equal(chromosome.interpolate_coordinates()[1], waveform)
+
+
+def test_waveform_follows_coordinates():
+    chromosome = Chromosome(num_samples=256)
+    waveform = chromosome.waveform
+    chromosome.coordinates[:, 1] += 0.1
+    chromosome.invalidate_waveforms()
+    assert not np.array_equal(chromosome.waveform, waveform)
+    copy = chromosome.make_copy()
+    assert copy.waveform is chromosome.waveform
+    copy.num_samples = 512
+    assert len(copy.waveform) == 512 and len(chromosome.waveform) == 256
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from scipy.interpolate import interp1d
+
+from individual import Chromosome
+from interpolation import InterpolationPlan, get_plan
+
+
+def interp1d_samples(coordinates, x_samples):
+    points = np.concatenate([[[0, 0]], coordinates, [[1, 0]]])
+    return interp1d(points[:, 0], points[:, 1], kind='quadratic')(x_samples)
+
+
+@pytest.mark.parametrize("num_samples", [255, 256, 1001, 1024])
+def test_plan_matches_interp1d(num_samples):
+    np.random.seed(num_samples)
+    chromosomes = [Chromosome(length=length, num_samples=num_samples) for length in range(1, 20) for _ in range(3)]
+    plan = get_plan(num_samples)
+    expected = np.array([interp1d_samples(c.coordinates, plan.x_samples) for c in chromosomes])
+
+    coordinates = np.full([len(chromosomes), 19, 2], np.nan)
+    for i, c in enumerate(chromosomes):
+        coordinates[i, :c.length] = c.coordinates
+    batch = plan.evaluate_batch(coordinates, [c.length for c in chromosomes])
+    np.testing.assert_allclose(batch, expected, rtol=1e-10, atol=1e-12)
+    for c, samples in zip(chromosomes, expected):
+        np.testing.assert_allclose(plan.evaluate(c.coordinates), samples, rtol=1e-10, atol=1e-12)
+
+
+def test_plan_on_irregular_samples():
+    np.random.seed(0)
+    x_samples = np.concatenate([[0], np.sort(np.random.random(99)), [1]])
+    plan = InterpolationPlan(x_samples=x_samples)
+    for length in range(1, 20):
+        coordinates = Chromosome.calculate_random_coordinates(length)
+        np.testing.assert_allclose(plan.evaluate(coordinates), interp1d_samples(coordinates, x_samples),
+                                   rtol=1e-10, atol=1e-12)
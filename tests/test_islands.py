@@ -0,0 +1,72 @@
+import queue
+import random
+
+import numpy as np
+import pytest
+
+from GeneticGlitch import GeneticGlitch
+from islands import IslandModel, MigrationGA, island_config
+
+
+class IslandGlitch(MigrationGA, GeneticGlitch):
+    pass
+
+
+class Outbox(object):
+    """The inbox of an island, recording which islands sent migrants to it."""
+
+    def __init__(self, inbox, sender, receiver, sent):
+        self.inbox = inbox
+        self.route = (sender, receiver)
+        self.sent = sent
+
+    def put(self, migrants):
+        self.sent.add(self.route)
+        self.inbox.put(migrants)
+
+
+@pytest.mark.parametrize("topology", ["ring", "all"])
+def test_migrants_arrive_along_the_topology(ga_config, topology):
+    model = IslandModel(IslandGlitch, ga_config(population_size=8, num_samples=256, migration_interval=2),
+                        num_islands=3, topology=topology)
+    inboxes = [queue.Queue() for _ in range(model.num_islands)]
+    sent = set()
+    islands = []
+    for index in range(model.num_islands):
+        ga = IslandGlitch(island_config(dict(model.config, random_seed=index), index))
+        ga.inbox = inboxes[index]
+        ga.outboxes = [Outbox(inboxes[other], index, other, sent) for other in model.neighbors(index)]
+        ga.seed()
+        islands.append(ga)
+
+    # The islands of a model run in processes, here they take turns making generations
+    for _ in range(6):
+        for ga in islands:
+            ga.iteration += 1
+            ga.pre_generate()
+            ga.generate()
+            ga.post_generate()
+
+    expected = {(index, other) for index in range(3) for other in range(3) if other != index} \
+        if topology == "all" else {(0, 1), (1, 2), (2, 0)}
+    assert sent == expected
+    assert all(ga.num_immigrants > 0 for ga in islands)
+    assert all(len(ga.population) == ga.population_size for ga in islands)
+
+
+def test_islands_are_reproducible_from_the_random_seed(ga_config):
+    def run(random_seed, parent_seed):
+        # Without migration, every island only depends on the seed it draws from random_seed, not on the random
+        # state the process inherits from its parent
+        random.seed(parent_seed)
+        np.random.seed(parent_seed)
+        model = IslandModel(GeneticGlitch, ga_config(population_size=8, max_iterations=4, num_samples=256,
+                                                     migration_interval=100, random_seed=random_seed),
+                            num_islands=2)
+        model.solve()
+        return [(result["fitness"], result["evaluations"]) for result in model.results]
+
+    results = run(5, parent_seed=0)
+    assert run(5, parent_seed=1) == results
+    assert results[0] != results[1]
+    assert run(6, parent_seed=0) != results
@@ -0,0 +1,82 @@
+import random
+
+import numpy as np
+import pytest
+
+from GeneticGlitch import GeneticGlitch
+from individual import Chromosome
+from operators import batch_uniform_crossover
+from population import Population
+
+
+MUTATION_PROBS = ["mutation_y_prob", "mutation_reorder_prob", "mutation_add_or_remove_prob", "mutation_freq_prob",
+                  "mutation_random_parent_crossover_prob"]
+
+
+def random_population(size, seed, num_samples=256):
+    """Return a population of random chromosomes of 2 to 11 points."""
+    np.random.seed(seed)
+    lengths = np.random.randint(2, 12, size)
+    return Population.from_chromosomes([Chromosome(length=length, num_samples=num_samples) for length in lengths])
+
+
+def points(coordinates):
+    return sorted(map(tuple, coordinates.tolist()))
+
+
+def test_crossover_children_take_their_genes_from_their_parents():
+    parents = random_population(800, seed=0)
+    rng = np.random.default_rng(0)
+    pairs = rng.permutation(len(parents)).reshape(-1, 2)
+    children = batch_uniform_crossover(parents, pairs, rng)
+    assert len(children) == len(parents)
+
+    num_crossed = num_loci = 0
+    for i, pair in enumerate(pairs):
+        short, long = sorted(pair, key=lambda row: parents.lengths[row])
+        short_parent, long_parent = parents.chromosome(short), parents.chromosome(long)
+        child1, child2 = children.chromosome(2 * i), children.chromosome(2 * i + 1)
+        assert (child1.length, child2.length) == (short_parent.length, long_parent.length)
+        # The points are swapped between the children, none are lost or made up
+        assert points(np.concatenate([child1.coordinates, child2.coordinates])) == \
+            points(np.concatenate([short_parent.coordinates, long_parent.coordinates]))
+        assert (np.diff(child1.coordinates[:, 0]) > 0).all() and (np.diff(child2.coordinates[:, 0]) > 0).all()
+        # The frequencies are blended with one weight
+        assert child1.freq + child2.freq == pytest.approx(short_parent.freq + long_parent.freq)
+        low, high = sorted([short_parent.freq, long_parent.freq])
+        assert low - 1e-9 <= child1.freq <= high + 1e-9
+        num_crossed += len(set(points(child1.coordinates)) - set(points(short_parent.coordinates)))
+        num_loci += short_parent.length
+    # Every point of the shorter parent is swapped with 50% chance
+    assert num_crossed / num_loci == pytest.approx(0.5, abs=0.03)
+
+
+def is_changed(chromosome, original):
+    return chromosome.length != original.length or chromosome.freq != original.freq or \
+        not np.array_equal(chromosome.coordinates, original.coordinates)
+
+
+@pytest.mark.parametrize("kind", MUTATION_PROBS)
+def test_mutation_rates_match_the_configured_probabilities(ga_config, monkeypatch, kind):
+    probabilities = dict.fromkeys(MUTATION_PROBS, 0.0)
+    probabilities[kind] = 0.3
+    ga = GeneticGlitch(ga_config(num_samples=256, **probabilities))
+    # Count the random parents of random parent crossover, so that both paths create them the same way
+    create, created = ga.create, []
+    monkeypatch.setattr(ga, "create", lambda: created.append(1) or create())
+    originals = random_population(4000, seed=1).to_chromosomes()
+
+    mutated = ga.mutate_batch(Population.from_chromosomes(originals)).to_chromosomes()
+    batch_rate = np.mean([is_changed(chromosome, original) for chromosome, original in zip(mutated, originals)])
+    batch_created = len(created)
+
+    random.seed(1)
+    del created[:]
+    mutated = [ga.mutate(original.make_copy()) for original in originals]
+    scalar_rate = np.mean([is_changed(chromosome, original) for chromosome, original in zip(mutated, originals)])
+
+    assert batch_rate == pytest.approx(0.3, abs=0.03)
+    assert scalar_rate == pytest.approx(0.3, abs=0.03)
+    if kind == "mutation_random_parent_crossover_prob":
+        assert batch_created == pytest.approx(0.3 * len(originals), abs=0.03 * len(originals))
+        assert len(created) == pytest.approx(0.3 * len(originals), abs=0.03 * len(originals))
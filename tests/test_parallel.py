@@ -0,0 +1,50 @@
+import random
+import time
+from functools import partial
+
+import numpy as np
+
+from GeneticGlitch import GeneticGlitch
+from individual import set_next_chromosome_id
+
+
+def run(ga_config, executor):
+    random.seed(0)
+    np.random.seed(0)
+    set_next_chromosome_id(1)
+    ga = GeneticGlitch(ga_config(executor=executor, executor_workers=2, max_iterations=4))
+    ga.solve()
+    return ga
+
+
+def test_process_executor_matches_serial(ga_config):
+    serial = run(ga_config, "serial")
+    process = run(ga_config, "process")
+    assert process.num_evaluations == serial.num_evaluations
+    assert [(member.id, score) for member, score in process.ranked] == \
+        [(member.id, score) for member, score in serial.ranked]
+    assert list(process.best_scores) == list(serial.best_scores)
+
+
+def record_and_score(path, chromosomes):
+    time.sleep(0.05)
+    with open(path, "a") as f:
+        f.write("".join("{}\n".format(chromosome.id) for chromosome in chromosomes))
+    return [0.5] * len(chromosomes)
+
+
+def test_cancelled_submissions_are_not_scored(ga_config, tmp_path):
+    path = tmp_path / "scored.txt"
+    ga = GeneticGlitch(ga_config(executor="process", executor_workers=1))
+    ga.score_function = partial(record_and_score, str(path))
+    ga.seed()
+    futures = [ga.submit(chromosome) for chromosome in ga.population[:8]]
+    for future in futures[2:]:
+        assert future.cancel()
+    assert futures[0].result() == 0.5
+    ga.shutdown_executor()
+
+    scored = [int(line) for line in path.read_text().split()]
+    # The pool may have queued a call before it was cancelled, but not the rest
+    assert len(scored) <= 3
+    assert all(future.cancelled() for future in futures[2:])
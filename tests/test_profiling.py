@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+from GeneticGlitch import GeneticGlitch
+from profiling import PhaseProfiler
+
+
+def test_nested_phases_are_counted_once():
+    profiler = PhaseProfiler()
+    profiler.start()
+    with profiler.phase("generate"):
+        time.sleep(0.01)
+        for _ in range(2):
+            with profiler.phase("score"):
+                time.sleep(0.02)
+    report = profiler.end_generation(1)
+
+    phases = report["phases"]
+    assert phases["generate"]["calls"] == 1 and phases["score"]["calls"] == 2
+    assert phases["score"]["seconds"] >= 0.04
+    assert 0.01 <= phases["generate"]["seconds"] < phases["score"]["seconds"]
+    assert sum(phase["seconds"] for phase in phases.values()) == pytest.approx(report["wall_time"], rel=0.05)
+
+
+def test_phases_of_a_run_add_up_to_its_wall_time(ga_config):
+    ga = GeneticGlitch(ga_config(profile=True, max_iterations=4))
+    ga.solve()
+    summary = ga.profiler.summary()
+    assert summary["generations"] == 4
+    assert {"pre_generate", "generate", "post_generate", "select", "crossover", "mutate", "score"} <= \
+        set(summary["phases"])
+    total = sum(phase["seconds"] for phase in summary["phases"].values())
+    # Only the loop itself runs outside of the phases
+    assert total <= summary["wall_time"]
+    assert total == pytest.approx(summary["wall_time"], rel=0.2)
+    assert sum(phase["share"] for phase in summary["phases"].values()) == pytest.approx(total / summary["wall_time"])
@@ -0,0 +1,14 @@
+from GeneticGlitch import GeneticGlitch
+from rig import SimulatedRig
+
+
+def test_steady_state_races_children_on_rigs(ga_config):
+    rigs = [SimulatedRig("a", glitch_latency=0.001), SimulatedRig("b", glitch_latency=0.001)]
+    ga = GeneticGlitch(ga_config(population_size=8, max_iterations=3, racing=True, steady_state=True, rigs=rigs))
+    ga.solve()
+    assert ga.num_children_scored == 3 * ga.population_size
+    assert ga.num_attempts > 0
+    # Every member, and so every elite, was measured by a race
+    for member in ga.population:
+        low, high = ga.score_interval(member)
+        assert 0 <= low <= high <= 1
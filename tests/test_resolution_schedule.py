@@ -0,0 +1,28 @@
+import pytest
+
+from GeneticGlitch import GeneticGlitch
+
+
+class RecordingGlitch(GeneticGlitch):
+    def advance_resolution(self):
+        super().advance_resolution()
+        self.evaluations_at_change = self.num_evaluations
+
+
+@pytest.mark.parametrize("steady_state", [False, True])
+def test_surrogate_learns_from_current_resolution_only(ga_config, steady_state):
+    ga = RecordingGlitch(ga_config(steady_state=steady_state, surrogate=True, resolution_schedule=[256, 512, 1024],
+                                   resolution_lookback=2, threshold=1.0))
+    ga.solve()
+    assert ga.resolution_changes
+    assert ga.model.total == ga.num_evaluations - ga.evaluations_at_change
+    assert all(member.num_samples == 1024 for member in ga.population)
+
+
+def test_is_finished_keeps_the_resolution(ga_config):
+    ga = GeneticGlitch(ga_config(resolution_schedule=[256, 512, 1024], resolution_lookback=2, threshold=1.0))
+    ga.seed()
+    ga.best_scores.extend([0.5] * 4)
+    assert ga.is_stagnated(ga.resolution_lookback)
+    assert not ga.is_finished()
+    assert ga.resolution_level == 0
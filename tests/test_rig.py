@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from individual import Chromosome
+from rig import RigDriver, SimulatedRig
+
+
+def mutation_chain(length, num_samples):
+    """Consecutive children of one parent, each with a single y mutation."""
+    rng = np.random.default_rng(0)
+    chain = [Chromosome(num_samples=num_samples)]
+    for _ in range(length - 1):
+        child = chain[-1].make_copy()
+        child.coordinates[rng.integers(child.length), 1] += 0.05 * rng.standard_normal()
+        child.invalidate_waveforms()
+        chain.append(child)
+    return chain
+
+
+def upload_cost(chain, delta_upload, **rig_options):
+    rig = SimulatedRig(segments=1, glitch_latency=0.0, **rig_options)
+    driver = RigDriver([rig], delta_upload=delta_upload)
+    try:
+        scores = driver.score_batch(chain)
+    finally:
+        driver.shutdown()
+    return rig.awg.transfer_time, rig.awg.bytes_transferred, scores
+
+
+@pytest.mark.parametrize("rig_options", [
+    dict(awg_latency=0.005),  # latency bound link
+    dict(awg_latency=0.001, awg_baudrate=2e6),  # throughput bound link
+])
+def test_delta_upload_saves_transfer_time(rig_options):
+    chain = mutation_chain(12, 1024)
+    full_time, full_bytes, full_scores = upload_cost(chain, False, **rig_options)
+    delta_time, delta_bytes, delta_scores = upload_cost(chain, True, **rig_options)
+    assert delta_time < full_time
+    assert delta_bytes < full_bytes
+    assert delta_scores == full_scores  # the AWG memory holds the same waveforms
+
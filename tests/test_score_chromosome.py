@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from base import EstimatedScore
+from GeneticGlitch import GeneticGlitch
+from individual import Chromosome
+from population import Population
+from score_chromosome import (sim_score_batch, sim_score_bounds, sim_score_population,
+                              sim_score_population_coarse_to_fine)
+
+
+def random_population(size, num_samples, seed):
+    np.random.seed(seed)
+    chromosomes = [Chromosome(length=np.random.randint(1, 20), num_samples=num_samples) for _ in range(size)]
+    return chromosomes, Population.from_chromosomes(chromosomes)
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("num_samples", [1024, 4001])
+def test_full_scores_are_within_the_coarse_bounds(seed, num_samples):
+    _, population = random_population(64, num_samples, seed)
+    scores = sim_score_population(population)
+    _, lower, upper = sim_score_bounds(population, num_coarse=128)
+    assert np.all(lower <= scores * (1 + 1e-12))
+    assert np.all(scores <= upper * (1 + 1e-12))
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_coarse_to_fine_finds_the_top_k(seed):
+    _, population = random_population(64, 2048, seed)
+    scores = sim_score_population(population)
+    coarse_scores, promoted = sim_score_population_coarse_to_fine(population, top_k=4, num_coarse=128)
+    top = np.argsort(-scores)[:4]
+    assert promoted[top].all()
+    assert np.array_equal(np.argsort(-coarse_scores)[:4], top)
+    assert np.allclose(coarse_scores[promoted], scores[promoted], rtol=1e-12)
+
+
+def test_scores_that_are_not_full_resolution_are_estimated():
+    chromosomes, population = random_population(64, 2048, 0)
+    _, promoted = sim_score_population_coarse_to_fine(population, top_k=4, num_coarse=128)
+    assert not promoted.all()
+    scores = sim_score_batch(chromosomes, top_k=4, num_coarse=128)
+    assert [isinstance(score, EstimatedScore) for score in scores] == (~promoted).tolist()
+
+
+def test_estimated_scores_are_not_kept(ga_config):
+    ga = GeneticGlitch(ga_config(population_size=32, max_iterations=4, num_samples=2048, coarse_scoring=True,
+                                 coarse_num_samples=128))
+    ga.solve()
+    keys = list(ga.fitness_cache.entries)
+    members = {ga.chromosome_key(member): member for member in ga.population}
+    for key in keys:
+        if key in members:
+            exact = sim_score_population(Population.from_chromosomes([members[key]]))[0]
+            assert ga.fitness_cache.entries[key] == pytest.approx(exact, rel=1e-12)
+    for score, elite in ga.elites.snapshot():
+        assert not isinstance(score, EstimatedScore)
+        assert score == pytest.approx(sim_score_population(Population.from_chromosomes([elite]))[0], rel=1e-12)
+    assert ga.best_score[0] == pytest.approx(
+        sim_score_population(Population.from_chromosomes([ga.best_score[1]]))[0], rel=1e-12)
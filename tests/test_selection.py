@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from GeneticGlitch import GeneticGlitch
+from fitness_cache import genome_key
+from individual import Chromosome
+from selection import EliteArchive, ProportionateGA
+
+SCORES = [8.0, 4.0, 2.0, 1.0, 1.0, 0.0]
+
+
+def ranked_ga(scores=SCORES, **config):
+    ga = ProportionateGA(dict(config, random_seed=0))
+    ga.ranked = [("member {}".format(i), score) for i, score in enumerate(scores)]
+    ga.proportion_ranked()
+    return ga
+
+
+@pytest.mark.parametrize("sampling", ["roulette", "sus"])
+def test_selection_frequencies_match_the_weights(sampling):
+    ga = ranked_ga()
+    counts = np.bincount(ga.select_indices(100000, sampling), minlength=len(SCORES))
+    shares = np.array(SCORES) / sum(SCORES)
+    assert counts[-1] == 0  # a score of zero is never selected
+    assert counts / counts.sum() == pytest.approx(shares, abs=0.01)
+
+
+def test_sus_draws_the_expected_count_of_every_member():
+    ga = ranked_ga()
+    expected = 32 * np.array(SCORES) / sum(SCORES)
+    for _ in range(100):
+        counts = np.bincount(ga.select_indices(32, "sus"), minlength=len(SCORES))
+        assert (np.floor(expected) <= counts).all() and (counts <= np.ceil(expected)).all()
+
+
+def test_select_matches_the_batch_frequencies():
+    ga = ranked_ga()
+    members = [ga.select() for _ in range(100000)]
+    counts = np.array([members.count("member {}".format(i)) for i in range(len(SCORES))])
+    assert counts / counts.sum() == pytest.approx(np.array(SCORES) / sum(SCORES), abs=0.01)
+
+
+def test_elite_archive_keeps_the_fittest():
+    elites = EliteArchive(3)
+    members = ["member {}".format(i) for i in range(6)]
+    for score, member in zip([5.0, 1.0, 3.0, 4.0, 2.0, 3.0], members):
+        elites.offer(score, member)
+    # Equal scores keep the elite that was added first
+    assert elites.snapshot() == [(5.0, members[0]), (4.0, members[3]), (3.0, members[2])]
+    assert not elites.offer(3.0, "late")
+    assert elites.offer(3.5, "late")
+    assert elites.snapshot() == [(5.0, members[0]), (4.0, members[3]), (3.5, "late")]
+
+
+def test_elite_archive_keeps_one_place_per_genome():
+    elites = EliteArchive(3, key=genome_key)
+    chromosome, other = Chromosome(num_samples=256), Chromosome(num_samples=256)
+    copy = chromosome.make_copy()
+    assert copy.id != chromosome.id
+
+    assert elites.offer(2.0, chromosome)
+    assert not elites.offer(2.0, copy)
+    assert elites.offer(1.0, other)
+    assert len(elites) == 2
+    # A better score of the same genome replaces its old entry
+    assert elites.offer(3.0, copy)
+    assert elites.snapshot() == [(3.0, copy), (1.0, other)]
+
+
+def test_elitist_ga_deduplicates_by_chromosome_key(ga_config):
+    ga = GeneticGlitch(ga_config(elitism_pct=0.25))
+    chromosome = ga.create()
+    for member in [chromosome, chromosome.make_copy(), chromosome.make_copy()]:
+        ga.fitness(member, 0.5)
+    ga.fitness(ga.create(), 0.25)
+    assert [score for score, _ in ga.elites.snapshot()] == [0.5, 0.25]
@@ -0,0 +1,38 @@
+import numpy as np
+
+from global_constants_and_functions import config
+from GeneticGlitch import GeneticGlitch
+from stats import StatsRecorder, load_stats
+
+
+def record_iterations(path, iterations, append=False):
+    recorder = StatsRecorder(str(path), capacity=4, append=append)
+    for iteration in iterations:
+        recorder.record(iteration, np.array([1.0, 2.0]), evaluations=2 * iteration, wall_time=0.0)
+    recorder.flush()
+
+
+def test_new_recorder_starts_a_new_file(tmp_path):
+    path = tmp_path / "stats.bin"
+    record_iterations(path, range(1, 7))
+    record_iterations(path, range(1, 4))
+    assert load_stats(str(path))["iteration"].tolist() == [1, 2, 3]
+
+
+def test_resumed_recorder_appends(tmp_path):
+    path = tmp_path / "stats.bin"
+    record_iterations(path, range(1, 4))
+    record_iterations(path, range(4, 6), append=True)
+    assert load_stats(str(path))["iteration"].tolist() == [1, 2, 3, 4, 5]
+
+
+def test_plain_run_writes_no_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    GeneticGlitch(dict(config, population_size=8, max_iterations=2, log_best_chromosome=False)).solve()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_run_without_global_config_writes_no_statistics(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    GeneticGlitch({"population_size": 8, "max_iterations": 2, "log_best_chromosome": False}).solve()
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,81 @@
+import pytest
+
+from GeneticGlitch import GeneticGlitch
+
+
+def test_population_size_is_kept(ga_config, tmp_path):
+    checkpoint_file = str(tmp_path / "checkpoint.npz")
+    ga = GeneticGlitch(ga_config(steady_state=True, remove_worst_num=1, resolution_schedule=[256, 512, 1024],
+                                 resolution_lookback=2, threshold=1.0, checkpoint_file=checkpoint_file,
+                                 checkpoint_every=4))
+    ga.seed()
+    ga.rank_population()
+    assert len(ga.population) == ga.population_size
+    ga.solve()
+    assert len(ga.resolution_changes) == 2
+    assert len(ga.population) == ga.population_size
+
+    resumed = GeneticGlitch(ga_config(steady_state=True, remove_worst_num=1, resolution_schedule=[256, 512, 1024],
+                                      resolution_lookback=2, threshold=1.0, resume_from=checkpoint_file,
+                                      max_iterations=16))
+    resumed.solve()
+    assert len(resumed.population) == resumed.population_size
+
+
+class EveryCheckpointGlitch(GeneticGlitch):
+    """Keeps every checkpoint, ``checkpoint_file`` is formatted with the iteration."""
+
+    def save_checkpoint(self, path=None):
+        super().save_checkpoint(path or self.checkpoint_file.format(self.iteration))
+
+
+def test_resume_continues_like_the_uninterrupted_run(ga_config, tmp_path):
+    checkpoint_file = str(tmp_path / "checkpoint-{}.npz")
+    ga = EveryCheckpointGlitch(ga_config(steady_state=True, checkpoint_file=checkpoint_file, checkpoint_every=4))
+    best = ga.solve()
+
+    resumed = EveryCheckpointGlitch(ga_config(steady_state=True, resume_from=checkpoint_file.format(4)))
+    resumed_best = resumed.solve()
+    assert resumed.num_children_scored == ga.num_children_scored
+    assert resumed.num_evaluations == ga.num_evaluations
+    assert resumed_best.id == best.id
+    assert resumed.ranked[0][1] == ga.ranked[0][1]
+    assert [member.id for member in resumed.population] == [member.id for member in ga.population]
+    assert list(resumed.best_scores) == list(ga.best_scores)
+
+
+class FlakyGlitch(GeneticGlitch):
+    """Fails to score every ``fail_every``-th batch."""
+
+    fail_every = 5
+
+    def score_batch(self, chromosomes):
+        self.num_batches = getattr(self, "num_batches", 0) + 1
+        if self.num_batches % self.fail_every == 0:
+            raise IOError("rig disconnected")
+        return super().score_batch(chromosomes)
+
+
+def test_failed_children_are_dropped(ga_config):
+    ga = FlakyGlitch(ga_config(steady_state=True, max_iterations=4))
+    ga.solve()
+    assert ga.num_children_scored == 4 * ga.population_size
+    assert len(ga.population) == ga.population_size
+
+
+def test_run_stops_when_every_child_fails(ga_config):
+    ga = FlakyGlitch(ga_config(steady_state=True, max_iterations=4))
+    ga.seed()
+    ga.rank_population()
+    ga.fail_every = 1
+    with pytest.raises(IOError):
+        ga.solve()
+
+
+def test_stop_in_an_iteration_ends_it(ga_config):
+    ga = GeneticGlitch(ga_config(steady_state=True, evaluation_budget=40))
+    ga.solve()
+    assert ga.num_children_scored % ga.population_size != 0
+    assert ga.iteration == ga.num_children_scored // ga.population_size + 1
+    assert len(ga.best_scores) == ga.iteration
+    assert ga.best_fitness == ga.ranked[0][1]
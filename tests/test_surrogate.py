@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from surrogate import SurrogateGA
+
+
+class LineGA(SurrogateGA):
+    """Chromosomes are numbers in [0, 1), scored by their value."""
+
+    def score(self, chromosome):
+        return chromosome
+
+    def chromosome_key(self, chromosome):
+        return chromosome
+
+    def surrogate_features(self, chromosomes):
+        return np.array(chromosomes, dtype=float)[:, None]
+
+
+@pytest.mark.parametrize("model", ["knn", "ridge"])
+def test_screen_keeps_the_best_predicted_and_explores_the_rest(model):
+    ga = LineGA({"surrogate": True, "surrogate_model": model, "surrogate_min_samples": 20,
+                 "surrogate_exploration": 0.25, "random_seed": 0})
+    rng = np.random.default_rng(0)
+    candidates = rng.random(40).tolist()
+    assert ga.surrogate_candidates(8) == 8 and ga.screen(candidates, 8) == candidates[:8]
+
+    ga.evaluate(rng.random(20).tolist())
+    assert ga.surrogate_candidates(8) == 24
+    kept = ga.screen(candidates, 8)
+    assert len(kept) == len(set(kept)) == 8
+    predicted = ga.model.predict(ga.surrogate_features(candidates))
+    best = [candidates[i] for i in np.argsort(-predicted, kind="stable")[:6]]
+    assert kept[:6] == best
+    assert not set(kept[6:]) & set(best)  # 2 explored at random among the rest
+    assert np.mean(kept[:6]) > np.mean(sorted(candidates)[-12:])  # the model learned the fitness
+    assert ga.num_screened_out == 32
+
+    # The real scores of the kept offspring are compared to their predictions
+    ga.evaluate(kept)
+    iteration, correlation, count = ga.surrogate_correlations[-1]
+    assert count == 8 and correlation > 0.5
+    assert len(ga.predictions) == 0